@@ -0,0 +1,129 @@
+# batch_runner.py
+import os
+import json
+import time
+import asyncio
+import logging
+
+from modelclient.answer_cache import CACHE_MODES
+from modelclient.conversation import Conversation
+from modelclient.query_trace import QueryTrace
+
+logger = logging.getLogger(__name__)
+
+
+def load_queries(path):
+    """读取 JSONL 查询文件，每行为 {"id": ..., "query": ..., "cache": ...} 或仅含查询文本的 JSON 字符串；
+    缺少 id 时使用行号，cache 为回答缓存模式（默认 use），不合法时抛出 ValueError 并指出行号"""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path} 第 {line_no} 行不是合法的 JSON: {e}") from e
+            if isinstance(item, str):
+                item = {"query": item}
+            if not isinstance(item, dict) or "query" not in item:
+                raise ValueError(f"{path} 第 {line_no} 行缺少 query 字段")
+            cache = item.get("cache", "use")
+            if cache not in CACHE_MODES:
+                raise ValueError(f"{path} 第 {line_no} 行未知的缓存模式 {cache}，可选 {' / '.join(CACHE_MODES)}")
+            queries.append({"id": str(item.get("id", line_no)), "query": item["query"], "cache": cache})
+    return queries
+
+
+def load_completed(path):
+    """读取已有的结果文件，返回成功完成的查询 id 集合
+
+    进程中断时最后一行可能只写了一半，会被截掉，以便之后追加的结果从新的一行开始。
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+
+    for line in data.decode("utf-8").splitlines():
+        try:
+            result = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if result.get("status") == "ok":
+            completed.add(str(result.get("id")))
+    return completed
+
+
+class BatchRunner:
+    """无交互地批量处理查询：共享同一组 MCP 会话，按并发上限同时处理，每完成一条就追加写入结果文件"""
+
+    def __init__(self, app, concurrency=4):
+        self.app = app
+        self.concurrency = max(1, concurrency)
+        self.stats = {"ok": 0, "error": 0, "skipped": 0}
+
+    async def run(self, input_path, output_path):
+        """处理 input_path 中的查询并把结果写入 output_path；已成功完成的查询会被跳过（断点续跑）"""
+        queries = load_queries(input_path)
+        completed = load_completed(output_path)
+        pending = [item for item in queries if item["id"] not in completed]
+        self.stats["skipped"] = len(queries) - len(pending)
+        if self.stats["skipped"]:
+            print(f"⏭️ 跳过 {self.stats['skipped']} 条已完成的查询")
+
+        total = len(pending)
+        done = 0
+        start = time.perf_counter()
+        items = iter(pending)
+
+        with open(output_path, "a", encoding="utf-8") as out:
+
+            async def worker():
+                nonlocal done
+                # 多个 worker 共享同一个迭代器，自然限制了同时进行的查询数
+                for item in items:
+                    result = await self._run_query(item)
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+                    done += 1
+                    self.stats[result["status"]] += 1
+                    print(f"[{done}/{total}] {item['id']} {result['status']} {result['seconds']:.2f}s")
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, total) or 1)))
+
+        elapsed = time.perf_counter() - start
+        print(f"✅ 批处理完成: 成功 {self.stats['ok']}，失败 {self.stats['error']}，"
+              f"跳过 {self.stats['skipped']}，耗时 {elapsed:.2f}s")
+        logger.info(f"批处理统计: {self.stats}")
+        return self.stats
+
+    async def _run_query(self, item):
+        """用独立的对话历史处理单条查询，返回结果行"""
+        trace = QueryTrace()
+        conversation = Conversation(token_budget=self.app.config.conversation_token_budget)
+        start = time.perf_counter()
+        try:
+            answer = await self.app.model_client.process_query(
+                item["query"], self.app.server_connector, conversation, trace=trace, cache=item["cache"]
+            )
+        except Exception as e:
+            logger.error(f"处理查询 {item['id']} 时出错: {e}", exc_info=True)
+            answer = ""
+            trace.error = str(e) or type(e).__name__
+
+        return {
+            "id": item["id"],
+            "query": item["query"],
+            "status": "error" if trace.error else "ok",
+            "error": trace.error,
+            "answer": answer,
+            "seconds": round(time.perf_counter() - start, 4),
+            **trace.to_dict(),
+        }
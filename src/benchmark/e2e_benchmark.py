@@ -0,0 +1,198 @@
+# e2e_benchmark.py
+"""
+离线端到端基准测试：用本地假 LLM 服务和合成 stdio MCP 服务器运行 MCPApp / ModelClient.process_query，
+不需要 DashScope Key 和真实工具 API。
+
+用法（在 src 目录下）:
+    python -m benchmark.e2e_benchmark --servers 4 --tools-per-server 10 --tool-latency 0.05 \\
+        --tool-calls 3 --queries 20 --out bench_result.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import statistics
+import contextlib
+
+from benchmark.fake_llm_server import FakeLLMServer
+from console.renderer import RENDER_MODES, create_renderer
+
+FAKE_MCP_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_mcp_server.py")
+
+
+def summarize(samples):
+    """计算样本的均值和分位数（毫秒）"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(percentile(50), 3),
+        "p90_ms": round(percentile(90), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+class TimedStream:
+    """包装模型返回的流，记录首个 chunk 到达的时间（TTFT）"""
+
+    def __init__(self, stream, start, ttfts):
+        self._stream = stream
+        self._start = start
+        self._ttfts = ttfts
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._stream.close()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        first = True
+        async for chunk in self._stream:
+            if first:
+                self._ttfts.append(time.perf_counter() - self._start)
+                first = False
+            yield chunk
+
+
+def write_mcp_config(args):
+    """生成指向合成 MCP 服务器的临时 mcp_servers.json"""
+    servers = {
+        f"bench{i}": {
+            "command": sys.executable,
+            "args": [FAKE_MCP_SERVER, "--name", f"bench{i}", "--tools", str(args.tools_per_server),
+                     "--latency", str(args.tool_latency), "--payload-size", str(args.payload_size)],
+        }
+        for i in range(args.servers)
+    }
+    fd, path = tempfile.mkstemp(prefix="bench_mcp_servers_", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"mcpServers": servers}, f)
+    return path
+
+
+async def run_benchmark(args):
+    # 假 LLM：第一次请求返回 tool_calls，拿到工具结果后返回回复内容
+    tool_calls = [{"name": f"bench{i % args.servers}_tool_{i % args.tools_per_server}",
+                   "arguments": {"query": f"q{i}"}} for i in range(args.tool_calls)]
+    llm = FakeLLMServer(reasoning="r" * args.reasoning_chars, content="c" * args.content_chars,
+                        tool_calls=tool_calls, token_delay=args.token_delay,
+                        first_token_delay=args.first_token_delay)
+    base_url = await llm.start()
+    os.environ.update(DASHSCOPE_API_KEY="benchmark", BASE_URL=base_url, MODEL="fake-model")
+
+    from main import MCPApp
+    from modelclient.conversation import Conversation
+
+    config_path = write_mcp_config(args)
+    app = MCPApp(config_path)
+    quiet = io.StringIO() if args.quiet else sys.stdout
+    # 查询输出经过与交互模式相同的渲染器，渲染开销计入查询延迟
+    renderer = create_renderer(args.output, args.frame_interval, quiet)
+    result = {"benchmark": "e2e", "params": vars(args)}
+
+    try:
+        # 启动耗时
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(quiet):
+            connected = await app.initialize()
+        result["startup_seconds"] = round(time.perf_counter() - start, 4)
+        result["connected"] = connected
+        result["connect_timings"] = app.connect_timings
+
+        # 记录每次模型请求的 TTFT
+        ttfts = []
+        completions = app.model_client.scheduler.primary.client.chat.completions
+        create = completions.create
+
+        async def timed_create(**kwargs):
+            request_start = time.perf_counter()
+            return TimedStream(await create(**kwargs), request_start, ttfts)
+
+        completions.create = timed_create
+
+        # 工具调度开销：call_tool 耗时减去合成工具自身的延迟
+        overheads = []
+        for i in range(args.tool_samples):
+            tool = tool_calls[i % len(tool_calls)]["name"] if tool_calls else "bench0_tool_0"
+            call_start = time.perf_counter()
+            await app.server_connector.call_tool(tool, {"query": f"s{i}"})
+            overheads.append(time.perf_counter() - call_start - args.tool_latency)
+
+        # 端到端查询延迟（每次查询使用独立的对话历史）
+        latencies = []
+        for i in range(args.queries):
+            conversation = Conversation(token_budget=app.config.conversation_token_budget)
+            query_start = time.perf_counter()
+            answer = await app.model_client.process_query(f"benchmark query {i}", app.server_connector, conversation,
+                                                          on_event=renderer, reasoning=renderer.reasoning)
+            renderer.finish(answer)
+            latencies.append(time.perf_counter() - query_start)
+
+        result["ttft"] = summarize(ttfts)
+        result["tool_dispatch_overhead"] = summarize(overheads)
+        result["query_latency"] = summarize(latencies)
+        result["llm_requests"] = llm.request_count
+        result["tool_registry"] = app.server_connector.get_tool_stats()
+    finally:
+        with contextlib.redirect_stdout(quiet):
+            await app.cleanup()
+        await llm.stop()
+        os.remove(config_path)
+
+    # ru_maxrss 在 Linux 上单位为 KB
+    result["memory"] = {
+        "client_max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children_max_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准测试")
+    parser.add_argument("--servers", type=int, default=2, help="合成 MCP 服务器数量")
+    parser.add_argument("--tools-per-server", type=int, default=10, help="每个服务器的工具数")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="每次工具调用的延迟（秒）")
+    parser.add_argument("--payload-size", type=int, default=200, help="工具返回文本长度")
+    parser.add_argument("--tool-calls", type=int, default=2, help="每次查询中模型发起的工具调用数")
+    parser.add_argument("--reasoning-chars", type=int, default=200, help="思考过程字符数")
+    parser.add_argument("--content-chars", type=int, default=200, help="回复内容字符数")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="token 间隔（秒）")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="首 token 延迟（秒）")
+    parser.add_argument("--queries", type=int, default=10, help="端到端查询次数")
+    parser.add_argument("--tool-samples", type=int, default=50, help="测量工具调度开销的调用次数")
+    parser.add_argument("--out", help="结果 JSON 输出文件，不指定则输出到标准输出")
+    parser.add_argument("--verbose", dest="quiet", action="store_false", help="显示客户端的终端输出")
+    parser.add_argument("--output", choices=RENDER_MODES, default="terminal", help="查询输出的渲染模式")
+    parser.add_argument("--frame-interval", type=float, default=0.03, help="流式输出合并写出的最小间隔（秒）")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# fake_llm_server.py
+import json
+import time
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class FakeLLMServer:
+    """本地 OpenAI 兼容的 SSE 流式服务，按脚本输出思考过程、回复内容和工具调用，用于离线基准测试
+
+    收到的请求中最后一条消息不是工具结果且配置了 tool_calls 时，返回工具调用；
+    否则返回回复内容。每个 token 之间按 token_delay 间隔发送。
+    """
+
+    def __init__(self, reasoning="", content="这是一个用于基准测试的回复。", tool_calls=None,
+                 token_delay=0.005, first_token_delay=0.0, chars_per_token=4, host="127.0.0.1", port=0):
+        self.reasoning = reasoning
+        self.content = content
+        self.tool_calls = tool_calls or []  # [{"name": ..., "arguments": {...}}]
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.chars_per_token = chars_per_token
+        self.host = host
+        self.port = port
+        self.request_count = 0
+        self._server = None
+        self._connections = {}  # 连接处理任务 -> writer
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        """在当前事件循环中启动服务"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"假 LLM 服务已启动: {self.base_url}")
+        return self.base_url
+
+    async def stop(self):
+        """停止服务"""
+        if self._server is not None:
+            self._server.close()
+            # 关闭空闲的 keep-alive 连接，让对应的处理任务读到 EOF 后退出
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self):
+        """在独立线程的事件循环中启动服务（被测代码阻塞事件循环时也能继续响应）"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop_thread(self):
+        """停止线程中的服务"""
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    async def _handle_connection(self, reader, writer):
+        """处理一个 HTTP/1.1 连接，支持 keep-alive 上的多个请求"""
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                request = json.loads(body) if body else {}
+                self.request_count += 1
+                await self._stream_response(request, writer)
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _stream_response(self, request, writer):
+        """以 chunked 编码发送 SSE 流"""
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+
+        model = request.get("model", "fake-model")
+        messages = request.get("messages", [])
+        use_tools = self.tool_calls and not (messages and messages[-1].get("role") == "tool")
+
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+
+        for delta, finish_reason in self._script(use_tools):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self._write_chunk(writer, f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            await writer.drain()
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+
+        self._write_chunk(writer, "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def _script(self, use_tools):
+        """按脚本生成 (delta, finish_reason) 序列"""
+        for token in self._tokens(self.reasoning):
+            yield {"role": "assistant", "reasoning_content": token}, None
+
+        if use_tools:
+            for index, tool_call in enumerate(self.tool_calls):
+                yield {"tool_calls": [{
+                    "index": index,
+                    "id": f"call_{index}",
+                    "type": "function",
+                    "function": {"name": tool_call["name"], "arguments": ""}
+                }]}, None
+                arguments = json.dumps(tool_call.get("arguments", {}), ensure_ascii=False)
+                for token in self._tokens(arguments):
+                    yield {"tool_calls": [{"index": index, "function": {"arguments": token}}]}, None
+            yield {}, "tool_calls"
+        else:
+            for token in self._tokens(self.content):
+                yield {"content": token}, None
+            yield {}, "stop"
+
+    def _tokens(self, text):
+        """按固定字符数把文本切成 token"""
+        step = max(1, self.chars_per_token)
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    @staticmethod
+    def _write_chunk(writer, text):
+        data = text.encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
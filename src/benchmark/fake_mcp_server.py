@@ -0,0 +1,45 @@
+# fake_mcp_server.py
+"""
+合成的 stdio MCP 服务器，用于离线基准测试。
+
+用法:
+    python fake_mcp_server.py --name bench0 --tools 20 --latency 0.05 --payload-size 200
+    python fake_mcp_server.py --transport sse --port 8765   # 作为远程 SSE 服务器，地址为 http://127.0.0.1:8765/sse
+每个工具名为 {name}_tool_{i}，调用时等待 latency 秒后返回 payload-size 字符的文本。
+"""
+import asyncio
+import argparse
+
+from mcp.server.fastmcp import FastMCP
+
+
+def build_server(name, tool_count, latency, payload_size, port=8000):
+    """创建带有 tool_count 个合成工具的 MCP 服务器"""
+    mcp = FastMCP(name, log_level="WARNING", host="127.0.0.1", port=port)
+
+    def make_tool(tool_name):
+        async def tool(query: str = "") -> str:
+            if latency:
+                await asyncio.sleep(latency)
+            return f"{tool_name}({query}): " + "x" * payload_size
+
+        return tool
+
+    for i in range(tool_count):
+        tool_name = f"{name}_tool_{i}"
+        mcp.add_tool(make_tool(tool_name), name=tool_name,
+                     description=f"基准测试用的合成工具 {i}，返回固定长度的文本")
+    return mcp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合成 stdio MCP 服务器")
+    parser.add_argument("--name", default="bench", help="服务器名，同时作为工具名前缀")
+    parser.add_argument("--tools", type=int, default=10, help="工具数量")
+    parser.add_argument("--latency", type=float, default=0.0, help="每次工具调用的延迟（秒）")
+    parser.add_argument("--payload-size", type=int, default=100, help="工具返回文本的长度")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio", help="传输方式")
+    parser.add_argument("--port", type=int, default=8000, help="SSE 模式的监听端口")
+    args = parser.parse_args()
+
+    build_server(args.name, args.tools, args.latency, args.payload_size, args.port).run(transport=args.transport)
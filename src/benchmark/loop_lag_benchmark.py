@@ -0,0 +1,90 @@
+# loop_lag_benchmark.py
+"""
+对比同步 OpenAI 客户端与异步 AsyncOpenAI 客户端在流式生成期间的事件循环延迟。
+
+用法（在 src 目录下）:
+    python -m benchmark.loop_lag_benchmark --tokens 400 --token-delay 0.005
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from openai import OpenAI, AsyncOpenAI
+
+from benchmark.fake_llm_server import FakeLLMServer
+
+
+async def probe_loop_lag(stop_event, interval, lags):
+    """每隔 interval 秒醒来一次，记录实际醒来时间比预期晚了多少"""
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def consume_sync(base_url, messages):
+    """旧实现：在协程中迭代同步客户端的流"""
+    client = OpenAI(api_key="benchmark", base_url=base_url)
+    stream = client.chat.completions.create(model="fake-model", messages=messages, stream=True)
+    for chunk in stream:
+        pass
+
+
+async def consume_async(base_url, messages):
+    """新实现：使用异步客户端 async for 迭代流"""
+    client = AsyncOpenAI(api_key="benchmark", base_url=base_url)
+    stream = await client.chat.completions.create(model="fake-model", messages=messages, stream=True)
+    async with stream:
+        async for chunk in stream:
+            pass
+
+
+async def run_case(name, consume, base_url, interval):
+    """运行一个用例，返回耗时和事件循环延迟统计"""
+    lags = []
+    stop_event = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(stop_event, interval, lags))
+    await asyncio.sleep(interval)
+
+    start = time.perf_counter()
+    await consume(base_url, [{"role": "user", "content": "benchmark"}])
+    elapsed = time.perf_counter() - start
+
+    stop_event.set()
+    await probe
+    lags.sort()
+    return {
+        "case": name,
+        "stream_seconds": round(elapsed, 4),
+        "probe_samples": len(lags),
+        "lag_max_ms": round(lags[-1] * 1000, 3) if lags else None,
+        "lag_p50_ms": round(statistics.median(lags) * 1000, 3) if lags else None,
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1] * 1000, 3) if lags else None,
+    }
+
+
+async def main(args):
+    server = FakeLLMServer(content="x" * args.tokens, chars_per_token=1, token_delay=args.token_delay)
+    base_url = server.start_in_thread()
+    try:
+        results = [
+            await run_case("sync_openai", consume_sync, base_url, args.interval),
+            await run_case("async_openai", consume_async, base_url, args.interval),
+        ]
+    finally:
+        server.stop_thread()
+
+    json.dump({"benchmark": "loop_lag", "tokens": args.tokens, "token_delay": args.token_delay,
+               "results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流式生成期间的事件循环延迟基准测试")
+    parser.add_argument("--tokens", type=int, default=400, help="每次流式输出的 token 数")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="token 之间的间隔（秒）")
+    parser.add_argument("--interval", type=float, default=0.01, help="延迟探针的唤醒间隔（秒）")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,223 @@
+# remote_benchmark.py
+"""
+远程 SSE 服务器基准测试：用本地合成的 SSE MCP 服务器（fake_mcp_server.py --transport sse）
+测量并发工具调用吞吐量，以及服务器被杀掉并重启后客户端自动重连的耗时。
+
+    - 吞吐量：分别通过 ServerConnector（共享连接池、并发 POST）和 mcp 自带的 sse_client 发出
+      --calls 个并发调用；--rtt 大于 0 时经过本地延迟代理，模拟网络往返时间
+    - 重连：杀掉服务器进程，记录断开期间调用失败的耗时，在同一端口重启服务器后，
+      轮询调用直到成功，记录从重启到第一次调用成功的时间
+
+用法（在 src 目录下）:
+    python -m benchmark.remote_benchmark --calls 200 --rtt 0.02 --out remote_result.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import contextlib
+from contextlib import AsyncExitStack
+
+from benchmark.e2e_benchmark import FAKE_MCP_SERVER
+
+TOOL_NAME = "remote_tool_0"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_server(port, args):
+    """启动合成的 SSE 服务器，端口可以连接后返回进程"""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, FAKE_MCP_SERVER, "--transport", "sse", "--port", str(port), "--name", "remote",
+        "--tools", "1", "--latency", str(args.tool_latency), "--payload-size", str(args.payload_size),
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    async with asyncio.timeout(args.timeout):
+        while True:
+            with contextlib.suppress(OSError):
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                return process
+            if process.returncode is not None:
+                raise RuntimeError("合成 SSE 服务器启动失败")
+            await asyncio.sleep(0.05)
+
+
+async def stop_server(process):
+    if process.returncode is None:
+        process.kill()
+    await process.wait()
+
+
+class DelayProxy:
+    """转发 TCP 连接的本地代理，每个方向的数据延迟 rtt / 2 秒后送达（保持顺序，不限制带宽）"""
+
+    def __init__(self, target_port, rtt):
+        self.target_port = target_port
+        self.delay = rtt / 2
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+
+    async def _handle(self, client_reader, client_writer):
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", self.target_port)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(self._pipe(client_reader, upstream_writer),
+                             self._pipe(upstream_reader, client_writer), return_exceptions=True)
+
+    async def _pipe(self, reader, writer):
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+                if not data:
+                    writer.close()
+                    return
+                writer.write(data)
+                await writer.drain()
+
+        sender = asyncio.create_task(deliver())
+        try:
+            while True:
+                data = await reader.read(65536)
+                queue.put_nowait((time.monotonic() + self.delay, data))
+                if not data:
+                    break
+            await sender
+        except (ConnectionError, OSError):
+            sender.cancel()
+            writer.close()
+
+
+async def measure_throughput(call, calls):
+    """并发发出 calls 个调用，返回 (耗时秒数, 失败数)"""
+    start = time.perf_counter()
+    results = await asyncio.gather(*(call(i) for i in range(calls)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for result in results if isinstance(result, BaseException) or result is None or result.isError)
+    return elapsed, failures
+
+
+def throughput_result(elapsed, failures, calls):
+    return {"seconds": round(elapsed, 4), "calls_per_second": round(calls / elapsed, 1), "failures": failures}
+
+
+async def sse_client_throughput(url, calls):
+    """mcp 自带的 sse_client（每个会话新建 HTTP 客户端，POST 逐个发送）作为对照"""
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+
+    async with sse_client(url) as (read, write), ClientSession(read, write) as session:
+        await session.initialize()
+        return await measure_throughput(lambda i: session.call_tool(TOOL_NAME, {"query": f"q{i}"}), calls)
+
+
+async def run_benchmark(args):
+    os.environ.setdefault("DASHSCOPE_API_KEY", "benchmark")
+    from config.config import Config
+    from serverconnector.server_connector import ServerConnector
+
+    config = Config()
+    # 吞吐量测试不受客户端并发上限影响；健康检查和熔断不干扰重连测量（断开期间的轮询调用不会触发熔断）
+    config.tool_max_concurrency = args.calls
+    config.health_check_interval = 0
+    config.circuit_failure_threshold = 10 ** 9
+    config.tool_call_timeout = args.timeout
+    result = {"benchmark": "remote", "params": vars(args)}
+
+    port = free_port()
+    server = await start_server(port, args)
+    proxy = None
+    target_port = port
+    if args.rtt > 0:
+        proxy = DelayProxy(port, args.rtt)
+        target_port = await proxy.start()
+    url = f"http://127.0.0.1:{target_port}/sse"
+
+    connector = ServerConnector(config, AsyncExitStack())
+    try:
+        start = time.perf_counter()
+        # 连接信息输出到标准错误，标准输出只保留结果 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            await connector.connect_to_server("remote", {"url": url})
+        result["connect_seconds"] = round(time.perf_counter() - start, 4)
+
+        async def call(i):
+            return await connector.call_tool(TOOL_NAME, {"query": f"q{i}"})
+
+        await call(-1)
+        result["throughput"] = {
+            "shared_client": throughput_result(*await measure_throughput(call, args.calls), args.calls),
+            "mcp_sse_client": throughput_result(*await sse_client_throughput(url, args.calls), args.calls),
+        }
+
+        # 重连：杀掉服务器，断开期间的调用应当快速失败，重启后客户端按退避自动重连
+        await stop_server(server)
+        start = time.perf_counter()
+        down = await call(0)
+        result["call_while_down"] = {"seconds": round(time.perf_counter() - start, 4),
+                                     "is_error": down is None or bool(down.isError)}
+
+        server = await start_server(port, args)
+        restarted = time.perf_counter()
+        attempts = 0
+        async with asyncio.timeout(args.timeout):
+            while True:
+                attempts += 1
+                response = await call(1)
+                if response is not None and not response.isError:
+                    break
+                await asyncio.sleep(0.1)
+        result["reconnect"] = {
+            "seconds_after_restart": round(time.perf_counter() - restarted, 4),
+            "attempts": attempts,
+            "replicas": connector.get_replica_stats()["remote"],
+        }
+        result["throughput_after_reconnect"] = throughput_result(
+            *await measure_throughput(call, args.calls), args.calls)
+    finally:
+        await connector.aclose()
+        if proxy is not None:
+            await proxy.stop()
+        await stop_server(server)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="远程 SSE 服务器吞吐量和重连基准测试")
+    parser.add_argument("--calls", type=int, default=200, help="并发调用数")
+    parser.add_argument("--rtt", type=float, default=0.02, help="模拟的网络往返时间（秒），0 表示直连")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="每次工具调用的延迟（秒）")
+    parser.add_argument("--payload-size", type=int, default=100, help="工具返回文本长度")
+    parser.add_argument("--timeout", type=float, default=30, help="启动、调用和等待重连的超时（秒）")
+    parser.add_argument("--out", help="结果 JSON 输出文件，不指定则输出到标准输出")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
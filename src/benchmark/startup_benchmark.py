@@ -0,0 +1,208 @@
+# startup_benchmark.py
+"""
+启动耗时基准测试：统计客户端和自带天气服务器的导入耗时（python -X importtime）
+以及从启动进程到可用的墙钟时间，用于发现在导入阶段就加载的重量级模块。
+
+    - 导入耗时：模块的累计导入时间和耗时最多的直接依赖
+    - 客户端：从启动 main.py 到打印输入提示符 "👤 >" 的时间（包含连接合成的最小服务器或天气服务器）
+    - 天气服务器：从启动 weather_server.py 到响应 initialize 请求的时间
+
+用法（在 src 目录下）:
+    python -m benchmark.startup_benchmark --runs 5 --out startup_result.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from benchmark.e2e_benchmark import FAKE_MCP_SERVER, summarize
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_SCRIPT = os.path.join(SRC_DIR, "main.py")
+WEATHER_SERVER = os.path.join(SRC_DIR, "mcpserver", "weather_server.py")
+PROMPT = "👤 >".encode("utf-8")
+
+INITIALIZE_REQUEST = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {"protocolVersion": "2024-11-05", "capabilities": {},
+               "clientInfo": {"name": "startup-benchmark", "version": "1.0"}},
+}
+
+
+def parse_importtime(stderr, module, top):
+    """解析 -X importtime 的输出，返回模块的累计导入耗时（毫秒）和耗时最多的 top 个直接依赖"""
+    total = None
+    children = []
+    pending = []  # 当前顶层模块的直接依赖（importtime 先输出依赖，再输出导入它们的模块）
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # 表头
+            continue
+        name = fields[2].rstrip()
+        # 名称前有 1 个分隔空格，之后每层嵌套缩进 2 个空格
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                total, children = cumulative, pending
+            pending = []
+        elif depth == 1:
+            pending.append((name.strip(), cumulative))
+    children.sort(key=lambda item: item[1], reverse=True)
+    return {
+        "total_ms": round(total / 1000, 3) if total is not None else None,
+        "top_imports_ms": {name: round(us / 1000, 3) for name, us in children[:top]},
+    }
+
+
+async def measure_import(module, runs, top):
+    """多次运行 python -X importtime -c "import module"，返回墙钟时间统计和最快一次的导入明细"""
+    wall_times = []
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-X", "importtime", "-c", f"import {module}", cwd=SRC_DIR,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        wall_times.append(time.perf_counter() - start)
+        if process.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{stderr.decode(errors='replace')[-2000:]}")
+        detail = parse_importtime(stderr.decode(errors="replace"), module, top)
+        if best is None or (detail["total_ms"] or 0) < (best["total_ms"] or 0):
+            best = detail
+    return {"wall": summarize(wall_times), **best}
+
+
+async def read_until(stream, marker, timeout):
+    """读取输出直到出现 marker，返回读到的内容"""
+    data = b""
+    async with asyncio.timeout(timeout):
+        while marker not in data:
+            chunk = await stream.read(4096)
+            if not chunk:
+                raise RuntimeError(f"进程在输出 {marker!r} 之前退出:\n{data.decode(errors='replace')[-2000:]}")
+            data += chunk
+    return data
+
+
+async def stop_process(process):
+    if process.returncode is None:
+        process.kill()
+    await process.wait()
+
+
+async def measure_client(config_path, workdir, env, timeout):
+    """启动客户端，返回到出现输入提示符的秒数"""
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, MAIN_SCRIPT, config_path, cwd=workdir, env=env,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        await read_until(process.stdout, PROMPT, timeout)
+        elapsed = time.perf_counter() - start
+        process.stdin.write(b"q\n")
+        await process.stdin.drain()
+        async with asyncio.timeout(timeout):
+            await process.wait()
+        return elapsed
+    finally:
+        await stop_process(process)
+
+
+async def measure_weather_server(env, timeout):
+    """启动天气服务器，返回到收到 initialize 响应的秒数"""
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, WEATHER_SERVER, cwd=SRC_DIR, env=env,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        process.stdin.write(json.dumps(INITIALIZE_REQUEST).encode("utf-8") + b"\n")
+        await process.stdin.drain()
+        await read_until(process.stdout, b"\n", timeout)
+        return time.perf_counter() - start
+    finally:
+        await stop_process(process)
+
+
+def write_mcp_config(workdir, server):
+    """生成只包含一个服务器的临时 mcp_servers.json（客户端没有可用服务器时会直接退出）"""
+    if server == "weather":
+        servers = {"weather": {"command": sys.executable, "args": [WEATHER_SERVER]}}
+    else:
+        # 合成的最小服务器，启动开销接近 mcp 包本身的导入时间
+        servers = {"fake": {"command": sys.executable, "args": [FAKE_MCP_SERVER, "--name", "fake", "--tools", "1"]}}
+    path = os.path.join(workdir, "mcp_servers.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"mcpServers": servers}, f)
+    return path
+
+
+async def run_benchmark(args):
+    result = {"benchmark": "startup", "params": vars(args)}
+    env = {**os.environ, "DASHSCOPE_API_KEY": os.getenv("DASHSCOPE_API_KEY", "benchmark"),
+           "PYTHONUNBUFFERED": "1", "LAZY_STARTUP": "true" if args.lazy_startup else "false",
+           "METRICS_ENABLED": "false", "ANSWER_CACHE_TTL": "0", "CONFIG_RELOAD_INTERVAL": "0"}
+
+    # 解释器本身的启动时间，作为其他结果的基线
+    baseline = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(sys.executable, "-c", "pass")
+        await process.wait()
+        baseline.append(time.perf_counter() - start)
+    result["python_startup"] = summarize(baseline)
+
+    result["import"] = {
+        "main": await measure_import("main", args.runs, args.top),
+        "mcpserver.weather_server": await measure_import("mcpserver.weather_server", args.runs, args.top),
+    }
+
+    # 客户端在临时目录中运行，清单缓存等文件不会写入源码目录
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    try:
+        time_to_prompt = {}
+        for name in ("fake", "weather"):
+            config_path = write_mcp_config(workdir, name)
+            samples = [await measure_client(config_path, workdir, env, args.timeout) for _ in range(args.runs)]
+            time_to_prompt[name] = summarize(samples)
+        result["client_time_to_prompt"] = time_to_prompt
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    samples = [await measure_weather_server(env, args.timeout) for _ in range(args.runs)]
+    result["weather_server_time_to_ready"] = summarize(samples)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的重复次数")
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的直接依赖数量")
+    parser.add_argument("--timeout", type=float, default=60, help="等待单个进程就绪的超时（秒）")
+    parser.add_argument("--lazy-startup", action="store_true", help="客户端以 LAZY_STARTUP=true 启动")
+    parser.add_argument("--out", help="结果 JSON 输出文件，不指定则输出到标准输出")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,22 @@
 # config.py
 import os
-from dotenv import load_dotenv
+import json
 import logging
 
-# 配置日志记录
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 加载环境变量
-load_dotenv()
-
 
 class Config:
-    """配置管理类，负责从环境变量加载所有配置"""
+    """配置管理类，负责从环境变量加载所有配置
+
+    日志由入口（main.py）配置，导入本模块没有副作用。
+    """
 
     def __init__(self):
+        # 加载 .env 中的环境变量
+        from dotenv import load_dotenv
+        load_dotenv()
+
         # DashScope 配置
         # 阿里百练的apikey
         self.dashscope_api_key = os.getenv("DASHSCOPE_API_KEY")
@@ -23,15 +25,125 @@ class Config:
         # 如果没配置 默认用qwq-plus
         self.model = os.getenv("MODEL", "qwq-plus")
 
+        # 模型请求调度
+        # 多个端点（JSON 列表，每项含 base_url、model，可选 name、api_key、rpm、burst），
+        # 第一个为主端点，其余用于重试和对冲；不配置时只使用 BASE_URL + MODEL
+        self.llm_endpoints = self._load_llm_endpoints(os.getenv("LLM_ENDPOINTS"))
+        # 429/5xx/连接错误的最大重试次数，退避基数和上限（秒）
+        self.llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.llm_retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.llm_retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+        # 超过多少秒没有首个 token 时向下一个端点发起对冲请求，0 表示不对冲
+        self.llm_hedge_after = float(os.getenv("LLM_HEDGE_AFTER", "10"))
+        # 流式输出中超过多少秒没有新内容视为卡住，0 表示不检测
+        self.llm_stall_timeout = float(os.getenv("LLM_STALL_TIMEOUT", "60"))
+
+        # MCP 服务器启动配置
+        # 单个服务器的连接超时（秒），可在 mcp_servers.json 中用 connectTimeout 单独覆盖
+        self.server_connect_timeout = float(os.getenv("SERVER_CONNECT_TIMEOUT", "30"))
+        # 启动阶段的全局截止时间（秒），超时未连上的服务器转入后台继续连接；
+        # 各服务器并发连接，截止时间不小于连接超时时不会生效，因此默认取较小的值
+        self.startup_deadline = float(os.getenv("STARTUP_DEADLINE", "10"))
+        # 连接失败后在后台重试的最大次数
+        self.server_connect_retries = int(os.getenv("SERVER_CONNECT_RETRIES", "3"))
+        # 每隔多少秒检查一次 mcp_servers.json，修改后只启动、停止或重启有变化的服务器，0 表示不检查
+        self.config_reload_interval = float(os.getenv("CONFIG_RELOAD_INTERVAL", "2"))
+        # 懒启动：有缓存工具清单的服务器在首次调用其工具时才启动
+        self.lazy_startup = os.getenv("LAZY_STARTUP", "false").lower() in ("1", "true", "yes")
+        # 懒启动使用的工具清单缓存文件
+        self.manifest_cache_path = os.getenv("MANIFEST_CACHE_PATH", ".mcp_manifest_cache.json")
+        # 服务器空闲多少秒后关闭进程，0 表示不关闭
+        self.server_idle_timeout = float(os.getenv("SERVER_IDLE_TIMEOUT", "0"))
+
+        # 工具调用配置
+        # 同时进行的工具调用总数上限，单个服务器的上限在 mcp_servers.json 中用 maxConcurrency 配置
+        self.tool_max_concurrency = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))
+        # 单次工具调用超时（秒），可在 mcp_servers.json 中用 toolTimeout 单独覆盖
+        self.tool_call_timeout = float(os.getenv("TOOL_CALL_TIMEOUT", "60"))
+        # 工具结果缓存的 SQLite 文件路径，不配置则只缓存在内存中
+        self.tool_result_cache_path = os.getenv("TOOL_RESULT_CACHE_PATH")
+
+        # 单次工具输出交给模型的最大字符数（超出部分写入临时文件，只发送预览），0 表示不限制；
+        # 可在 mcp_servers.json 中用 outputLimit 按工具单独配置
+        self.tool_output_max_chars = int(os.getenv("TOOL_OUTPUT_MAX_CHARS", "20000"))
+        # 超长工具输出的临时文件目录，不配置时使用系统临时目录
+        self.tool_output_spill_dir = os.getenv("TOOL_OUTPUT_SPILL_DIR")
 
+        # 健康检查：每隔多少秒 ping 一次各服务器，0 表示不检查
+        self.health_check_interval = float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+        # 单次 ping 的超时（秒），连续两次无响应的服务器会被重启
+        self.health_check_timeout = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
+        # 熔断：服务器连续失败（超时或连接错误）多少次后熔断
+        self.circuit_failure_threshold = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+        # 熔断持续时间（秒），之后放行一次试探调用
+        self.circuit_reset_timeout = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+        # 工具检索：每次查询只发送与查询最相关的 top_k 个工具，0 表示发送全部工具
+        self.tool_selection_top_k = int(os.getenv("TOOL_SELECTION_TOP_K", "0"))
+        # 启用工具检索时总是发送的工具名（逗号分隔）
+        self.tool_always_include = [name.strip() for name in os.getenv("TOOL_ALWAYS_INCLUDE", "").split(",")
+                                    if name.strip()]
+
+        # 对话配置
+        # 一次查询中模型与工具交替的最大轮数，至少为 2（最后一轮不提供工具，让模型直接回答）
+        self.agent_max_rounds = int(os.getenv("AGENT_MAX_ROUNDS", "10"))
+        # 单次查询的截止时间（秒），到期时取消仍在进行的模型请求和工具调用，0 表示不限制
+        self.query_timeout = float(os.getenv("QUERY_TIMEOUT", "600"))
+        # 交互模式的输出：terminal（完整输出）、quiet（不输出思考过程）或 json（每行一个 JSON 事件）
+        self.output_mode = os.getenv("OUTPUT_MODE", "terminal")
+        # 流式输出合并写出的最小间隔（秒），0 表示每个增量立即写出
+        self.output_frame_interval = float(os.getenv("OUTPUT_FRAME_INTERVAL", "0.03"))
+        # 对话历史的 token 预算（估算值），超出时压缩较早的工具输出和对话
+        self.conversation_token_budget = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "32000"))
+
+        # 回答缓存：相同查询（规范化后）、模型和工具定义在 TTL（秒）内直接返回上次的回答，0 表示关闭
+        self.answer_cache_ttl = float(os.getenv("ANSWER_CACHE_TTL", "0"))
+        self.answer_cache_path = os.getenv("ANSWER_CACHE_PATH", ".answer_cache.db")
+        # 缓存的回答数量上限，超出时淘汰最久未使用的
+        self.answer_cache_max_size = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "1000"))
+
+        # HTTP 服务模式配置（main.py --serve）
+        self.service_host = os.getenv("SERVICE_HOST", "127.0.0.1")
+        self.service_port = int(os.getenv("SERVICE_PORT", "8080"))
+        # 同时处理的查询数上限，超出的请求排队
+        self.service_max_concurrency = int(os.getenv("SERVICE_MAX_CONCURRENCY", "64"))
+        # 服务端保存的多轮对话（conversation_id）数量上限，超出时淘汰最久未使用的
+        self.service_max_conversations = int(os.getenv("SERVICE_MAX_CONVERSATIONS", "1000"))
+
+        # 指标配置（默认关闭）
+        self.metrics_enabled = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+        # 每个跨度/请求事件追加写入的 JSONL 文件
+        self.metrics_jsonl_path = os.getenv("METRICS_JSONL_PATH")
+        # 退出时写入的 Prometheus 文本文件
+        self.metrics_prom_path = os.getenv("METRICS_PROM_PATH")
+        # 提供 /metrics 的本地 HTTP 端口
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))
 
         # 验证必要配置
         self._validate_config()
 
+    def _load_llm_endpoints(self, raw):
+        """解析 LLM_ENDPOINTS，缺省的 api_key、rpm、burst 取 DASHSCOPE_API_KEY、LLM_RPM、LLM_RATE_BURST"""
+        endpoints = json.loads(raw) if raw else [{"base_url": self.base_url, "model": self.model}]
+        # 每个端点每分钟的请求数上限（客户端令牌桶），0 表示不限速；burst 为允许的突发请求数
+        rpm = float(os.getenv("LLM_RPM", "0"))
+        burst = float(os.getenv("LLM_RATE_BURST", "5"))
+        return [{
+            "name": endpoint.get("name") or f"{endpoint['model']}@{endpoint['base_url']}",
+            "base_url": endpoint["base_url"],
+            "model": endpoint["model"],
+            "api_key": endpoint.get("api_key") or self.dashscope_api_key,
+            "rpm": float(endpoint.get("rpm", rpm)),
+            "burst": float(endpoint.get("burst", burst)),
+        } for endpoint in endpoints]
+
     def _validate_config(self):
         """验证必要的配置是否存在"""
         if not self.dashscope_api_key:
             raise ValueError("❌ 未找到 DASHSCOPE API Key，请在 .env 文件中设置 DASHSCOPE_API_KEY")
+        if self.agent_max_rounds < 2:
+            raise ValueError(f"❌ AGENT_MAX_ROUNDS 至少为 2（当前为 {self.agent_max_rounds}）："
+                             "最后一轮不提供工具，只有 1 轮时模型无法调用任何工具")
 
     # def get_tool_env(self, tool_name):
     #     """根据工具名称返回需要的环境变量 apikey 弃用"""
@@ -5,6 +5,25 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 变化后需要重启服务器的配置项；其余配置项（超时、并发上限、缓存等）更新后直接生效
+LAUNCH_KEYS = ("command", "args", "env", "url", "transport", "headers", "replicas")
+
+
+def diff_servers(old_servers, new_servers):
+    """比较前后两份已启用的服务器配置，返回 (新增, 移除, 需要重启, 只需更新配置) 四个服务器 id 列表"""
+    added = [server_id for server_id in new_servers if server_id not in old_servers]
+    removed = [server_id for server_id in old_servers if server_id not in new_servers]
+    restarted, updated = [], []
+    for server_id, new_config in new_servers.items():
+        old_config = old_servers.get(server_id)
+        if old_config is None or old_config == new_config:
+            continue
+        if any(old_config.get(key) != new_config.get(key) for key in LAUNCH_KEYS):
+            restarted.append(server_id)
+        else:
+            updated.append(server_id)
+    return added, removed, restarted, updated
+
 
 class MCPConfigLoader:
     """MCP服务器配置加载器"""
@@ -12,12 +31,14 @@ class MCPConfigLoader:
     def __init__(self, config_file_path="mcp_servers.json"):
         self.config_file_path = config_file_path
         self.mcp_servers = {}
+        self._file_state = None  # 上次读取时文件的 (修改时间, 大小)
         self._load_config()
 
     def _load_config(self):
         """从配置文件加载服务器信息"""
         try:
             if os.path.exists(self.config_file_path):
+                self._file_state = self._stat()
                 with open(self.config_file_path, 'r', encoding='utf-8') as f:
                     config_data = json.load(f)
                     self.mcp_servers = config_data.get("mcpServers", {})
@@ -28,6 +49,25 @@ class MCPConfigLoader:
             logger.error(f"加载配置文件 {self.config_file_path} 失败: {str(e)}")
             raise
 
+    def _stat(self):
+        try:
+            stat = os.stat(self.config_file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """配置文件被修改时重新读取，服务器配置有变化时返回 True
+
+        文件内容不合法（例如编辑到一半）时抛出异常并保留原有配置，文件再次修改后重试。
+        """
+        state = self._stat()
+        if state is None or state == self._file_state:
+            return False
+        previous = self.mcp_servers
+        self._load_config()
+        return self.mcp_servers != previous
+
     def get_enabled_servers(self):
         """获取所有已启用的服务器配置"""
         enabled_servers = {}
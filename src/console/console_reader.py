@@ -0,0 +1,56 @@
+# console_reader.py
+import sys
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class ConsoleReader:
+    """不阻塞事件循环的终端输入：后台线程逐行读取标准输入，通过队列交给事件循环
+
+    查询进行期间输入的行会先排队，之后按顺序处理（用于 /cancel 之外的预输入）。
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self._lines = asyncio.Queue()
+        self._pushed_back = deque()
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._read_lines, name="console-reader", daemon=True)
+        self._thread.start()
+
+    def _read_lines(self):
+        while True:
+            line = self.stream.readline()
+            # 读到 EOF（例如 Ctrl-D 或输入管道结束）时返回 None
+            if not self._deliver(line.rstrip("\n") if line else None) or not line:
+                return
+
+    def _deliver(self, line):
+        try:
+            self._loop.call_soon_threadsafe(self._lines.put_nowait, line)
+            return True
+        except RuntimeError:
+            # 事件循环已关闭
+            return False
+
+    async def readline(self):
+        """返回下一行输入（不含换行符），输入结束或被 close() 中断时返回 None"""
+        if self._pushed_back:
+            return self._pushed_back.popleft()
+        return await self._lines.get()
+
+    def push_back(self, line):
+        """把提前读到的一行放回，下一次 readline() 时按顺序返回"""
+        self._pushed_back.append(line)
+
+    def close(self):
+        """让等待中的 readline() 返回 None"""
+        self._lines.put_nowait(None)
@@ -0,0 +1,169 @@
+# renderer.py
+import sys
+import json
+import time
+import asyncio
+from abc import ABC, abstractmethod
+
+# 输出模式：terminal 完整输出（思考过程、回复内容和工具调用），quiet 只输出回复内容和简短的工具调用提示，
+# json 每行输出一个 JSON 事件，供其他程序读取
+RENDER_MODES = ("terminal", "quiet", "json")
+
+
+class Renderer(ABC):
+    """把 ModelClient.process_query 的事件（on_event）写到输出流
+
+    思考过程和回复内容的增量会先缓存、合并，距离上次写出不足 frame_interval 秒时推迟到下一帧再写出，
+    不再每个 token 调用一次 write/flush；其他事件写出前先写出已缓存的内容，保证顺序不变。
+    reasoning 为 False 时 process_query 不会产生思考过程事件。
+    """
+
+    reasoning = True
+
+    def __init__(self, stream=None, frame_interval=0.03):
+        self.stream = stream or sys.stdout
+        self.frame_interval = frame_interval
+        self._pending_type = None  # 缓存中的增量类型（reasoning / content）
+        self._pending = []
+        self._last_write = 0.0
+        self._timer = None
+
+    def __call__(self, event):
+        event_type = event["type"]
+        if event_type in ("reasoning", "content") and not event.get("cached"):
+            self._buffer(event_type, event["text"])
+            return
+        self.flush()
+        self.render_event(event)
+        self.stream.flush()
+
+    def _buffer(self, event_type, text):
+        if event_type != self._pending_type:
+            self.flush()
+            self._pending_type = event_type
+        self._pending.append(text)
+        wait = self.frame_interval - (time.monotonic() - self._last_write)
+        if wait <= 0:
+            self.flush()
+        elif self._timer is None:
+            try:
+                self._timer = asyncio.get_running_loop().call_later(wait, self.flush)
+            except RuntimeError:
+                # 不在事件循环中（例如同步调用），直接写出
+                self.flush()
+
+    def flush(self):
+        """写出缓存的增量"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        self.render_delta(self._pending_type, text)
+        self.stream.flush()
+        self._last_write = time.monotonic()
+
+    def finish(self, answer=None):
+        """查询结束（包括被取消）时调用，写出剩余的内容"""
+        self.flush()
+        self.stream.flush()
+
+    @abstractmethod
+    def render_delta(self, event_type, text):
+        """写出合并后的思考过程或回复内容增量"""
+
+    @abstractmethod
+    def render_event(self, event):
+        """写出思考过程和回复内容增量以外的事件"""
+
+
+class TerminalRenderer(Renderer):
+    """面向终端的输出；quiet 为 True 时不输出思考过程、分隔标题和工具返回内容"""
+
+    def __init__(self, stream=None, frame_interval=0.03, quiet=False):
+        super().__init__(stream, frame_interval)
+        self.quiet = quiet
+        self.reasoning = not quiet
+        self._at_line_start = True
+        self._answering = False  # 本轮是否已经输出过回复内容标题
+        self._calling_tools = False  # 本轮是否已经输出过工具调用标题
+
+    def _write(self, text):
+        if text:
+            self.stream.write(text)
+            self._at_line_start = text.endswith("\n")
+
+    def _line(self, text):
+        """另起一行输出 text"""
+        self._write(("" if self._at_line_start else "\n") + text + "\n")
+
+    def _title(self, title):
+        if not self.quiet:
+            self._line("=" * 20 + title + "=" * 20)
+
+    def render_delta(self, event_type, text):
+        if event_type == "content" and not self._answering:
+            self._answering = True
+            self._title("回复内容")
+        self._write(text)
+
+    def render_event(self, event):
+        event_type = event["type"]
+        if event_type == "round":
+            self._answering = self._calling_tools = False
+            self._title("思考过程" if event["round"] == 0 else "处理工具返回结果")
+        elif event_type == "content":
+            # 缓存的回答一次性输出
+            self._title("回复内容（缓存）")
+            self._write(event["text"])
+        elif event_type == "tool_call":
+            if not self._calling_tools:
+                self._calling_tools = True
+                self._title("工具调用信息")
+            if self.quiet:
+                self._line(f"[调用工具 {event['name']}]")
+            else:
+                self._line(f"[调用工具 {event['name']} 参数: {event['arguments']}]")
+        elif event_type == "tool_result":
+            if event["is_error"]:
+                self._line(f"⚠️ 工具 {event['name']} 出错: {event['result']}")
+            elif not self.quiet:
+                self._line(f"[工具 {event['name']} 返回: {event['result']}]")
+        elif event_type == "error":
+            self._line(f"⚠️ 发生错误: {event['message']}")
+
+    def finish(self, answer=None):
+        self.flush()
+        if not self._at_line_start:
+            self._write("\n")
+        self.stream.flush()
+        self._answering = self._calling_tools = False
+
+
+class JsonEventRenderer(Renderer):
+    """每行输出一个 JSON 事件；同一帧内连续的思考过程或回复内容增量合并为一个事件，查询结束时输出 done 事件"""
+
+    def _write_event(self, event):
+        self.stream.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def render_delta(self, event_type, text):
+        self._write_event({"type": event_type, "text": text})
+
+    def render_event(self, event):
+        self._write_event(event)
+
+    def finish(self, answer=None):
+        self.flush()
+        self._write_event({"type": "done", "answer": answer})
+        self.stream.flush()
+
+
+def create_renderer(mode, frame_interval=0.03, stream=None):
+    """按输出模式（见 RENDER_MODES）创建渲染器"""
+    if mode == "json":
+        return JsonEventRenderer(stream, frame_interval)
+    if mode in ("terminal", "quiet"):
+        return TerminalRenderer(stream, frame_interval, quiet=mode == "quiet")
+    raise ValueError(f"未知的输出模式 {mode}，可选 {' / '.join(RENDER_MODES)}")
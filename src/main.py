@@ -1,16 +1,22 @@
 # main.py
-import asyncio
 import sys
+import asyncio
+import time
+import signal
 import logging
+import argparse
+import contextlib
 from contextlib import AsyncExitStack
 
 # 导入自定义模块
 from config.config import Config
 from serverconnector.server_connector import ServerConnector
 from modelclient.model_client import ModelClient
-from config.mcp_config_loader import MCPConfigLoader  # 导入配置加载器
+from config.mcp_config_loader import MCPConfigLoader, diff_servers  # 导入配置加载器
+from metrics.metrics import metrics
+from console.console_reader import ConsoleReader
+from console.renderer import RENDER_MODES, create_renderer
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -20,87 +26,337 @@ class MCPApp:
     def __init__(self, config_file_path="mcp_servers.json"):
         self.exit_stack = AsyncExitStack()
         self.config = Config()
+        metrics.configure(enabled=self.config.metrics_enabled, jsonl_path=self.config.metrics_jsonl_path)
         self.server_connector = ServerConnector(self.config, self.exit_stack)
         self.model_client = ModelClient(self.config)
+        self.exit_stack.callback(self.model_client.close)
         self.mcp_config = MCPConfigLoader(config_file_path)
+        self.connect_timings = {}  # server_id -> 连接耗时和状态
+        self._connect_tasks = {}  # server_id -> 连接（含后台重试）任务
+        self._active_servers = {}  # 当前生效的已启用服务器配置，热加载时与新配置比较
+        self._config_watcher = None
 
     async def initialize(self):
-        """初始化应用，连接到配置文件中启用的所有服务器"""
+        """初始化应用，并发连接配置文件中启用的所有服务器"""
         enabled_servers = self.mcp_config.get_enabled_servers()
-        connected_count = 0
+        self._active_servers = enabled_servers
+
+        if metrics.enabled and self.config.metrics_port:
+            await metrics.start_http_endpoint(self.config.metrics_port)
 
+        self.start_config_watcher()
         if not enabled_servers:
             logger.warning("没有找到已启用的MCP服务器配置")
             return False
 
+        # 并发连接时登记顺序不确定，工具名冲突按配置文件中的顺序裁决
+        self.server_connector.tool_registry.set_server_order(enabled_servers)
+        startup_start = time.perf_counter()
+
+        # 每个服务器一个连接任务，首次尝试结束（成功或失败）时完成对应的 future
+        first_attempts = {}
+        lazy_count = 0
         for server_id, server_config in enabled_servers.items():
-            try:
-                await self.server_connector.connect_to_server(server_id, server_config)
-                print(f"✅ 已连接到服务器: {server_id}")
+            first_attempt = self._start_server(server_id, server_config)
+            if first_attempt is None:
+                lazy_count += 1
+            else:
+                first_attempts[server_id] = first_attempt
+
+        # 最多等待到全局启动截止时间，未完成的服务器在后台继续连接
+        if first_attempts:
+            await asyncio.wait(first_attempts.values(), timeout=self.config.startup_deadline)
+
+        connected_count = lazy_count
+        pending_count = 0
+        for server_id, first_attempt in first_attempts.items():
+            if first_attempt.done() and first_attempt.result():
                 connected_count += 1
-            except Exception as e:
-                logger.error(f"连接到服务器 {server_id} 失败: {str(e)}")
-                print(f"⚠️ 连接到服务器 {server_id} 失败: {str(e)}")
+            elif not first_attempt.done():
+                pending_count += 1
+                self.connect_timings[server_id] = {"status": "pending", "attempts": 1,
+                                                   "seconds": time.perf_counter() - startup_start}
+                print(f"⏳ 服务器 {server_id} 未在启动截止时间内完成连接，已跳过并在后台继续连接")
+
+        self._report_connect_timings()
+        self.server_connector.start_idle_reaper(self.config.server_idle_timeout)
+        self.server_connector.start_health_checks(self.config.health_check_interval,
+                                                  self.config.health_check_timeout)
+        # 仍在后台连接的服务器稍后可能可用，只有所有服务器的首次尝试都已失败时才认为初始化失败
+        return connected_count + pending_count > 0
+
+    def _start_server(self, server_id, server_config):
+        """在后台开始连接服务器，返回首次尝试结束时完成的 future；懒启动的服务器返回 None"""
+        # 懒启动模式下，有缓存工具清单的服务器先不启动
+        if self.config.lazy_startup and self.server_connector.register_cached_server(server_id, server_config):
+            self.connect_timings[server_id] = {"status": "lazy", "seconds": 0.0, "attempts": 0}
+            print(f"💤 服务器 {server_id} 将在首次调用其工具时启动（使用缓存的工具清单）")
+            return None
 
-        return connected_count > 0
+        first_attempt = asyncio.get_running_loop().create_future()
+        self._connect_tasks[server_id] = asyncio.create_task(
+            self._connect_server(server_id, server_config, first_attempt)
+        )
+        return first_attempt
 
-    async def chat_loop(self):
-        """运行交互式聊天循环"""
-        print("\n🤖 MCP 客户端已启动！输入 'quit' 或 'exit' 或 'q'退出")
+    async def _stop_server(self, server_id):
+        """停止服务器（包括仍在后台重试的连接）并移除其工具"""
+        task = self._connect_tasks.pop(server_id, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.server_connector.remove_server(server_id)
+        self.connect_timings.pop(server_id, None)
 
+    def start_config_watcher(self):
+        """启动后台任务，定期检查配置文件，变化时只启动、停止或重启有变化的服务器"""
+        interval = self.config.config_reload_interval
+        if self._config_watcher is None and interval > 0:
+            self._config_watcher = asyncio.create_task(self._watch_config(interval))
+
+    async def _watch_config(self, interval):
         while True:
+            await asyncio.sleep(interval)
+            try:
+                changed = self.mcp_config.reload()
+            except Exception as e:
+                # 文件可能还在编辑中，保留当前配置，等下次修改后再试
+                logger.error(f"重新加载 {self.mcp_config.config_file_path} 失败，继续使用当前配置: {e}")
+                continue
+            if changed:
+                await self.apply_server_config(self.mcp_config.get_enabled_servers())
+
+    async def apply_server_config(self, enabled_servers):
+        """按新的已启用服务器配置调整运行中的服务器，未变化的服务器和其上正在进行的调用不受影响"""
+        added, removed, restarted, updated = diff_servers(self._active_servers, enabled_servers)
+        self._active_servers = enabled_servers
+        self.server_connector.tool_registry.set_server_order(enabled_servers)
+
+        for server_id in updated:
+            self.server_connector.update_server_config(server_id, enabled_servers[server_id])
+        await asyncio.gather(*(self._stop_server(server_id) for server_id in removed + restarted))
+        for server_id in added + restarted:
+            self._start_server(server_id, enabled_servers[server_id])
+
+        if added or removed or restarted or updated:
+            metrics.inc("config_reloads_total")
+            print(f"\n🔄 已重新加载 {self.mcp_config.config_file_path}：新增 {added or '无'}，"
+                  f"停止 {removed or '无'}，重启 {restarted or '无'}，更新配置 {updated or '无'}")
+        return added, removed, restarted, updated
+
+    async def _connect_server(self, server_id, server_config, first_attempt):
+        """连接单个服务器，失败时按指数退避在后台重试"""
+        timeout = float(server_config.get("connectTimeout", self.config.server_connect_timeout))
+        max_attempts = 1 + self.config.server_connect_retries
+
+        for attempt in range(1, max_attempts + 1):
+            start = time.perf_counter()
             try:
+                await asyncio.wait_for(
+                    self.server_connector.connect_to_server(server_id, server_config), timeout=timeout
+                )
+                elapsed = time.perf_counter() - start
+                self.connect_timings[server_id] = {"status": "connected", "seconds": elapsed, "attempts": attempt}
+                if first_attempt.done():
+                    print(f"\n✅ 后台连接成功: {server_id} ({elapsed:.2f}s, 第 {attempt} 次尝试)")
+                else:
+                    print(f"✅ 已连接到服务器: {server_id} ({elapsed:.2f}s)")
+                    first_attempt.set_result(True)
+                return True
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                error = "连接超时" if isinstance(e, asyncio.TimeoutError) else str(e)
+                self.connect_timings[server_id] = {"status": "failed", "seconds": elapsed, "attempts": attempt,
+                                                   "error": error}
+                logger.error(f"连接到服务器 {server_id} 失败（第 {attempt} 次）: {error}")
+                if not first_attempt.done():
+                    print(f"⚠️ 连接到服务器 {server_id} 失败: {error}")
+                    first_attempt.set_result(False)
+
+            if attempt < max_attempts:
+                await asyncio.sleep(min(2 ** attempt, 60))
+
+        return False
+
+    def _report_connect_timings(self):
+        """按耗时从高到低输出各服务器的连接耗时"""
+        print("\n" + "=" * 20 + "服务器连接耗时" + "=" * 20)
+        for server_id, timing in sorted(self.connect_timings.items(), key=lambda item: -item[1]["seconds"]):
+            print(f"{server_id}: {timing['status']} {timing['seconds']:.2f}s (尝试 {timing['attempts']} 次)")
+            logger.info(f"服务器 {server_id} 连接耗时: {timing}")
+
+    async def chat_loop(self, renderer=None):
+        """运行交互式聊天循环
+
+        输入在后台线程中读取，不阻塞事件循环；查询进行中按 Ctrl-C 或输入 /cancel 只取消当前查询，
+        MCP 会话保持不变，在提示符处按 Ctrl-C 退出。查询的输出由 renderer 负责（默认按 OUTPUT_MODE 创建）。
+        """
+        if renderer is None:
+            renderer = create_renderer(self.config.output_mode, self.config.output_frame_interval)
+        print("\n🤖 MCP 客户端已启动！输入 'quit' 或 'exit' 或 'q'退出，输入 '/clear' 清空对话历史，"
+              "查询进行中按 Ctrl-C 或输入 '/cancel' 取消当前查询")
+
+        reader = ConsoleReader()
+        reader.start()
+        loop = asyncio.get_running_loop()
+        # 等待输入期间在后台线程中预先导入模型客户端的依赖，第一次查询不必再等待
+        loop.run_in_executor(None, self.model_client.scheduler.preload)
+        query_task = None
+
+        def on_interrupt():
+            if query_task is not None and not query_task.done():
+                query_task.cancel()
+            else:
+                print("\n👋 程序被中断，正在退出...")
+                reader.close()
+
+        try:
+            loop.add_signal_handler(signal.SIGINT, on_interrupt)
+        except NotImplementedError:
+            # Windows 不支持 add_signal_handler，Ctrl-C 仍按默认方式退出
+            pass
+
+        try:
+            while True:
                 # 使用清晰的提示符
-                user_input = input("\n👤 > ").strip()
+                print("\n👤 > ", end="", flush=True)
+                user_input = await reader.readline()
+                if user_input is None:
+                    break
+                user_input = user_input.strip()
 
                 # 检查输入是否为退出命令
                 if user_input.lower() in ['quit', 'exit', 'q']:
                     print("👋 正在退出...")
                     break
 
+                if user_input == '/clear':
+                    self.model_client.conversation.clear()
+                    print("🧹 对话历史已清空")
+                    continue
+
                 # 检查输入是否为空或只包含特殊字符
-                if not user_input or all(c in '=- \t\n' for c in user_input):
+                if not user_input or all(c in '=- \t\n' for c in user_input) or user_input == '/cancel':
                     continue  # 跳过空白或只含特殊字符的输入
 
                 # 处理有效输入
-                await self.model_client.process_query(user_input, self.server_connector)
-            except KeyboardInterrupt:
-                print("\n👋 程序被中断，正在退出...")
-                break
-            except Exception as e:
-                logger.error(f"处理查询时出错: {e}", exc_info=True)
-                print(f"\n⚠️ 发生错误: {str(e)}")
+                query_task = asyncio.create_task(
+                    self.model_client.process_query(user_input, self.server_connector, on_event=renderer,
+                                                    reasoning=renderer.reasoning)
+                )
+                await self._wait_query(query_task, reader, renderer)
+                query_task = None
+        finally:
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+            except NotImplementedError:
+                pass
+
+    @staticmethod
+    async def _wait_query(query_task, reader, renderer):
+        """等待查询完成，期间输入 /cancel 取消查询，其他输入留到查询结束后处理"""
+        next_line = None
+        pending = []  # 查询期间输入的其他行
+        try:
+            while not query_task.done():
+                # 输入结束后不再读取，只等待查询完成
+                if next_line is None and None not in pending:
+                    next_line = asyncio.ensure_future(reader.readline())
+                await asyncio.wait({query_task} | ({next_line} if next_line else set()),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if next_line is None or not next_line.done():
+                    continue
+                line = next_line.result()
+                next_line = None
+                if line is not None and line.strip() == '/cancel':
+                    query_task.cancel()
+                else:
+                    pending.append(line)
+            renderer.finish(await query_task)
+        except asyncio.CancelledError:
+            if not query_task.cancelled():
+                raise
+            renderer.finish()
+            print("\n⏹️ 已取消当前查询")
+        except Exception as e:
+            logger.error(f"处理查询时出错: {e}", exc_info=True)
+            renderer.finish()
+            print(f"\n⚠️ 发生错误: {str(e)}")
+        finally:
+            if next_line is not None:
+                next_line.cancel()
+            for line in pending:
+                reader.push_back(line)
 
     async def cleanup(self):
         """清理资源"""
         print("🧹 正在清理资源...")
+        logger.info(f"工具注册表统计: {self.server_connector.get_tool_stats()}")
+        logger.info(f"工具结果缓存统计: {self.server_connector.get_cache_stats()}")
+        if self._config_watcher is not None:
+            self._config_watcher.cancel()
+            await asyncio.gather(self._config_watcher, return_exceptions=True)
+        for task in self._connect_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._connect_tasks.values(), return_exceptions=True)
         await self.exit_stack.aclose()
+        if metrics.enabled and self.config.metrics_prom_path:
+            metrics.write_prometheus(self.config.metrics_prom_path)
+        await metrics.close()
         print("✅ 资源已清理完毕")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="MCP 客户端")
+    # 允许用户指定配置文件路径
+    parser.add_argument("config_file", nargs="?", default="mcp_servers.json", help="MCP 服务器配置文件")
+    parser.add_argument("--batch", help="批处理模式：JSONL 查询文件，每行 {\"id\": ..., \"query\": ...}")
+    parser.add_argument("--concurrency", type=int, default=4, help="批处理模式同时处理的查询数")
+    parser.add_argument("--out", help="批处理结果 JSONL 文件，已存在时跳过其中成功完成的查询")
+    parser.add_argument("--serve", action="store_true", help="HTTP 服务模式，所有请求共享同一组 MCP 会话")
+    parser.add_argument("--host", help="HTTP 服务监听地址，默认取环境变量 SERVICE_HOST")
+    parser.add_argument("--port", type=int, help="HTTP 服务端口，默认取环境变量 SERVICE_PORT")
+    parser.add_argument("--output", choices=RENDER_MODES,
+                        help="交互模式的输出：terminal、quiet（不输出思考过程）或 json（每行一个 JSON 事件），默认取环境变量 OUTPUT_MODE")
+    args = parser.parse_args()
+    if args.batch and not args.out:
+        parser.error("--batch 需要同时指定 --out")
+    return args
+
+
 async def main():
     """主函数"""
-    # 允许用户指定配置文件路径
-    config_file = "mcp_servers.json"
-    if len(sys.argv) > 1:
-        config_file = sys.argv[1]
+    args = parse_args()
 
-    app = MCPApp(config_file)
-    try:
-        connected = await app.initialize()
-        if not connected:
-            print("⚠️ 未能成功连接到任何服务器，程序将退出")
-            return
+    app = MCPApp(args.config_file)
+    output_mode = args.output or app.config.output_mode
+    # 渲染器绑定当前的标准输出；json 模式下标准输出只留给 JSON 事件，提示符和状态信息改写到标准错误
+    renderer = create_renderer(output_mode, app.config.output_frame_interval)
+    with contextlib.redirect_stdout(sys.stderr) if output_mode == "json" else contextlib.nullcontext():
+        try:
+            connected = await app.initialize()
+            if not connected:
+                print("⚠️ 未能成功连接到任何服务器，程序将退出")
+                return
 
-        await app.chat_loop()
-    except Exception as e:
-        logger.error(f"程序运行时出错: {e}", exc_info=True)
-        print(f"⚠️ 程序出现错误: {str(e)}")
-    finally:
-        await app.cleanup()
+            if args.batch:
+                from batch.batch_runner import BatchRunner
+                await BatchRunner(app, args.concurrency).run(args.batch, args.out)
+            elif args.serve:
+                # 服务模式的依赖（starlette、uvicorn）只在需要时导入
+                from service.http_service import serve
+                await serve(app, args.host or app.config.service_host, args.port or app.config.service_port)
+            else:
+                await app.chat_loop(renderer)
+        except Exception as e:
+            logger.error(f"程序运行时出错: {e}", exc_info=True)
+            print(f"⚠️ 程序出现错误: {str(e)}")
+        finally:
+            await app.cleanup()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
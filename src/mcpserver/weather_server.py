@@ -1,24 +1,74 @@
 import json
 import os
+import time
+import asyncio
+import importlib.util
 import httpx
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from typing import Any
 from mcp.server.fastmcp import FastMCP
 
 load_dotenv()
 
-# 初始化 MCP 服务器
-mcp = FastMCP("WeatherServer")
-
 # OpenWeather API 配置
-OPENWEATHER_API_BASE = "https://api.openweathermap.org/data/2.5/weather"
+# 可通过环境变量改成本地桩服务的地址，便于测试
+OPENWEATHER_API_BASE = os.getenv("OPENWEATHER_API_BASE", "https://api.openweathermap.org/data/2.5/weather")
 API_KEY = os.getenv("OPENWEATHER_API_KEY")  # 从环境变量中读取API_KEY
 USER_AGENT = "weather-app/1.0"
+UNITS = "metric"
+LANG = "zh_cn"
+# 天气数据的短期缓存时间（秒），设为 0 关闭缓存
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "60"))
+# 缓存的最大条目数，超出时淘汰最久未使用的城市
+WEATHER_CACHE_MAX_SIZE = int(os.getenv("WEATHER_CACHE_MAX_SIZE", "1024"))
+
+# 进程内共享的 HTTP 客户端（连接池 + keep-alive）；h2 不是默认依赖，
+# 执行 pip install "httpx[http2]" 安装后才会启用 HTTP/2，否则使用 HTTP/1.1
+_http_client: httpx.AsyncClient | None = None
+# 正在进行中的请求，相同 (city, units, lang) 的并发查询合并为一次上游请求
+_inflight: dict[tuple[str, str, str], asyncio.Future] = {}
+# 短期缓存（LRU）: (city, units, lang) -> (过期时间, 天气数据)
+_cache: OrderedDict[tuple[str, str, str], tuple[float, dict[str, Any]]] = OrderedDict()
+
+
+class _LeaderCancelled(Exception):
+    """发起上游请求的查询被取消，合并到这次请求的其他查询需要重新发起"""
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的 HTTP 客户端，首次使用时创建"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            headers={"User-Agent": USER_AGENT},
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+        )
+    return _http_client
+
+
+@asynccontextmanager
+async def lifespan(server):
+    """服务器退出时关闭共享的 HTTP 客户端"""
+    global _http_client
+    try:
+        yield {}
+    finally:
+        if _http_client is not None:
+            await _http_client.aclose()
+            _http_client = None
+
+
+# 初始化 MCP 服务器
+mcp = FastMCP("WeatherServer", lifespan=lifespan)
 
 
 async def fetch_weather(city: str) -> dict[str, Any] | None:
     """
-    从 OpenWeather API 获取天气信息。
+    从 OpenWeather API 获取天气信息，相同城市的并发请求会被合并，结果短期缓存。
     :param city: 城市名称（需使用英文，如 Beijing）
     :return: 天气数据字典；若出错返回包含 error 信息的字典
     """
@@ -26,27 +76,74 @@ async def fetch_weather(city: str) -> dict[str, Any] | None:
     if not API_KEY:
         raise ValueError("❌ 未找到 OPENWEATHER_API_KEY 请配置在json文件中")
 
+    key = (city.strip().lower(), UNITS, LANG)
+    while True:
+        cached = _cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                _cache.move_to_end(key)
+                return cached[1]
+            del _cache[key]
+
+        inflight = _inflight.get(key)
+        if inflight is None:
+            break
+        try:
+            return await asyncio.shield(inflight)
+        except _LeaderCancelled:
+            # 由第一个重试的查询接替发起请求，其余查询继续合并到新的请求
+            continue
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        data = await _request_weather(city)
+        if "error" not in data and WEATHER_CACHE_TTL > 0:
+            _cache_put(key, data)
+        future.set_result(data)
+        return data
+    except asyncio.CancelledError:
+        # 不取消共享的 future，否则合并进来的查询也会被当作取消
+        future.set_exception(_LeaderCancelled())
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # 避免没有其他等待者时出现 "exception was never retrieved" 警告
+        future.exception()
+        raise
+    finally:
+        del _inflight[key]
+
+
+def _cache_put(key: tuple[str, str, str], data: dict[str, Any]) -> None:
+    """写入缓存，超过 WEATHER_CACHE_MAX_SIZE 时先淘汰已过期的条目，再淘汰最久未使用的"""
+    now = time.monotonic()
+    _cache[key] = (now + WEATHER_CACHE_TTL, data)
+    _cache.move_to_end(key)
+    if len(_cache) > WEATHER_CACHE_MAX_SIZE:
+        for expired in [k for k, (expires_at, _) in _cache.items() if expires_at <= now]:
+            del _cache[expired]
+    while len(_cache) > WEATHER_CACHE_MAX_SIZE:
+        _cache.popitem(last=False)
+
+
+async def _request_weather(city: str) -> dict[str, Any]:
+    """向 OpenWeather 发出一次实际请求"""
     params = {
         "q": city,
         "appid": API_KEY,
-        "units": "metric",
-        "lang": "zh_cn"
+        "units": UNITS,
+        "lang": LANG
     }
-    headers = {"User-Agent": USER_AGENT}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                OPENWEATHER_API_BASE,
-                params=params,
-                headers=headers,
-                timeout=30.0
-            )
-            response.raise_for_status()
-            return response.json()  # 返回字典类型
-        except httpx.HTTPStatusError as e:
-            return {"error": f"HTTP 错误: {e.response.status_code}"}
-        except Exception as e:
-            return {"error": f"请求失败: {str(e)}"}
+    try:
+        response = await get_http_client().get(OPENWEATHER_API_BASE, params=params)
+        response.raise_for_status()
+        return response.json()  # 返回字典类型
+    except httpx.HTTPStatusError as e:
+        return {"error": f"HTTP 错误: {e.response.status_code}"}
+    except Exception as e:
+        return {"error": f"请求失败: {str(e)}"}
 
 
 def format_weather(data: dict[str, Any] | str) -> str:
@@ -96,6 +193,20 @@ async def query_weather(city: str) -> str:
     return format_weather(data)
 
 
+@mcp.tool()
+async def query_weather_batch(cities: list[str]) -> str:
+    """
+    一次查询多个城市的今日天气，各城市并发查询。
+    :param cities: 城市名称列表（需使用英文）
+    :return: 按输入顺序拼接的格式化天气信息
+    """
+    results = await asyncio.gather(*(fetch_weather(city) for city in cities), return_exceptions=True)
+    return "\n".join(
+        format_weather({"error": f"{city}: {result}"} if isinstance(result, Exception) else result)
+        for city, result in zip(cities, results)
+    )
+
+
 if __name__ == "__main__":
     # 以标准 I/O 方式运行 MCP 服务器
     mcp.run(transport='stdio')
@@ -0,0 +1,225 @@
+# metrics.py
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 直方图默认分桶（秒），覆盖从毫秒级工具调用到分钟级模型生成
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _NoopSpan:
+    """关闭指标时使用的空跨度，不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **labels):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """记录一段操作耗时的跨度，结束时写入直方图和 JSONL"""
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        self.labels["status"] = "error" if exc_type else self.labels.get("status", "ok")
+        self.registry.observe(f"{self.name}_seconds", duration, **self.labels)
+        self.registry.emit({"type": "span", "name": self.name, "duration": duration, **self.labels})
+        return False
+
+    def set(self, **labels):
+        """在跨度结束前补充标签"""
+        self.labels.update(labels)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Metrics:
+    """进程内的计数器、直方图和耗时跨度，可导出为 JSONL 和 Prometheus 文本格式
+
+    默认关闭；关闭时 span() 返回共享的空跨度，inc()/observe() 直接返回，几乎没有开销。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._counters = {}  # (name, labels) -> 值
+        self._histograms = {}  # (name, labels) -> _Histogram
+        self._gauges = {}  # (name, labels) -> 当前值
+        self._jsonl = None
+        self._lock = threading.Lock()
+        self._server = None
+
+    def configure(self, enabled=False, jsonl_path=None):
+        """启用或关闭指标，jsonl_path 不为空时把每个事件追加写入该文件"""
+        self.enabled = enabled
+        if enabled and jsonl_path:
+            self._jsonl = open(jsonl_path, "a", encoding="utf-8")
+
+    def span(self, name, **labels):
+        """返回记录 name 耗时的上下文管理器"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, labels)
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """设置仪表的当前值"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """向直方图记录一个观测值"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def emit(self, event):
+        """写入一条 JSONL 事件"""
+        if self._jsonl is None:
+            return
+        event.setdefault("ts", time.time())
+        with self._lock:
+            self._jsonl.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def snapshot(self):
+        """返回当前计数器和直方图的字典形式"""
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in self._counters.items()],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in self._gauges.items()],
+                "histograms": [{"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum}
+                               for (name, labels), h in self._histograms.items()],
+            }
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} gauge")
+                    typed.add(name)
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """把 Prometheus 文本写入文件（先写临时文件再替换，避免读到半个文件）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    async def start_http_endpoint(self, port, host="127.0.0.1"):
+        """在 http://host:port/metrics 提供 Prometheus 文本"""
+
+        async def handle(reader, writer):
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+                body = self.to_prometheus().encode("utf-8")
+                writer.write(b"HTTP/1.1 200 OK\r\n"
+                             b"Content-Type: text/plain; version=0.0.4\r\n"
+                             b"Content-Length: " + str(len(body)).encode("ascii") + b"\r\n"
+                             b"Connection: close\r\n\r\n" + body)
+                await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                pass
+            finally:
+                writer.close()
+
+        self._server = await asyncio.start_server(handle, host, port)
+        logger.info(f"指标接口已启动: http://{host}:{port}/metrics")
+
+    async def close(self):
+        """关闭 HTTP 接口和 JSONL 文件"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        escaped = (
+            key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+            for key, value in labels
+        )
+        return "{" + ",".join(escaped) + "}"
+
+
+# 进程内共享的指标实例
+metrics = Metrics()
@@ -0,0 +1,98 @@
+# answer_cache.py
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# 查询末尾不影响语义的标点
+_TRAILING_PUNCTUATION = "?？!！.。~～ "
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 每次查询的缓存模式：use 读写缓存，refresh 不读缓存但写入新回答，off 完全不使用缓存
+CACHE_MODES = ("use", "refresh", "off")
+
+
+def normalize_query(query):
+    """规范化查询文本：全角转半角、英文转小写、合并空白、去掉末尾标点"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    return _WHITESPACE_RE.sub(" ", text).strip().rstrip(_TRAILING_PUNCTUATION)
+
+
+def tools_fingerprint(tools):
+    """发送给模型的工具定义的哈希，工具或参数定义变化后旧回答自动失效"""
+    raw = json.dumps(tools or [], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """查询回答缓存：保存在 SQLite 中（重启后仍然有效），按 TTL 过期，超过容量时淘汰最久未使用的回答
+
+    只缓存不依赖上下文的单独查询（对话历史为空）且所有工具调用都成功的回答。
+    """
+
+    def __init__(self, path, ttl, max_size=1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._conn = sqlite3.connect(path)
+        # 命中时也要更新 last_used，WAL 模式下每次提交不必等待整库同步
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, query TEXT NOT NULL, answer TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        # 启动时顺带清理已过期的记录
+        self._conn.execute("DELETE FROM answers WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(query, model, tools):
+        """缓存键：规范化查询 + 模型 + 工具定义哈希"""
+        raw = f"{normalize_query(query)}\0{model}\0{tools_fingerprint(tools)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """返回缓存的回答，未命中或已过期时返回 None"""
+        now = time.time()
+        row = self._conn.execute("SELECT answer FROM answers WHERE key = ? AND expires_at > ?",
+                                 (key, now)).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.stats["hits"] += 1
+        return row[0]
+
+    def put(self, key, query, answer):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO answers (key, query, answer, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, query, answer, now + self.ttl, now)
+        )
+        # 超出容量时先删过期的，再按最久未使用淘汰
+        count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count > self.max_size:
+            self._conn.execute("DELETE FROM answers WHERE expires_at <= ?", (now,))
+            evicted = self._conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used LIMIT "
+                "max(0, (SELECT COUNT(*) FROM answers) - ?))", (self.max_size,)
+            ).rowcount
+            self.stats["evictions"] += evicted
+        self._conn.commit()
+        self.stats["stores"] += 1
+
+    def close(self):
+        self._conn.close()
+
+    def get_stats(self):
+        return {**self.stats, "size": self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]}
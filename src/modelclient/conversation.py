@@ -0,0 +1,122 @@
+# conversation.py
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 被压缩的工具输出替换成的占位文本
+COMPACTED_PREFIX = "[较早的工具输出已省略"
+COMPACTED_TOOL_OUTPUT = COMPACTED_PREFIX + "，原始长度 {length} 字符]"
+
+
+def estimate_tokens(message):
+    """粗略估算一条消息的 token 数：ASCII 约 4 字符 1 个 token，其他字符（如中文）约 1 字符 1 个 token"""
+    text = message.get("content") or ""
+    if message.get("tool_calls"):
+        text += json.dumps(message["tool_calls"], ensure_ascii=False)
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars) + 4
+
+
+class Conversation:
+    """跨多轮对话保存消息历史，并把历史控制在 token 预算内
+
+    已加入的消息只会在超出预算时被整体压缩，压缩会一次降到预算的 compact_ratio 以下，
+    之后若干轮都不再改动，这样请求的消息前缀在轮次之间保持逐字节一致，服务端前缀缓存可以持续命中。
+    """
+
+    def __init__(self, token_budget=32000, compact_ratio=0.75):
+        self.token_budget = token_budget
+        self.compact_ratio = compact_ratio
+        self.messages = []
+        self._tokens = []  # 与 messages 一一对应的 token 估算值
+        self._turn_start = 0  # 当前一轮对话在 messages 中的起始位置，之后的消息不会被压缩
+        self.stats = {"compacted_tool_outputs": 0, "dropped_messages": 0}
+
+    def append(self, message):
+        """追加一条消息"""
+        self.messages.append(message)
+        self._tokens.append(estimate_tokens(message))
+
+    def begin_turn(self, message):
+        """以一条用户消息开始新的一轮对话"""
+        self._turn_start = len(self.messages)
+        self.append(message)
+
+    def abort_turn(self):
+        """丢弃当前一轮新增的所有消息（例如本轮出错时），避免留下不成对的工具调用"""
+        del self.messages[self._turn_start:]
+        del self._tokens[self._turn_start:]
+
+    def clear(self):
+        """清空对话历史"""
+        self.messages.clear()
+        self._tokens.clear()
+        self._turn_start = 0
+
+    def total_tokens(self):
+        return sum(self._tokens)
+
+    def build_messages(self):
+        """返回本次请求使用的消息列表，超出预算时先压缩当前一轮之前的历史，仍超出时再压缩当前一轮较早的工具输出"""
+        if self.total_tokens() > self.token_budget:
+            self._compact(self._turn_start)
+        return self.messages
+
+    def _compact(self, protect_from):
+        """依次压缩最早的工具输出、从最早的一轮对话开始整轮丢弃、压缩当前一轮中之前各步的工具输出，
+        直到降到预算的 compact_ratio 以下；当前一轮的用户消息和最近一步的工具输出始终保留"""
+        target = int(self.token_budget * self.compact_ratio)
+        total = self.total_tokens()
+        compacted = 0
+
+        total, count = self._compact_tool_outputs(0, protect_from, total, target)
+        compacted += count
+
+        # 整轮丢弃（从一条用户消息到下一条用户消息之前），保证工具调用和工具结果成对出现；
+        # protect_from 处是当前一轮的用户消息，因此上一轮也可以被丢弃
+        drop = 0
+        while total > target:
+            next_user = next((i for i in range(drop + 1, protect_from + 1)
+                              if self.messages[i].get("role") == "user"), None)
+            if next_user is None:
+                break
+            total -= sum(self._tokens[drop:next_user])
+            drop = next_user
+        if drop:
+            del self.messages[:drop]
+            del self._tokens[:drop]
+            self._turn_start -= drop
+            self.stats["dropped_messages"] += drop
+
+        # 当前一轮本身超出预算时，压缩最后一条带工具调用的助手消息之前（即之前各步）的工具输出
+        if total > target:
+            last_call = next((i for i in range(len(self.messages) - 1, self._turn_start, -1)
+                              if self.messages[i].get("tool_calls")), self._turn_start)
+            total, count = self._compact_tool_outputs(self._turn_start, last_call, total, target)
+            compacted += count
+
+        if drop or compacted:
+            logger.info(f"对话历史已压缩到约 {total} tokens（预算 {self.token_budget}）: {self.stats}")
+
+    def _compact_tool_outputs(self, start, end, total, target):
+        """把 [start, end) 中的工具输出从最早的开始替换成占位文本，直到总量不超过 target，返回 (压缩后总量, 压缩条数)"""
+        count = 0
+        for i in range(start, end):
+            if total <= target:
+                break
+            message = self.messages[i]
+            if message.get("role") != "tool" or (message.get("content") or "").startswith(COMPACTED_PREFIX):
+                continue
+            compacted = {
+                "role": "tool",
+                "tool_call_id": message.get("tool_call_id"),
+                "content": COMPACTED_TOOL_OUTPUT.format(length=len(message.get("content") or "")),
+            }
+            self.messages[i] = compacted
+            tokens = estimate_tokens(compacted)
+            total -= self._tokens[i] - tokens
+            self._tokens[i] = tokens
+            count += 1
+        self.stats["compacted_tool_outputs"] += count
+        return total, count
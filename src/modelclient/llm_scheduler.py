@@ -0,0 +1,222 @@
+# llm_scheduler.py
+import time
+import random
+import asyncio
+import logging
+
+from metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LLMStreamStalled(Exception):
+    """流式输出在 stall_timeout 内没有收到新数据"""
+
+
+class TokenBucket:
+    """客户端令牌桶：按 rate（每秒）补充令牌，最多积累 capacity 个；rate 为 0 时不限速"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取出一个令牌，令牌不足时等待，返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        # 排队保证先到先得，避免等待中的请求被后来的请求插队
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class Endpoint:
+    """一个模型端点（地址 + 模型 + 密钥），有独立的连接池和限速"""
+
+    def __init__(self, name, base_url, model, api_key, rpm=0, burst=5, timeout=300):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.bucket = TokenBucket(rpm / 60, burst)
+        self._client = None
+
+    @property
+    def client(self):
+        """端点的 AsyncOpenAI 客户端，首次使用时才导入 openai 并创建（openai 的导入耗时占启动时间的大头）"""
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            # 重试由调度器统一处理，关闭 SDK 自带的重试
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                       timeout=httpx.Timeout(self.timeout, connect=10))
+        return self._client
+
+
+class LLMStream:
+    """已收到首个 chunk 的模型流；迭代时超过 stall_timeout 没有新 chunk 则抛出 LLMStreamStalled"""
+
+    def __init__(self, endpoint, stream, iterator, first_chunk, stall_timeout):
+        self.endpoint = endpoint
+        self._stream = stream
+        self._iterator = iterator
+        self._first_chunk = first_chunk  # 流没有任何输出就结束时为 None
+        self._stall_timeout = stall_timeout
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._stream.close()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        if self._first_chunk is None:
+            return
+        yield self._first_chunk
+        while True:
+            try:
+                # asyncio.timeout 只注册一个定时回调，不像 wait_for 那样为每个 chunk 创建任务
+                async with asyncio.timeout(self._stall_timeout or None):
+                    chunk = await anext(self._iterator)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                metrics.inc("llm_stream_stalls_total", endpoint=self.endpoint.name)
+                raise LLMStreamStalled(f"模型 {self.endpoint.model} 超过 {self._stall_timeout:g}s 没有输出新内容")
+            yield chunk
+
+
+class LLMScheduler:
+    """模型请求调度：多端点故障转移、客户端限速、429/5xx 抖动退避重试、首 token 超时后对冲请求
+
+    请求总是先发往第一个端点；重试时轮换到下一个端点。超过 hedge_after 秒仍没有首个 chunk 时，
+    向下一个端点再发一份相同的请求，先返回首个 chunk 的流胜出，另一个被关闭。
+    首个 chunk 到达后不再重试（内容已经输出），之后的停顿由 LLMStream 检测。
+    """
+
+    def __init__(self, config):
+        self.endpoints = [Endpoint(**endpoint) for endpoint in config.llm_endpoints]
+        self.max_retries = config.llm_max_retries
+        self.retry_base_delay = config.llm_retry_base_delay
+        self.retry_max_delay = config.llm_retry_max_delay
+        self.hedge_after = config.llm_hedge_after
+        self.stall_timeout = config.llm_stall_timeout
+
+    @property
+    def primary(self):
+        return self.endpoints[0]
+
+    @staticmethod
+    def preload():
+        """导入 openai（可在后台线程中调用，与等待用户输入重叠）"""
+        import openai
+
+    async def open_stream(self, request):
+        """发起流式请求（request 不含 model），返回已收到首个 chunk 的 LLMStream"""
+        primary = asyncio.create_task(self._open_with_retries(0, request))
+        attempts = {primary}
+        hedged = False
+        try:
+            if self.hedge_after > 0 and len(self.endpoints) > 1:
+                done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+                if not done:
+                    logger.warning(f"{self.hedge_after:g}s 内没有收到首个 token，向备用端点发起对冲请求")
+                    metrics.inc("llm_hedged_requests_total")
+                    attempts.add(asyncio.create_task(self._open_with_retries(1, request)))
+                    hedged = True
+
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is None:
+                    error = error or next(iter(done)).exception()
+                    continue
+                # 同时完成的其他流交给 finally 关闭
+                attempts |= done - {winner}
+                if hedged:
+                    metrics.inc("llm_hedge_wins_total", winner="primary" if winner is primary else "hedge")
+                return winner.result()
+            raise error
+        finally:
+            await self._discard(attempts)
+
+    @staticmethod
+    async def _discard(attempts):
+        """取消尚未完成的请求，关闭已经打开但落选的流"""
+        for task in attempts:
+            task.cancel()
+        for result in await asyncio.gather(*attempts, return_exceptions=True):
+            if isinstance(result, LLMStream):
+                await result.__aexit__(None, None, None)
+
+    async def _open_with_retries(self, offset, request):
+        """从第 offset 个端点开始请求，可重试的错误按抖动退避后换下一个端点重试"""
+        for attempt in range(self.max_retries + 1):
+            endpoint = self.endpoints[(offset + attempt) % len(self.endpoints)]
+            try:
+                return await self._open(endpoint, request)
+            except Exception as e:
+                reason = self._retry_reason(e)
+                if reason is None or attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                metrics.inc("llm_retries_total", endpoint=endpoint.name, reason=reason)
+                logger.warning(f"模型端点 {endpoint.name} 请求失败（{reason}），{delay:.2f}s 后重试: {e}")
+                await asyncio.sleep(delay)
+
+    async def _open(self, endpoint, request):
+        waited = await endpoint.bucket.acquire()
+        if waited:
+            metrics.observe("llm_rate_limit_wait_seconds", waited, endpoint=endpoint.name)
+
+        start = time.perf_counter()
+        stream = await endpoint.client.chat.completions.create(model=endpoint.model, **request)
+        iterator = stream.__aiter__()
+        try:
+            first_chunk = await anext(iterator, None)
+        except BaseException:
+            await stream.close()
+            raise
+        metrics.observe("llm_endpoint_ttft_seconds", time.perf_counter() - start, endpoint=endpoint.name)
+        return LLMStream(endpoint, stream, iterator, first_chunk, self.stall_timeout)
+
+    @staticmethod
+    def _retry_reason(error):
+        """返回可重试错误的类别，不可重试时返回 None"""
+        import openai
+        if isinstance(error, openai.RateLimitError):
+            return "429"
+        if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+            return "5xx"
+        if isinstance(error, openai.APITimeoutError):
+            return "timeout"
+        if isinstance(error, openai.APIConnectionError):
+            return "connection"
+        return None
+
+    def _retry_delay(self, error, attempt):
+        """优先使用服务端的 Retry-After，否则按 full jitter 指数退避"""
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                return min(self.retry_max_delay, float(response.headers.get("retry-after")))
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
@@ -1,179 +1,273 @@
 # model_client.py
-import json
+import time
+import asyncio
 import logging
-from openai import OpenAI
+
+from metrics.metrics import metrics
+from modelclient.answer_cache import AnswerCache
+from modelclient.conversation import Conversation
+from modelclient.llm_scheduler import LLMScheduler
+from modelclient.tool_output import ToolOutputPipeline
+from modelclient.tool_call_assembler import ToolCallAssembler
 
 logger = logging.getLogger(__name__)
 
 
+def _quiet(event):
+    """没有指定 on_event 时丢弃所有事件"""
+
+
 class ModelClient:
     """负责与大模型交互的类"""
 
     def __init__(self, config):
         self.config = config
-        self.client = OpenAI(
-            api_key=config.dashscope_api_key,
-            base_url=config.base_url,
-            timeout=300
-        )
-
-    async def process_query(self, query, server_connector):
-        """处理用户查询并调用工具"""
-        messages = [{"role": "user", "content": query}]
+        # 使用异步客户端，流式生成期间事件循环仍可处理 MCP 通知和其他任务；
+        # 调度器负责多端点、限速、重试和对冲
+        self.scheduler = LLMScheduler(config)
+        # 跨多次查询保存的对话历史
+        self.conversation = Conversation(token_budget=config.conversation_token_budget)
+        # 工具输出处理：合并所有内容块，超出上限的输出写入临时文件，只把预览交给模型
+        self.tool_output = ToolOutputPipeline(config.tool_output_spill_dir)
+        # 可选的回答缓存，命中时不再请求模型和调用工具
+        self.answer_cache = None
+        if config.answer_cache_ttl > 0:
+            self.answer_cache = AnswerCache(config.answer_cache_path, config.answer_cache_ttl,
+                                            config.answer_cache_max_size)
+
+    def close(self):
+        self.tool_output.close()
+        if self.answer_cache is not None:
+            self.answer_cache.close()
+
+    async def process_query(self, query, server_connector, conversation=None, trace=None, on_event=None,
+                            reasoning=True, cache="use", timeout=None):
+        """处理用户查询：循环请求模型并执行工具调用，直到模型不再调用工具
+
+        conversation 为空时使用客户端自带的对话历史，使多次查询共享上下文；
+        trace 不为空时记录每轮模型请求和每次工具调用（QueryTrace）；
+        本方法不直接输出任何内容：on_event 不为空时以字典形式同步回调 round / reasoning / content / tool_call /
+        tool_result / error 事件，由调用方渲染到终端（console.renderer）或推送给客户端；
+        reasoning 为 False 时不产生思考过程事件；
+        cache 为回答缓存模式（use / refresh / off，见 answer_cache.CACHE_MODES），只对没有对话历史的查询生效；
+        timeout 为本次查询的截止时间（秒），为空时取 QUERY_TIMEOUT，0 表示不限制。
+        """
+        if timeout is None:
+            timeout = self.config.query_timeout
+        conversation = conversation if conversation is not None else self.conversation
+        notify = on_event or _quiet
+        reasoning = reasoning and on_event is not None
+        standalone = not conversation.messages
+        conversation.begin_turn({"role": "user", "content": query})
         logger.info(f"处理查询: {query}")
 
-        # 获取可用工具列表
-        available_tools = await server_connector.get_all_tools()
-
-        # 记录完整回复
-        final_answer = ""
-        tool_calls_detected = False
-
+        tool_tasks = {}  # index -> 已派发的工具调用任务
+        deadline = asyncio.timeout(timeout or None)
         try:
-            # 调用 OpenAI API（启用流式输出）
-            stream_response = self.client.chat.completions.create(
-                model=self.config.model,
-                messages=messages,
-                tools=available_tools,
-                stream=True  # 启用流式输出
-            )
-
-            print("=" * 20 + "思考过程" + "=" * 20)
-
-            # 收集模型回复和工具调用
-            full_response_text = ""  # 用于记录回复内容
-            reasoning_content = ""  # 记录思考过程
-            current_tool_calls = []  # 当前收集到的工具调用
-            is_answering = False  # 是否已经开始回答
-
-            for chunk in stream_response:
+            # 截止时间覆盖本次查询的所有子操作（工具列表、模型请求及其重试、工具调用），到期时一并取消
+            async with deadline:
+                # 获取可用工具列表（启用工具检索时只包含与查询最相关的工具，一轮对话内保持不变）
+                available_tools = await server_connector.get_all_tools(query)
+
+                cache_key = None
+                if self.answer_cache is not None and standalone and cache != "off":
+                    cache_key = self.answer_cache.make_key(query, self.scheduler.primary.model, available_tools)
+                    if cache == "use":
+                        answer = self.answer_cache.get(cache_key)
+                        metrics.inc("answer_cache_total", result="miss" if answer is None else "hit")
+                        if answer is not None:
+                            self._replay_cached_answer(answer, conversation, trace, notify)
+                            return answer
+                tool_failed = False  # 有工具调用出错的回答不写入缓存
+                # 缓存键使用主端点的模型；重试或对冲时由其他模型生成的回答不写入缓存
+                other_model = False
+
+                max_rounds = self.config.agent_max_rounds
+                for round_index in range(max_rounds):
+                    if trace is not None:
+                        trace.begin_round(round_index)
+                    # 第 0 轮之后的每一轮都是将工具返回结果（包括错误说明）交给模型继续处理
+                    notify({"type": "round", "round": round_index})
+
+                    # 达到轮数上限的最后一轮不再提供工具，让模型直接给出回答
+                    tools = available_tools if round_index < max_rounds - 1 else None
+                    tool_tasks.clear()
+                    content, tool_calls, model = await self._stream_round(
+                        conversation.build_messages(), tools, server_connector, tool_tasks, trace, notify, reasoning
+                    )
+                    other_model = other_model or model != self.scheduler.primary.model
+
+                    if not tool_calls:
+                        conversation.append({"role": "assistant", "content": content})
+                        if cache_key is not None and content and not tool_failed and not other_model:
+                            self.answer_cache.put(cache_key, query, content)
+                        return content
+
+                    # 向对话历史添加带有tool_calls的助手消息
+                    conversation.append({
+                        "role": "assistant",
+                        "content": content,
+                        "tool_calls": [call.to_message() for call in tool_calls]
+                    })
+
+                    # 等待所有工具调用完成，按 tool_calls 中的顺序追加结果
+                    tool_results = await asyncio.gather(*(tool_tasks[call.index] for call in tool_calls))
+                    for call, (tool_result, is_error) in zip(tool_calls, tool_results):
+                        tool_failed = tool_failed or is_error
+                        conversation.append({
+                            "role": "tool",
+                            "tool_call_id": call.id,
+                            "content": tool_result
+                        })
+
+                return ""
+        except asyncio.CancelledError:
+            # 查询被取消（例如客户端断开连接或用户中止）时同样丢弃本轮不完整的消息
+            conversation.abort_turn()
+            raise
+        except Exception as e:
+            # 丢弃本轮不完整的消息，保证后续请求的历史合法
+            conversation.abort_turn()
+            if deadline.expired():
+                metrics.inc("query_deadline_exceeded_total")
+                message = f"查询超过截止时间 {timeout:g}s，已取消"
+            else:
+                message = str(e)
+            logger.error(f"⚠️ 发生错误: {message}")
+            notify({"type": "error", "message": message})
+            if trace is not None:
+                trace.error = message or type(e).__name__
+            return ""
+        finally:
+            # 出错时取消仍在进行的工具调用
+            for task in tool_tasks.values():
+                task.cancel()
+
+    @staticmethod
+    def _replay_cached_answer(answer, conversation, trace, notify):
+        """把缓存的回答当作本轮回复输出并写入对话历史"""
+        conversation.append({"role": "assistant", "content": answer})
+        if trace is not None:
+            trace.cached = True
+        notify({"type": "content", "text": answer, "cached": True})
+
+    async def _stream_round(self, messages, tools, server_connector, tool_tasks, trace=None, notify=_quiet,
+                            reasoning=False):
+        """流式请求一次模型，返回 (回复内容, 工具调用列表, 实际生成回复的模型)；工具调用在参数完整时即派发到 tool_tasks
+
+        reasoning 为 False 时跳过思考过程增量，不为其创建事件。
+        """
+        request = {"messages": messages, "stream": True}
+        if tools:
+            request["tools"] = tools
+
+        # 调用 OpenAI API（启用流式输出）
+        request_start = time.perf_counter()
+        first_token_at = None  # 首个 token 到达时间，用于 TTFT
+        token_count = 0  # 收到的内容/思考/工具参数 delta 数，近似 token 数
+        # 返回时已收到首个 chunk（包括重试和对冲）
+        stream_response = await self.scheduler.open_stream(request)
+
+        # 收集模型回复和工具调用
+        content_parts = []  # 回复内容的增量，结束时一次拼接
+        assembler = ToolCallAssembler()  # 增量组装工具调用
+
+        async with stream_response:
+            async for chunk in stream_response:
                 # 跳过没有choices的chunk
                 if not chunk.choices:
                     continue
 
                 delta = chunk.choices[0].delta
-
-                # 处理思考过程
-                if hasattr(delta, 'reasoning_content') and delta.reasoning_content is not None:
-                    print(delta.reasoning_content, end="", flush=True)
-                    reasoning_content += delta.reasoning_content
+                token_count += 1
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+
+                # 处理思考过程（思考过程不写入对话历史，只转交给渲染器）
+                reasoning_text = getattr(delta, 'reasoning_content', None)
+                if reasoning_text is not None:
+                    if reasoning:
+                        notify({"type": "reasoning", "text": reasoning_text})
                     continue
 
-                # 处理工具调用
-                if hasattr(delta, 'tool_calls') and delta.tool_calls:
-                    # 首次收到工具调用时切换到回复模式
-                    if not is_answering:
-                        is_answering = True
-                        print("\n" + "=" * 20 + "回复内容" + "=" * 20)
-
-                    tool_calls_detected = True
-                    # 扩展工具调用列表以适应索引
-                    while len(current_tool_calls) <= max([t.index for t in delta.tool_calls]):
-                        current_tool_calls.append({"function": {}})
-
-                    # 收集每个工具调用的信息
-                    for tool_call in delta.tool_calls:
-                        index = tool_call.index
-                        if tool_call.id:
-                            current_tool_calls[index]["id"] = tool_call.id
-
-                        if tool_call.function:
-                            if tool_call.function.name:
-                                current_tool_calls[index]["function"]["name"] = tool_call.function.name
-
-                            if tool_call.function.arguments:
-                                if "arguments" not in current_tool_calls[index]["function"]:
-                                    current_tool_calls[index]["function"]["arguments"] = ""
-                                current_tool_calls[index]["function"]["arguments"] += tool_call.function.arguments
+                # 处理工具调用：参数一旦构成完整 JSON 就立即派发，工具执行与后续生成重叠进行
+                if delta.tool_calls:
+                    for call in assembler.feed(delta.tool_calls):
+                        if call.name:
+                            tool_tasks[call.index] = self._dispatch_tool_call(call, server_connector, trace, notify)
 
                 # 处理普通文本内容
                 if delta.content is not None:
-                    if not is_answering:
-                        is_answering = True
-                        print("\n" + "=" * 20 + "回复内容" + "=" * 20)
-
-                    print(delta.content, end="", flush=True)
-                    full_response_text += delta.content
-                    final_answer += delta.content
+                    notify({"type": "content", "text": delta.content})
+                    content_parts.append(delta.content)
 
                 # 如果已经到达工具调用的结束
                 if chunk.choices[0].finish_reason == "tool_calls":
                     break
 
-            # 完成所有工具调用并收集结果
-            if tool_calls_detected:
-                print(f"\n" + "=" * 20 + "工具调用信息" + "=" * 20)
-
-                # 收集所有工具调用的结果
-                tool_results = []
-
-                # 向最终消息记录添加带有tool_calls的助手消息
-                assistant_message = {
-                    "role": "assistant",
-                    "content": full_response_text,
-                    "tool_calls": current_tool_calls
-                }
-                messages.append(assistant_message)
-
-                # 处理每个工具调用
-                for i, tool_call in enumerate(current_tool_calls):
-                    if "function" in tool_call and "name" in tool_call["function"] and "arguments" in tool_call[
-                        "function"]:
-                        tool_name = tool_call["function"]["name"]
-                        try:
-                            # 解析参数JSON
-                            tool_args_str = tool_call["function"]["arguments"]
-                            tool_args = json.loads(tool_args_str)
-
-                            # 执行工具调用
-                            print(f"[调用工具 {tool_name} 参数: {tool_args}]")
-                            result = await server_connector.call_tool(tool_name, tool_args)
-
-                            # 检查工具返回结果
-                            if result and result.content and result.content[0].text:
-                                tool_result = result.content[0].text
-                                print(f"[工具返回: {tool_result}]")
-
-                                # 创建工具返回消息
-                                tool_message = {
-                                    "role": "tool",
-                                    "tool_call_id": tool_call["id"],
-                                    "content": tool_result
-                                }
-                                messages.append(tool_message)
-                                tool_results.append(tool_result)
-                            else:
-                                print(f"⚠️ 工具 {tool_name} 返回为空")
-                        except json.JSONDecodeError:
-                            print(f"⚠️ 无法解析工具 {tool_name} 的参数: {tool_call['function']['arguments']}")
-                        except Exception as e:
-                            print(f"⚠️ 工具调用错误 {tool_name}: {str(e)}")
-
-                # 如果有工具返回结果，继续让模型处理
-                if tool_results:
-                    print("\n" + "=" * 20 + "处理工具返回结果" + "=" * 20)
-
-                    # 创建新的对话流来处理工具返回
-                    final_stream = self.client.chat.completions.create(
-                        model=self.config.model,
-                        messages=messages,
-                        tools=available_tools,
-                        stream=True
-                    )
-
-                    # 处理最终响应
-                    final_answer = ""  # 重置最终回答
-                    for chunk in final_stream:
-                        if not chunk.choices:
-                            continue
-
-                        delta = chunk.choices[0].delta
-                        if delta.content is not None:
-                            print(delta.content, end="", flush=True)
-                            final_answer += delta.content
+        tool_mode = "none" if not tools else ("selected" if server_connector.tool_selector.top_k > 0 else "all")
+        self._record_request_metrics(stream_response.endpoint.model, request_start, first_token_at, token_count,
+                                     tool_mode)
+        if trace is not None:
+            trace.record_round(first_token_at - request_start if first_token_at is not None else None,
+                               time.perf_counter() - request_start, token_count)
+
+        # 派发流结束时才完成的工具调用
+        assembler.finish()
+        tool_calls = assembler.ordered()
+        for call in tool_calls:
+            if call.index not in tool_tasks:
+                tool_tasks[call.index] = self._dispatch_tool_call(call, server_connector, trace, notify)
+
+        return "".join(content_parts), tool_calls, stream_response.endpoint.model
+
+    @staticmethod
+    def _record_request_metrics(model, request_start, first_token_at, token_count, tool_mode="all"):
+        """记录一次模型请求的 TTFT（含重试和对冲）、总耗时和生成速度；tool_mode 区分发送全部工具、检索选出的工具或不发送工具"""
+        if not metrics.enabled:
+            return
+        end = time.perf_counter()
+        metrics.inc("llm_requests_total", model=model, tool_mode=tool_mode)
+        metrics.observe("llm_request_seconds", end - request_start, model=model, tool_mode=tool_mode)
+        if first_token_at is not None:
+            ttft = first_token_at - request_start
+            metrics.observe("llm_ttft_seconds", ttft, model=model, tool_mode=tool_mode)
+            generation = end - first_token_at
+            tokens_per_second = token_count / generation if generation > 0 else 0.0
+            metrics.observe("llm_tokens_per_second", tokens_per_second,
+                            buckets=(1, 5, 10, 20, 50, 100, 200, 500, 1000), model=model)
+            metrics.emit({"type": "llm_request", "model": model, "tool_mode": tool_mode, "ttft": ttft, "total": end - request_start,
+                          "tokens": token_count, "tokens_per_second": tokens_per_second})
+
+    def _dispatch_tool_call(self, call, server_connector, trace=None, notify=_quiet):
+        """在后台开始执行一个已组装完成的工具调用"""
+        return asyncio.create_task(self._run_tool_call(call, server_connector, trace, notify))
+
+    async def _run_tool_call(self, call, server_connector, trace=None, notify=_quiet):
+        """执行单个工具调用，返回 (结果文本, 是否出错)；出错时返回错误说明，不影响其他调用"""
+        start = time.perf_counter()
+        notify({"type": "tool_call", "id": call.id, "name": call.name, "arguments": call.parsed})
+        tool_result, is_error = await self._execute_tool_call(call, server_connector)
+        notify({"type": "tool_result", "id": call.id, "name": call.name, "is_error": is_error,
+                "result": tool_result, "seconds": round(time.perf_counter() - start, 4)})
+        if trace is not None:
+            trace.record_tool_call(call.name, call.parsed, time.perf_counter() - start, is_error, tool_result)
+        return tool_result, is_error
+
+    async def _execute_tool_call(self, call, server_connector):
+        """返回 (交给模型的结果文本, 是否出错)"""
+        tool_name = call.name
+        if call.error:
+            return call.error, True
 
-            return final_answer
+        try:
+            result = await server_connector.call_tool(tool_name, call.parsed)
         except Exception as e:
-            logger.error(f"⚠️ 发生错误: {str(e)}")
-            print(f"\n⚠️ 发生错误: {str(e)}")
-            return ""
\ No newline at end of file
+            return f"工具 {tool_name} 调用错误: {str(e)}", True
+
+        # 检查工具返回结果：合并所有内容块，超出上限的输出只保留预览
+        output = self.tool_output.process(tool_name, result, server_connector.get_output_limit(tool_name)) \
+            if result and result.content else None
+        if output is not None and output.text:
+            return output.text, bool(result.isError)
+        return f"工具 {tool_name} 返回为空", True
@@ -0,0 +1,37 @@
+# query_trace.py
+
+
+class QueryTrace:
+    """记录一次查询中每轮模型请求的耗时和每次工具调用，用于批处理等需要结构化结果的场景"""
+
+    def __init__(self):
+        self.rounds = []  # 每次模型请求: {"round", "ttft", "seconds", "tokens"}
+        self.tool_calls = []  # 每次工具调用: {"round", "name", "arguments", "seconds", "is_error", "result"}
+        self.error = None  # 查询失败时的错误说明
+        self.cached = False  # 回答是否来自回答缓存
+        self.current_round = 0
+
+    def begin_round(self, round_index):
+        # 一轮的工具调用都在下一轮开始前完成，因此按当前轮次归属即可
+        self.current_round = round_index
+
+    def record_round(self, ttft, seconds, tokens):
+        self.rounds.append({
+            "round": self.current_round,
+            "ttft": round(ttft, 4) if ttft is not None else None,
+            "seconds": round(seconds, 4),
+            "tokens": tokens,
+        })
+
+    def record_tool_call(self, name, arguments, seconds, is_error, result):
+        self.tool_calls.append({
+            "round": self.current_round,
+            "name": name,
+            "arguments": arguments,
+            "seconds": round(seconds, 4),
+            "is_error": is_error,
+            "result": result,
+        })
+
+    def to_dict(self):
+        return {"cached": self.cached, "rounds": self.rounds, "tool_calls": self.tool_calls}
@@ -0,0 +1,105 @@
+# tool_call_assembler.py
+import json
+
+
+class AssembledToolCall:
+    """一个正在流式接收中的工具调用"""
+
+    def __init__(self, index):
+        self.index = index
+        self.id = None
+        self.name = None
+        self.chunks = []  # 参数片段，结束时一次性拼接，避免逐 token 复制字符串
+        self.arguments = None  # 拼接后的完整参数字符串
+        self.parsed = None  # 解析后的参数字典
+        self.error = None  # 参数解析失败时的错误说明
+        self.complete = False
+        # 增量 JSON 扫描状态
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, piece):
+        """追加一段参数，返回参数是否已经构成一个完整的 JSON 对象"""
+        self.chunks.append(piece)
+        if self.complete:
+            return False
+
+        for char in piece:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                self._started = True
+            elif char in "}]":
+                self._depth -= 1
+                if self._started and self._depth == 0:
+                    return True
+        return False
+
+    def finalize(self):
+        """拼接并解析参数，标记为已完成"""
+        self.complete = True
+        self.arguments = "".join(self.chunks)
+        try:
+            self.parsed = json.loads(self.arguments) if self.arguments.strip() else {}
+        except json.JSONDecodeError:
+            self.error = f"无法解析工具 {self.name} 的参数: {self.arguments}"
+
+    def to_message(self):
+        """转换为助手消息中 tool_calls 的条目"""
+        return {
+            "id": self.id,
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "arguments": self.arguments if self.arguments is not None else "".join(self.chunks)
+            }
+        }
+
+
+class ToolCallAssembler:
+    """按流式 delta 组装工具调用，参数一旦构成完整 JSON 即可提前派发"""
+
+    def __init__(self):
+        self.calls = {}  # index -> AssembledToolCall
+
+    def feed(self, delta_tool_calls):
+        """处理一个 chunk 中的 tool_calls delta，返回本次新完成的工具调用"""
+        completed = []
+        for delta in delta_tool_calls:
+            call = self.calls.get(delta.index)
+            if call is None:
+                call = self.calls[delta.index] = AssembledToolCall(delta.index)
+
+            if delta.id:
+                call.id = delta.id
+            if delta.function:
+                if delta.function.name:
+                    call.name = delta.function.name
+                if delta.function.arguments and call.feed(delta.function.arguments):
+                    call.finalize()
+                    completed.append(call)
+        return completed
+
+    def finish(self):
+        """流结束时完成剩余的工具调用（例如参数为空或不是完整 JSON 的调用），返回这些调用"""
+        remaining = [call for call in self.ordered() if not call.complete]
+        for call in remaining:
+            call.finalize()
+        return remaining
+
+    def ordered(self):
+        """按 index 顺序返回所有工具调用"""
+        return [self.calls[index] for index in sorted(self.calls)]
+
+    def __bool__(self):
+        return bool(self.calls)
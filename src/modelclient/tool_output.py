@@ -0,0 +1,140 @@
+# tool_output.py
+import os
+import mmap
+import logging
+import tempfile
+from collections import deque
+
+from mcp import types
+
+from metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 工具输出字节数直方图分桶
+_BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _binary_size(data):
+    """base64 数据解码后的字节数"""
+    return len(data) * 3 // 4 - data.count("=", -2)
+
+
+def render_block(block):
+    """把一个内容块转成交给模型的文本，返回 (文本, 原始字节数)；图片等二进制内容只保留说明"""
+    if isinstance(block, types.TextContent):
+        return block.text, len(block.text.encode("utf-8"))
+    if isinstance(block, types.ImageContent):
+        size = _binary_size(block.data)
+        return f"[图片 {block.mimeType}，{size} 字节]", size
+    if isinstance(block, types.EmbeddedResource):
+        resource = block.resource
+        if isinstance(resource, types.TextResourceContents):
+            return f"[资源 {resource.uri}]\n{resource.text}", len(resource.text.encode("utf-8"))
+        size = _binary_size(resource.blob)
+        return f"[资源 {resource.uri}，{resource.mimeType or '二进制'}，{size} 字节]", size
+    text = f"[{getattr(block, 'type', type(block).__name__)} 内容]"
+    return text, 0
+
+
+class ToolOutput:
+    """处理后的工具输出"""
+
+    def __init__(self, text, is_error, size, chars, spill_path=None):
+        self.text = text  # 交给模型的文本（超出上限时为预览）
+        self.is_error = is_error
+        self.size = size  # 所有内容块的原始字节数
+        self.chars = chars  # 完整文本的字符数
+        self.spill_path = spill_path  # 完整输出写入的临时文件，未超出上限时为 None
+
+
+class ToolOutputPipeline:
+    """把 CallToolResult 的所有内容块转成交给模型的文本，并限制其长度
+
+    文本超过工具的字符上限时，内容块依次写入临时文件而不是拼接成一个大字符串，
+    再通过内存映射只读取开头和结尾生成预览；完整输出保留在临时文件中，最多保留 max_spills 个。
+    """
+
+    def __init__(self, spill_dir=None, max_spills=100):
+        self.spill_dir = spill_dir
+        self.max_spills = max_spills
+        self._spills = deque()  # 按写入顺序保存的临时文件路径
+        self.stats = {"outputs": 0, "spilled": 0, "bytes": 0}
+
+    def process(self, tool_name, result, limit):
+        """返回 ToolOutput；limit 为交给模型的最大字符数，0 表示不限制"""
+        parts = []  # 未超出上限时在内存中累积的文本
+        chars = size = lines = 0
+        spill = None  # 超出上限后写入的临时文件
+        for block in result.content:
+            text, block_size = render_block(block)
+            if parts or spill is not None:
+                text = "\n" + text
+            chars += len(text)
+            lines += text.count("\n")
+            size += block_size
+            if spill is None and limit and chars > limit:
+                spill = self._open_spill(tool_name)
+                for part in parts:
+                    spill.write(part.encode("utf-8"))
+                parts = None
+            if spill is not None:
+                spill.write(text.encode("utf-8"))
+            else:
+                parts.append(text)
+
+        self._record(tool_name, size, spill is not None)
+        if spill is None:
+            return ToolOutput("".join(parts), bool(result.isError), size, chars)
+
+        spill.close()
+        preview = self._preview(spill.name, chars, lines + 1, limit)
+        logger.info(f"工具 {tool_name} 输出 {chars} 字符，超出上限 {limit}，完整输出已保存到 {spill.name}")
+        return ToolOutput(preview, bool(result.isError), size, chars, spill.name)
+
+    def _open_spill(self, tool_name):
+        spill = tempfile.NamedTemporaryFile(prefix=f"tool_output_{tool_name}_", suffix=".txt",
+                                            dir=self.spill_dir, delete=False)
+        self._spills.append(spill.name)
+        while len(self._spills) > self.max_spills:
+            self._remove(self._spills.popleft())
+        return spill
+
+    @staticmethod
+    def _preview(path, chars, lines, limit):
+        """从临时文件读取开头约 3/4 和结尾约 1/4 的内容，中间注明省略的长度和完整输出的位置"""
+        head_chars = limit * 3 // 4
+        tail_chars = limit - head_chars
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # UTF-8 每个字符最多 4 字节，多读一些再按字符截断，截断处不完整的字符被忽略
+            head = data[:head_chars * 4].decode("utf-8", errors="ignore")[:head_chars]
+            tail = data[-tail_chars * 4:].decode("utf-8", errors="ignore")[-tail_chars:] if tail_chars else ""
+        omitted = chars - len(head) - len(tail)
+        return (f"{head}\n\n…（输出共 {chars} 字符、{lines} 行，超出上限 {limit} 字符，"
+                f"中间省略 {omitted} 字符；完整输出已保存到 {path}）…\n\n{tail}")
+
+    def _record(self, tool_name, size, spilled):
+        self.stats["outputs"] += 1
+        self.stats["bytes"] += size
+        if spilled:
+            self.stats["spilled"] += 1
+        if metrics.enabled:
+            metrics.inc("tool_output_bytes_total", size, tool=tool_name)
+            metrics.observe("tool_output_bytes", size, buckets=_BYTES_BUCKETS, tool=tool_name)
+            if spilled:
+                metrics.inc("tool_output_spilled_total", tool=tool_name)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def close(self):
+        """删除所有临时文件"""
+        while self._spills:
+            self._remove(self._spills.popleft())
+
+    def get_stats(self):
+        return {**self.stats, "spill_files": len(self._spills)}
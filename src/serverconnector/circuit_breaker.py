@@ -0,0 +1,89 @@
+# circuit_breaker.py
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """单个服务器的熔断器
+
+    连续失败（超时或连接错误）达到 failure_threshold 次后进入 open 状态，reset_timeout 秒内直接拒绝调用；
+    之后进入 half_open 状态，只放行一次试探调用，成功则恢复，失败则重新 open。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # allow() 返回的调用凭据
+    PASS = "pass"
+    TRIAL = "trial"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0  # 连续失败次数
+        self.opened_at = 0.0
+        self._trial_in_flight = False  # half_open 状态下是否已有试探调用在进行
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        """是否放行一次调用：放行时返回调用凭据（half_open 状态下的试探调用为 TRIAL，否则为 PASS），拒绝时返回 None
+
+        调用结束时把凭据交给 record_success / record_failure / release，只有试探调用本身结束时才释放试探名额。
+        """
+        if self.state == self.CLOSED:
+            return self.PASS
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.stats["rejected"] += 1
+                return None
+            self.state = self.HALF_OPEN
+        if self._trial_in_flight:
+            self.stats["rejected"] += 1
+            return None
+        self._trial_in_flight = True
+        return self.TRIAL
+
+    def retry_after(self):
+        """距离允许试探调用还有多少秒"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def _settles(self, token):
+        """调用结果是否影响熔断器状态：熔断后只由试探调用决定，熔断前放行、之后才结束的调用不计入"""
+        return self.state == self.CLOSED or token is self.TRIAL
+
+    def record_success(self, token=PASS):
+        if not self._settles(token):
+            return
+        if self.state != self.CLOSED:
+            logger.info(f"服务器 {self.name} 已恢复，熔断器关闭")
+        self.state = self.CLOSED
+        self.failures = 0
+        if token is self.TRIAL:
+            self._trial_in_flight = False
+
+    def record_failure(self, token=PASS):
+        if not self._settles(token):
+            return
+        self.failures += 1
+        if token is self.TRIAL:
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.stats["opened"] += 1
+            logger.warning(f"服务器 {self.name} 连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f}s")
+
+    def release(self, token=PASS):
+        """调用既没有成功也没有失败（例如被取消）时调用；试探调用释放试探名额"""
+        if token is self.TRIAL:
+            self._trial_in_flight = False
+
+    def get_stats(self):
+        return {"state": self.state, "failures": self.failures, **self.stats}
@@ -0,0 +1,68 @@
+# manifest_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+
+from mcp import types
+
+logger = logging.getLogger(__name__)
+
+
+def server_fingerprint(server_config):
+    """根据服务器的启动命令、参数和环境变量（远程服务器为 url）计算指纹，任一项变化都会使缓存的工具清单失效"""
+    identity = {
+        "command": server_config.get("command"),
+        "args": server_config.get("args", []),
+        "env": server_config.get("env", {}),
+    }
+    if server_config.get("url"):
+        identity["url"] = server_config["url"]
+    raw = json.dumps(identity, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ManifestCache:
+    """把各服务器最近一次成功连接时的工具清单持久化到 JSON 文件，用于懒启动"""
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}  # 指纹 -> {"server_id", "saved_at", "tools"}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取工具清单缓存 {self.path} 失败，将忽略缓存: {str(e)}")
+            self._entries = {}
+
+    def get(self, server_config):
+        """返回缓存的工具列表（mcp Tool 对象），没有缓存时返回 None"""
+        entry = self._entries.get(server_fingerprint(server_config))
+        if entry is None:
+            return None
+        try:
+            return [types.Tool.model_validate(tool) for tool in entry["tools"]]
+        except Exception as e:
+            logger.warning(f"工具清单缓存中 {entry.get('server_id')} 的条目无效: {str(e)}")
+            return None
+
+    def put(self, server_id, server_config, tools):
+        """保存服务器的工具清单并写回文件"""
+        self._entries[server_fingerprint(server_config)] = {
+            "server_id": server_id,
+            "saved_at": time.time(),
+            "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools],
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"写入工具清单缓存 {self.path} 失败: {str(e)}")
@@ -0,0 +1,149 @@
+# remote_transport.py
+import logging
+import importlib.util
+from datetime import timedelta
+from contextlib import asynccontextmanager
+from urllib.parse import urljoin, urlparse
+
+import anyio
+import httpx
+from mcp import types
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client(max_connections=100):
+    """创建所有远程 MCP 服务器共享的 HTTP 客户端（连接池 + keep-alive，安装了 h2 时启用 HTTP/2）"""
+    return httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                            keepalive_expiry=60)
+    )
+
+
+def has_streamable_http():
+    """当前安装的 mcp 是否提供 streamable HTTP 客户端（mcp 1.6 没有）"""
+    return importlib.util.find_spec("mcp.client.streamable_http") is not None
+
+
+def transport_type(server_config):
+    """远程服务器的传输方式：优先使用配置的 transport；未配置时默认 SSE，
+    只有 URL 不以 /sse 结尾且 mcp 提供 streamable HTTP 客户端时才按 streamable HTTP 连接"""
+    transport = server_config.get("transport")
+    if transport:
+        return transport
+    path = urlparse(server_config["url"]).path.rstrip("/")
+    if not path.endswith("/sse") and has_streamable_http():
+        return "streamable-http"
+    return "sse"
+
+
+@asynccontextmanager
+async def sse_transport(client, url, headers=None, timeout=30, sse_read_timeout=300, max_inflight_posts=8):
+    """基于共享 HTTP 客户端的 SSE 传输，协议与 mcp.client.sse.sse_client 相同
+
+    与 sse_client 的区别：复用共享客户端的连接池，不为每个会话新建客户端；
+    请求最多 max_inflight_posts 个并发 POST，网络往返较长时吞吐不再受限于 1/RTT；
+    请求发送失败时立即以 JSON-RPC 错误返回给会话，而不是让调用一直等到超时。
+    """
+    # 只在连接远程服务器时才导入，纯本地配置的启动不必加载
+    from httpx_sse import aconnect_sse
+
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+    post_limiter = anyio.CapacityLimiter(max_inflight_posts)
+
+    async def post_request(endpoint_url, message):
+        async with post_limiter:
+            await post(endpoint_url, message)
+
+    async def post(endpoint_url, message):
+        try:
+            response = await client.post(
+                endpoint_url,
+                json=message.model_dump(by_alias=True, mode="json", exclude_none=True),
+                headers=headers,
+                timeout=timeout
+            )
+            response.raise_for_status()
+        except Exception as e:
+            detail = str(e) or type(e).__name__
+            logger.error(f"向 {endpoint_url} 发送消息失败: {detail}")
+            if isinstance(message.root, types.JSONRPCRequest):
+                error = types.JSONRPCError(
+                    jsonrpc="2.0",
+                    id=message.root.id,
+                    error=types.ErrorData(code=types.INTERNAL_ERROR, message=f"发送请求失败: {detail}")
+                )
+                try:
+                    await read_stream_writer.send(types.JSONRPCMessage(error))
+                except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+                    pass
+
+    async def post_writer(endpoint_url):
+        async with write_stream_reader, anyio.create_task_group() as posts:
+            async for message in write_stream_reader:
+                # 请求并发发送；通知和响应按顺序发送，保证 initialized 通知先于后续请求到达
+                if isinstance(message.root, types.JSONRPCRequest):
+                    posts.start_soon(post_request, endpoint_url, message)
+                else:
+                    await post(endpoint_url, message)
+
+    async def sse_reader(event_source, task_status=anyio.TASK_STATUS_IGNORED):
+        started = False
+        try:
+            async for sse in event_source.aiter_sse():
+                if sse.event == "endpoint":
+                    endpoint_url = urljoin(url, sse.data)
+                    if urlparse(endpoint_url)[:2] != urlparse(url)[:2]:
+                        raise ValueError(f"消息端点与连接的来源不一致: {endpoint_url}")
+                    task_status.started(endpoint_url)
+                    started = True
+                elif sse.event == "message":
+                    try:
+                        message = types.JSONRPCMessage.model_validate_json(sse.data)
+                    except Exception as e:
+                        logger.error(f"解析服务器消息失败: {str(e)}")
+                        await read_stream_writer.send(e)
+                        continue
+                    await read_stream_writer.send(message)
+        except Exception as e:
+            if not started:
+                raise
+            logger.error(f"SSE 连接 {url} 中断: {str(e)}")
+        finally:
+            # 读取流结束即表示连接断开，会话一侧据此触发重连
+            await read_stream_writer.aclose()
+
+    async with anyio.create_task_group() as tg:
+        try:
+            async with aconnect_sse(client, "GET", url, headers=dict(headers or {}),
+                                    timeout=httpx.Timeout(timeout, read=sse_read_timeout)) as event_source:
+                event_source.response.raise_for_status()
+                endpoint_url = await tg.start(sse_reader, event_source)
+                tg.start_soon(post_writer, endpoint_url)
+                try:
+                    yield read_stream, write_stream
+                finally:
+                    tg.cancel_scope.cancel()
+        finally:
+            await read_stream_writer.aclose()
+            await write_stream.aclose()
+
+
+@asynccontextmanager
+async def streamable_http_transport(url, headers=None, timeout=30, sse_read_timeout=300):
+    """streamable HTTP 传输，需要提供该传输的 mcp 版本（按需导入）
+
+    mcp 的 streamablehttp_client 自行创建并关闭 HTTP 客户端，这条路径不使用共享连接池。
+    """
+    try:
+        from mcp.client.streamable_http import streamablehttp_client
+    except ImportError:
+        raise RuntimeError("当前安装的 mcp 版本不支持 streamable HTTP 传输，"
+                           "请升级 mcp 或在服务器配置中设置 \"transport\": \"sse\"")
+
+    async with streamablehttp_client(url, headers=headers, timeout=timedelta(seconds=timeout),
+                                     sse_read_timeout=timedelta(seconds=sse_read_timeout)) as streams:
+        read_stream, write_stream = streams[0], streams[1]
+        yield read_stream, write_stream
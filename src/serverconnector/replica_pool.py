@@ -0,0 +1,70 @@
+# replica_pool.py
+from metrics.metrics import metrics
+
+
+class Replica:
+    """服务器的一个进程副本"""
+
+    def __init__(self, index):
+        self.index = index
+        self.session = None  # 副本存活时的 ClientSession
+        self.closed = None  # 当前会话结束（包括进程退出）时完成的 Future
+        self.outstanding = 0  # 正在进行的调用数（队列深度）
+        self.calls = 0  # 累计分发到该副本的调用数
+        self.restarts = 0  # 异常退出后被重新启动的次数
+
+
+class ReplicaPool:
+    """同一服务器配置的多个进程副本，调用按最少未完成请求数（least outstanding requests）分发"""
+
+    def __init__(self, server_id, size=1, server_params=None):
+        self.server_id = server_id
+        self.server_params = server_params  # 启动（或重启）副本使用的参数
+        self.replicas = [Replica(index) for index in range(max(1, size))]
+        self._next = 0  # 未完成请求数相同时轮转选择的起点
+
+    def live_replicas(self):
+        return [replica for replica in self.replicas if replica.session is not None]
+
+    def primary_session(self):
+        """返回任意一个存活副本的会话（用于拉取工具清单等不需要负载均衡的请求）"""
+        for replica in self.replicas:
+            if replica.session is not None:
+                return replica.session
+        return None
+
+    def acquire(self):
+        """选择未完成请求最少的存活副本并占用它，没有存活副本时返回 None"""
+        size = len(self.replicas)
+        best = None
+        for offset in range(size):
+            replica = self.replicas[(self._next + offset) % size]
+            if replica.session is not None and (best is None or replica.outstanding < best.outstanding):
+                best = replica
+        if best is None:
+            return None
+
+        self._next = (best.index + 1) % size
+        best.outstanding += 1
+        best.calls += 1
+        self._report(best)
+        return best
+
+    def release(self, replica):
+        """调用结束后释放副本"""
+        replica.outstanding -= 1
+        self._report(replica)
+
+    def _report(self, replica):
+        if metrics.enabled:
+            metrics.set_gauge("mcp_replica_outstanding", replica.outstanding,
+                              server=self.server_id, replica=replica.index)
+
+    def get_stats(self):
+        return [{
+            "replica": replica.index,
+            "alive": replica.session is not None,
+            "outstanding": replica.outstanding,
+            "calls": replica.calls,
+            "restarts": replica.restarts,
+        } for replica in self.replicas]
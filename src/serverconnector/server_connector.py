@@ -1,48 +1,257 @@
 # 修改 ServerConnector.py
 import os
+import json
+import time
+import asyncio
 import logging
-from mcp import ClientSession, StdioServerParameters
+import anyio
+import httpx
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+import contextlib
 from contextlib import AsyncExitStack
 
+from metrics.metrics import metrics
+from modelclient.conversation import estimate_tokens
+from serverconnector.circuit_breaker import CircuitBreaker
+from serverconnector.manifest_cache import ManifestCache
+from serverconnector.remote_transport import (
+    create_http_client, transport_type, sse_transport, streamable_http_transport
+)
+from serverconnector.replica_pool import ReplicaPool
+from serverconnector.tool_registry import ToolRegistry
+from serverconnector.tool_selector import ToolSelector
+from serverconnector.tool_result_cache import ToolResultCache, SqliteResultStore
+
 logger = logging.getLogger(__name__)
 
 
+class ServerUnavailable(RuntimeError):
+    """服务器无法启动、没有可用的副本或副本进程在调用过程中退出"""
+
+
+# 计入熔断的连接类错误（服务器返回的协议或参数错误 McpError 不计入）
+_CONNECTION_ERRORS = (ServerUnavailable, OSError, httpx.TransportError,
+                      anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+class _WatchedStream:
+    """包装传输层的读取流，流结束（服务器进程退出）时调用 on_close"""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stream.__aexit__(*exc_info)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._on_close()
+            raise
+
+
 class ServerConnector:
     """负责连接和管理MCP服务器的类"""
 
     def __init__(self, config, exit_stack):
         self.config = config
         self.exit_stack = exit_stack
-        self.servers = {}  # 存储多个服务器会话
+        self.pools = {}  # server_id -> ReplicaPool（每个服务器的一个或多个进程副本）
+        self.tool_registry = ToolRegistry()  # 工具清单缓存和调度索引
+        # 按查询相关度选出部分工具发送给模型（TOOL_SELECTION_TOP_K 为 0 时发送全部工具）
+        self.tool_selector = ToolSelector(config.tool_selection_top_k, config.tool_always_include)
+        self._all_tools_tokens = (None, 0)  # (工具列表, 全部工具定义的估算 token 数)
+        self._lifecycles = {}  # Replica -> (会话任务, 停止事件)
+        self._restart_tasks = set()  # 重启异常退出副本的后台任务
+        self.server_configs = {}  # server_id -> mcp_servers.json 中的服务器配置
+
+        # 工具调用并发限制：全局上限 + 每个服务器的上限（mcp_servers.json 中的 maxConcurrency）
+        self._global_tool_limit = asyncio.Semaphore(config.tool_max_concurrency)
+        self._server_tool_limits = {}  # server_id -> Semaphore
+        self._breakers = {}  # server_id -> CircuitBreaker
+        self._health_checker = None  # 定期 ping 各副本的后台任务
+
+        # 工具结果缓存（按需启用：mcp_servers.json 中配置了 cacheTtl 的服务器才会缓存）
+        self._result_caches = {}  # server_id -> ToolResultCache
+        self._result_store = None  # 可选的 SQLite 持久化存储
+        if config.tool_result_cache_path:
+            self._result_store = SqliteResultStore(config.tool_result_cache_path)
+            self.exit_stack.callback(self._result_store.close)
+
+        # 懒启动：用磁盘上的工具清单缓存登记服务器，首次调用其工具时才启动进程
+        self.manifest_cache = ManifestCache(config.manifest_cache_path) if config.lazy_startup else None
+        self._start_locks = {}  # server_id -> 懒启动时防止重复启动的锁
+        self._last_used = {}  # server_id -> 最近一次工具调用的时间
+        self._active_calls = {}  # server_id -> 正在进行的工具调用数
+        self._idle_reaper = None  # 关闭空闲服务器的后台任务
+
+        # 远程服务器（配置了 url）共享的 HTTP 客户端，首次连接远程服务器时创建
+        self._http_client = None
+
+        # 所有服务器会话随应用的 AsyncExitStack 一起关闭
+        self.exit_stack.push_async_callback(self.aclose)
+
+    @property
+    def servers(self):
+        """server_id -> 该服务器任一存活副本的会话"""
+        sessions = {}
+        for server_id, pool in self.pools.items():
+            session = pool.primary_session()
+            if session is not None:
+                sessions[server_id] = session
+        return sessions
 
     async def connect_to_server(self, server_id, server_config):
         """连接到JSON配置中定义的MCP服务器"""
         logger.info(f"正在连接到服务器: {server_id}")
+        self.server_configs[server_id] = server_config
 
-        # 准备命令和参数
-        command = server_config.get("command")
-        args = server_config.get("args", [])
+        if server_config.get("url"):
+            # 远程服务器：通过 SSE / streamable HTTP 连接，连接参数即服务器配置本身
+            server_params = server_config
+        else:
+            # 准备命令和参数
+            command = server_config.get("command")
+            args = server_config.get("args", [])
 
-        # 准备环境变量
-        env = os.environ.copy()
-        config_env = server_config.get("env", {})
-        if config_env:
-            env.update(config_env)
+            # 准备环境变量
+            env = os.environ.copy()
+            config_env = server_config.get("env", {})
+            if config_env:
+                env.update(config_env)
 
-        # 设置工具特定环境变量
-        # tool_env = self.config.get_tool_env(server_id)
-        # if tool_env:
-        #     env.update(tool_env)
+            # 设置工具特定环境变量
+            # tool_env = self.config.get_tool_env(server_id)
+            # if tool_env:
+            #     env.update(tool_env)
 
-        # 创建服务器参数
-        server_params = StdioServerParameters(
-            command=command,
-            args=args,
-            env=config_env
-        )
+            # 创建服务器参数
+            server_params = StdioServerParameters(
+                command=command,
+                args=args,
+                env=config_env
+            )
 
-        return await self._connect_with_params(server_params, server_id)
+        replicas = int(server_config.get("replicas", 1))
+        session = await self._connect_with_params(server_params, server_id, replicas)
+        self._last_used[server_id] = time.monotonic()
+
+        # 保存最新的工具清单，供下次懒启动使用
+        if self.manifest_cache is not None:
+            self.manifest_cache.put(server_id, server_config, self.tool_registry.get_tools(server_id))
+
+        return session
+
+    def register_cached_server(self, server_id, server_config):
+        """懒启动：用缓存的工具清单登记服务器而不启动进程，没有可用缓存时返回 False"""
+        tools = self.manifest_cache.get(server_config) if self.manifest_cache is not None else None
+        if tools is None:
+            return False
+
+        self.server_configs[server_id] = server_config
+        self.tool_registry.register(server_id, tools)
+        logger.info(f"服务器 {server_id} 使用缓存的工具清单延迟启动: {[tool.name for tool in tools]}")
+        return True
+
+    async def _ensure_pool(self, server_id):
+        """返回服务器的副本池，服务器尚未启动（懒启动或空闲关闭后）时先启动它"""
+        pool = self.pools.get(server_id)
+        if pool is not None:
+            return pool
+
+        lock = self._start_locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            if server_id not in self.pools:
+                server_config = self.server_configs[server_id]
+                timeout = float(server_config.get("connectTimeout", self.config.server_connect_timeout))
+                logger.info(f"首次调用，正在启动服务器: {server_id}")
+                try:
+                    await asyncio.wait_for(self.connect_to_server(server_id, server_config), timeout=timeout)
+                except asyncio.TimeoutError:
+                    raise ServerUnavailable(f"服务器 {server_id} 启动超时（{timeout}s）")
+                except Exception as e:
+                    raise ServerUnavailable(f"服务器 {server_id} 启动失败: {str(e) or type(e).__name__}") from e
+        return self.pools[server_id]
+
+    def start_idle_reaper(self, idle_timeout):
+        """启动后台任务，关闭空闲超过 idle_timeout 秒的服务器（工具清单保留，下次调用时重新启动）"""
+        if self._idle_reaper is None and idle_timeout > 0:
+            self._idle_reaper = asyncio.create_task(self._reap_idle_servers(idle_timeout))
+
+    async def _reap_idle_servers(self, idle_timeout):
+        while True:
+            await asyncio.sleep(max(1.0, idle_timeout / 2))
+            now = time.monotonic()
+            for server_id in list(self.pools):
+                idle = now - self._last_used.get(server_id, now)
+                if idle >= idle_timeout and not self._active_calls.get(server_id):
+                    logger.info(f"服务器 {server_id} 已空闲 {idle:.0f}s，关闭进程")
+                    await self.disconnect_server(server_id, keep_tools=True)
+
+    def start_health_checks(self, interval, timeout=5.0, max_failures=2):
+        """启动后台任务，每 interval 秒 ping 一次各副本；连续 max_failures 次无响应的副本会被关闭并重新启动"""
+        if self._health_checker is None and interval > 0:
+            self._health_checker = asyncio.create_task(self._check_health(interval, timeout, max_failures))
+
+    async def _check_health(self, interval, timeout, max_failures):
+        failures = {}  # Replica -> 连续失败次数
+        while True:
+            await asyncio.sleep(interval)
+            # 正在处理调用的副本不 ping：部分服务器串行处理请求，ping 会排在长调用之后，调用本身有超时和熔断保护
+            checks = [(pool, replica) for pool in list(self.pools.values())
+                      for replica in pool.live_replicas() if not replica.outstanding]
+            results = await asyncio.gather(*(self._ping(replica, timeout) for _, replica in checks))
+            recycles = []
+            for (pool, replica), healthy in zip(checks, results):
+                if healthy:
+                    failures.pop(replica, None)
+                    continue
+                failures[replica] = failures.get(replica, 0) + 1
+                metrics.inc("mcp_health_check_failures_total", server=pool.server_id)
+                logger.warning(f"服务器 {pool.server_id} 的副本 {replica.index} 健康检查失败（连续 {failures[replica]} 次）")
+                if failures[replica] >= max_failures:
+                    del failures[replica]
+                    recycles.append(self._recycle_replica(pool, replica, timeout))
+            await asyncio.gather(*recycles)
+
+    @staticmethod
+    async def _ping(replica, timeout):
+        session = replica.session
+        if session is None:
+            return True
+        try:
+            await asyncio.wait_for(session.send_ping(), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _recycle_replica(self, pool, replica, timeout):
+        """关闭无响应的副本并在后台重新启动"""
+        lifecycle = self._lifecycles.pop(replica, None)
+        if lifecycle is None:
+            return
+        logger.error(f"服务器 {pool.server_id} 的副本 {replica.index} 无响应，准备重新启动")
+        # 先摘除会话，新的调用不再分发到该副本
+        replica.session = None
+        task, stop_event = lifecycle
+        stop_event.set()
+        # 卡死的进程可能不响应正常关闭，超时后取消任务，由传输层强制结束进程
+        await asyncio.wait({task}, timeout=timeout)
+        if not task.done():
+            task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if self.pools.get(pool.server_id) is pool:
+            self._schedule_restart(pool, replica, pool.server_params)
 
     # 保留原有的方法但可能不再使用
     async def connect_to_script(self, script_path):
@@ -92,67 +301,401 @@ class ServerConnector:
         server_id = f"npx:{package_name}"
         return await self._connect_with_params(server_params, server_id)
 
-    async def _connect_with_params(self, server_params, server_id):
-        """使用指定参数连接到 MCP 服务器并返回会话"""
-        # 启动 MCP 服务器并建立通信
-        stdio_transport = await self.exit_stack.enter_async_context(
-            stdio_client(server_params)
-        )
-        stdio, write = stdio_transport
+    async def _connect_with_params(self, server_params, server_id, replicas=1):
+        """使用指定参数启动服务器的 replicas 个进程副本并返回其中一个会话"""
+        # 同一服务器重连时先关闭旧的副本
+        if server_id in self.pools:
+            await self.disconnect_server(server_id)
 
-        session = await self.exit_stack.enter_async_context(
-            ClientSession(stdio, write)
-        )
-        await session.initialize()
+        pool = ReplicaPool(server_id, replicas, server_params)
+        self.pools[server_id] = pool
+        try:
+            results = await asyncio.gather(
+                *(self._start_replica(pool, replica, server_params) for replica in pool.replicas),
+                return_exceptions=True
+            )
+        except BaseException:
+            # 连接被取消（例如超时），各副本的后台任务已在 _start_replica 中终止
+            if self.pools.get(server_id) is pool:
+                del self.pools[server_id]
+            raise
 
-        # 缓存会话
-        self.servers[server_id] = session
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if len(errors) == len(results):
+            if self.pools.get(server_id) is pool:
+                del self.pools[server_id]
+            raise errors[0]
 
-        # 列出 MCP 服务器上的工具
-        response = await session.list_tools()
-        tools = response.tools
-        logger.info(f"已连接到服务器 {server_id}，支持以下工具: {[tool.name for tool in tools]}")
-        print(f"\n已连接到服务器 {server_id}，支持以下工具:", [tool.name for tool in tools])
+        # 部分副本启动失败时，其余副本先提供服务，失败的副本在后台重试
+        for replica, result in zip(pool.replicas, results):
+            if isinstance(result, BaseException):
+                logger.error(f"服务器 {server_id} 的副本 {replica.index} 启动失败: {str(result)}")
+                self._schedule_restart(pool, replica, server_params)
 
-        return session
+        tools = next(result for result in results if not isinstance(result, BaseException))
+        replica_note = f"（{len(results) - len(errors)}/{len(results)} 个副本）" if len(results) > 1 else ""
+        logger.info(f"已连接到服务器 {server_id}{replica_note}，支持以下工具: {[tool.name for tool in tools]}")
+        print(f"\n已连接到服务器 {server_id}{replica_note}，支持以下工具:", [tool.name for tool in tools])
 
-    def get_all_sessions(self):
-        """获取所有活跃的会话"""
-        return list(self.servers.values())
+        return pool.primary_session()
 
-    async def get_all_tools(self):
-        """获取所有服务器支持的工具列表"""
-        all_tools = []
+    async def _start_replica(self, pool, replica, server_params):
+        """启动单个副本，返回其工具列表"""
+        # 每个副本的传输和会话都在各自独立的后台任务中打开和关闭，
+        # 这样多个服务器可以并发连接，且连接超时被取消时不会影响其他服务器
+        ready = asyncio.get_running_loop().create_future()
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(self._run_session(server_params, pool, replica, ready, stop_event))
+        self._lifecycles[replica] = (task, stop_event)
 
-        for server_id, session in self.servers.items():
-            try:
+        try:
+            with metrics.span("mcp_connect", server=pool.server_id):
+                return await ready
+        except BaseException:
+            # 连接失败或被取消（例如超时），终止该副本的后台任务
+            stop_event.set()
+            task.cancel()
+            if self._lifecycles.get(replica, (None,))[0] is task:
+                del self._lifecycles[replica]
+            raise
+
+    async def _run_session(self, server_params, pool, replica, ready, stop_event):
+        """在独立任务中维持单个副本的传输和会话，直到收到停止信号或服务器进程退出（远程连接断开）"""
+        server_id = pool.server_id
+        replica.closed = asyncio.get_running_loop().create_future()
+        started = False
+        lost = False
+
+        def on_transport_closed():
+            nonlocal lost
+            lost = True
+            stop_event.set()
+
+        try:
+            async with AsyncExitStack() as stack:
+                # 启动（或连接到远程的）MCP 服务器并建立通信
+                read, write = await stack.enter_async_context(self._open_transport(server_params))
+
+                session = await stack.enter_async_context(
+                    ClientSession(_WatchedStream(read, on_transport_closed), write,
+                                  message_handler=self._make_message_handler(server_id))
+                )
+                await session.initialize()
+
+                # 列出 MCP 服务器上的工具
                 response = await session.list_tools()
-                all_tools.extend([{
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "parameters": tool.inputSchema
-                    }
-                } for tool in response.tools])
+                if self.pools.get(server_id) is not pool:
+                    raise RuntimeError(f"服务器 {server_id} 已被关闭或重新连接")
+
+                # 缓存会话，并登记到工具注册表（重连时会替换旧清单）
+                replica.session = session
+                self.tool_registry.register(server_id, response.tools)
+                started = True
+
+                if not ready.done():
+                    ready.set_result(response.tools)
+                await stop_event.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                lost = True
+                logger.error(f"服务器 {server_id} 的副本 {replica.index} 会话异常结束: {str(e)}")
+        finally:
+            replica.session = None
+            if not replica.closed.done():
+                replica.closed.set_result(None)
+
+        # 副本意外退出（或远程连接断开）且服务器仍在使用中时，在后台重新启动（重连）它
+        if started and lost and self.pools.get(server_id) is pool:
+            logger.error(f"服务器 {server_id} 的副本 {replica.index} 进程已退出，准备重新启动")
+            if self._lifecycles.get(replica, (None,))[0] is asyncio.current_task():
+                del self._lifecycles[replica]
+            self._schedule_restart(pool, replica, server_params)
+
+    def _open_transport(self, server_params):
+        """返回打开服务器传输的异步上下文管理器，产出 (读取流, 写入流)"""
+        if isinstance(server_params, StdioServerParameters):
+            return stdio_client(server_params)
+
+        url = server_params["url"]
+        headers = server_params.get("headers")
+        sse_read_timeout = float(server_params.get("sseReadTimeout", 300))
+        transport = transport_type(server_params)
+        if transport == "sse":
+            if self._http_client is None:
+                self._http_client = create_http_client()
+            return sse_transport(self._http_client, url, headers=headers, sse_read_timeout=sse_read_timeout)
+        if transport == "streamable-http":
+            return streamable_http_transport(url, headers=headers, sse_read_timeout=sse_read_timeout)
+        raise ValueError(f"不支持的传输方式: {transport}")
+
+    def _schedule_restart(self, pool, replica, server_params):
+        task = asyncio.create_task(self._restart_replica(pool, replica, server_params))
+        self._restart_tasks.add(task)
+        task.add_done_callback(self._restart_tasks.discard)
+
+    async def _restart_replica(self, pool, replica, server_params):
+        """按指数退避重新启动副本，直到成功或服务器被关闭"""
+        server_id = pool.server_id
+        timeout = float(self.server_configs.get(server_id, {}).get(
+            "connectTimeout", self.config.server_connect_timeout))
+        attempt = 0
+        while True:
+            await asyncio.sleep(min(2 ** attempt, 60))
+            if self.pools.get(server_id) is not pool:
+                return
+            try:
+                await asyncio.wait_for(self._start_replica(pool, replica, server_params), timeout=timeout)
             except Exception as e:
-                logger.error(f"获取服务器 {server_id} 工具列表失败: {str(e)}")
+                attempt += 1
+                logger.error(f"重新启动服务器 {server_id} 的副本 {replica.index} 失败（第 {attempt} 次）: {str(e)}")
+                continue
+            replica.restarts += 1
+            metrics.inc("mcp_replica_restarts_total", server=server_id)
+            logger.info(f"服务器 {server_id} 的副本 {replica.index} 已重新启动")
+            return
+
+    async def disconnect_server(self, server_id, keep_tools=False):
+        """关闭服务器的所有副本；keep_tools 为 True 时保留其工具清单，之后可按需重新启动"""
+        pool = self.pools.pop(server_id, None)
+        if pool is None:
+            return
+        lifecycles = [self._lifecycles.pop(replica) for replica in pool.replicas if replica in self._lifecycles]
+        for task, stop_event in lifecycles:
+            stop_event.set()
+        await asyncio.gather(*(task for task, _ in lifecycles), return_exceptions=True)
+        if not keep_tools:
+            self.tool_registry.remove(server_id)
+        logger.info(f"已断开服务器: {server_id}")
+
+    async def remove_server(self, server_id):
+        """停止服务器并移除其工具清单和配置（配置文件中删除或禁用了该服务器，或需要按新配置重启）"""
+        await self.disconnect_server(server_id)
+        self.tool_registry.remove(server_id)
+        self.server_configs.pop(server_id, None)
+        for state in (self._server_tool_limits, self._result_caches, self._breakers, self._last_used):
+            state.pop(server_id, None)
+
+    def update_server_config(self, server_id, server_config):
+        """更新不需要重启进程的配置项（超时、并发上限、缓存等），之后的调用按新配置执行"""
+        self.server_configs[server_id] = server_config
+        # 并发上限和结果缓存按配置创建，下次调用时重建；正在进行的调用继续使用原来的
+        self._server_tool_limits.pop(server_id, None)
+        self._result_caches.pop(server_id, None)
+
+    async def aclose(self):
+        """关闭所有服务器的会话和进程"""
+        background = list(self._restart_tasks)
+        for task in (self._idle_reaper, self._health_checker):
+            if task is not None:
+                background.append(task)
+        self._idle_reaper = self._health_checker = None
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        for server_id in list(self.pools):
+            await self.disconnect_server(server_id)
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
 
-        return all_tools
+    def _make_message_handler(self, server_id):
+        """创建会话的消息处理函数，收到 tools/list_changed 通知时使工具清单失效"""
+
+        async def handle_message(message):
+            if isinstance(message, types.ServerNotification) and \
+                    isinstance(message.root, types.ToolListChangedNotification):
+                self.tool_registry.invalidate(server_id)
+
+        return handle_message
+
+    async def _refresh_stale_tools(self):
+        """重新拉取所有已失效服务器的工具清单"""
+        for server_id in self.tool_registry.stale_servers():
+            pool = self.pools.get(server_id)
+            session = pool.primary_session() if pool is not None else None
+            if session is None:
+                # 副本正在重启时保留清单，重启后会重新登记
+                if pool is None:
+                    self.tool_registry.remove(server_id)
+                continue
+            try:
+                with metrics.span("mcp_list_tools", server=server_id):
+                    response = await session.list_tools()
+                self.tool_registry.record_refresh(server_id, response.tools)
+                logger.info(f"已刷新服务器 {server_id} 的工具清单: {[tool.name for tool in response.tools]}")
+            except Exception as e:
+                logger.error(f"刷新服务器 {server_id} 工具列表失败: {str(e)}")
+
+    def get_all_sessions(self):
+        """获取所有活跃的会话"""
+        return list(self.servers.values())
+
+    async def get_all_tools(self, query=None):
+        """获取所有服务器支持的工具列表（来自工具注册表缓存）；启用工具检索且传入 query 时只返回最相关的工具"""
+        with metrics.span("get_all_tools"):
+            await self._refresh_stale_tools()
+            tools = self.tool_registry.openai_tools()
+            if query is None or self.tool_selector.top_k <= 0:
+                return tools
+            selected = self.tool_selector.select(query, tools)
+
+        if metrics.enabled:
+            # 对比选择前后工具定义占用的提示词大小
+            if self._all_tools_tokens[0] is not tools:
+                self._all_tools_tokens = (tools, estimate_tokens({"content": json.dumps(tools, ensure_ascii=False)}))
+            selected_tokens = estimate_tokens({"content": json.dumps(selected, ensure_ascii=False)})
+            buckets = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+            metrics.observe("tool_schema_tokens", self._all_tools_tokens[1], buckets=buckets, mode="all")
+            metrics.observe("tool_schema_tokens", selected_tokens, buckets=buckets, mode="selected")
+            metrics.observe("tool_selection_count", len(selected), buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+        return selected
 
     async def call_tool(self, tool_name, tool_args):
-        """在所有可用服务器中查找并调用指定工具"""
-        for server_id, session in self.servers.items():
+        """通过工具注册表找到提供该工具的服务器并调用
+
+        调用受全局和单服务器并发上限约束，并有单次调用超时（包括排队等待）；服务器连续失败后熔断，期间直接返回错误；
+        调用失败或超时时返回 isError=True 的结果，不影响同时进行的其他调用。
+        """
+        await self._refresh_stale_tools()
+
+        server_id = self.tool_registry.resolve(tool_name)
+        if server_id is None:
+            logger.warning(f"没有服务器支持工具: {tool_name}")
+            return None
+
+        server_config = self.server_configs.get(server_id, {})
+        timeout = float(server_config.get("toolTimeout", self.config.tool_call_timeout))
+
+        with metrics.span("tool_call", server=server_id, tool=tool_name) as span:
+            # 命中结果缓存时不再调用服务器
+            cache = self._get_result_cache(server_id)
+            if cache is not None and cache.is_cacheable(tool_name):
+                cached = cache.get(tool_name, tool_args)
+                if cached is not None:
+                    logger.info(f"工具 {tool_name} 命中结果缓存")
+                    span.set(status="cache_hit")
+                    return cached
+            else:
+                cache = None
+
+            # 服务器熔断期间直接失败，不再让每次调用都等到超时
+            breaker = self._get_breaker(server_id)
+            token = breaker.allow()
+            if token is None:
+                span.set(status="circuit_open")
+                metrics.inc("mcp_circuit_rejections_total", server=server_id)
+                return self._error_result(f"服务器 {server_id} 暂时不可用（连续失败后熔断，"
+                                          f"{breaker.retry_after():.0f}s 后重试）")
+
+            self._active_calls[server_id] = self._active_calls.get(server_id, 0) + 1
+            started = False  # 是否已在副本上发出调用；只在排队时超时不计入熔断
             try:
-                # 检查此服务器是否支持该工具
-                response = await session.list_tools()
-                if any(tool.name == tool_name for tool in response.tools):
-                    # 调用工具
-                    result = await session.call_tool(tool_name, tool_args)
-                    return result
+                pool = await self._ensure_pool(server_id)
+                # 超时同时覆盖排队等待和调用本身，单次调用的耗时不会超过 timeout
+                async with asyncio.timeout(timeout):
+                    # 先占用服务器自己的名额，再占用全局名额：排队等待慢服务器的调用不会占着全局名额，
+                    # 其他服务器的调用不受影响
+                    async with self._get_server_tool_limit(server_id), self._global_tool_limit:
+                        # 按最少未完成请求数选择副本
+                        replica = pool.acquire()
+                        if replica is None:
+                            raise ServerUnavailable(f"服务器 {server_id} 没有可用的副本（正在重启）")
+                        started = True
+                        try:
+                            result = await self._call_replica(replica, tool_name, tool_args)
+                        finally:
+                            pool.release(replica)
+                # 工具返回 isError 说明服务器正常响应，不计为失败
+                breaker.record_success(token)
+                if cache is not None:
+                    cache.put(tool_name, tool_args, result)
+                if result.isError:
+                    span.set(status="tool_error")
+                return result
+            except asyncio.TimeoutError:
+                if started:
+                    breaker.record_failure(token)
+                logger.error(f"在服务器 {server_id} 上调用工具 {tool_name} 超时（{timeout}s）")
+                span.set(status="timeout")
+                return self._error_result(f"工具 {tool_name} 调用超时（{timeout}s）")
             except Exception as e:
-                logger.error(f"在服务器 {server_id} 上调用工具 {tool_name} 失败: {str(e)}")
+                # 只有连接类错误说明服务器本身有问题；健康的服务器对错误参数返回的协议错误不计入熔断，
+                # 否则一次错误的参数就可能让所有调用方都被熔断
+                if isinstance(e, _CONNECTION_ERRORS):
+                    breaker.record_failure(token)
+                detail = str(e) or type(e).__name__
+                logger.error(f"在服务器 {server_id} 上调用工具 {tool_name} 失败: {detail}")
+                span.set(status="error")
+                return self._error_result(f"工具 {tool_name} 调用失败: {detail}")
+            finally:
+                breaker.release(token)
+                self._active_calls[server_id] -= 1
+                self._last_used[server_id] = time.monotonic()
+
+    @staticmethod
+    async def _call_replica(replica, tool_name, tool_args):
+        """在副本上调用工具；副本进程在调用期间退出时立即失败，而不是一直等到超时"""
+        call = asyncio.ensure_future(replica.session.call_tool(tool_name, tool_args))
+        try:
+            await asyncio.wait((call, replica.closed), return_when=asyncio.FIRST_COMPLETED)
+            if call.done():
+                return call.result()
+            raise ServerUnavailable("服务器进程在调用过程中退出")
+        finally:
+            if not call.done():
+                call.cancel()
+
+    def _get_server_tool_limit(self, server_id):
+        """获取服务器的并发信号量，未配置 maxConcurrency 时不限制"""
+        limit = self._server_tool_limits.get(server_id)
+        if limit is None:
+            max_concurrency = self.server_configs.get(server_id, {}).get("maxConcurrency")
+            limit = asyncio.Semaphore(max_concurrency) if max_concurrency else contextlib.nullcontext()
+            self._server_tool_limits[server_id] = limit
+        return limit
+
+    def _get_breaker(self, server_id):
+        breaker = self._breakers.get(server_id)
+        if breaker is None:
+            breaker = self._breakers[server_id] = CircuitBreaker(
+                server_id, self.config.circuit_failure_threshold, self.config.circuit_reset_timeout)
+        return breaker
+
+    def _get_result_cache(self, server_id):
+        """获取服务器的工具结果缓存，未配置 cacheTtl 时返回 None"""
+        if server_id not in self._result_caches:
+            server_config = self.server_configs.get(server_id, {})
+            ttls = server_config.get("cacheTtl")
+            self._result_caches[server_id] = ToolResultCache(
+                server_id, ttls, max_size=int(server_config.get("cacheMaxSize", 256)), store=self._result_store
+            ) if ttls else None
+        return self._result_caches[server_id]
+
+    def get_output_limit(self, tool_name):
+        """工具输出交给模型的字符数上限：服务器配置 outputLimit 中的单独设置，否则取 TOOL_OUTPUT_MAX_CHARS"""
+        server_id = self.tool_registry.server_of(tool_name)
+        limits = self.server_configs.get(server_id, {}).get("outputLimit") or {}
+        return int(limits.get(tool_name, self.config.tool_output_max_chars))
+
+    def get_cache_stats(self):
+        """获取各服务器工具结果缓存的命中统计"""
+        return {server_id: cache.get_stats() for server_id, cache in self._result_caches.items() if cache}
+
+    @staticmethod
+    def _error_result(message):
+        """构造表示调用失败的工具结果"""
+        return types.CallToolResult(content=[types.TextContent(type="text", text=message)], isError=True)
+
+    def get_replica_stats(self):
+        """获取各服务器副本的队列深度、调用数和重启次数"""
+        return {server_id: pool.get_stats() for server_id, pool in self.pools.items()}
+
+    def get_breaker_stats(self):
+        """获取各服务器熔断器的状态"""
+        return {server_id: breaker.get_stats() for server_id, breaker in self._breakers.items()}
 
-        # 如果所有服务器都不支持该工具
-        logger.warning(f"没有服务器支持工具: {tool_name}")
-        return None
\ No newline at end of file
+    def get_tool_stats(self):
+        """获取工具注册表的命中和刷新统计"""
+        return self.tool_registry.get_stats()
@@ -0,0 +1,118 @@
+# tool_registry.py
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ToolRegistry:
+    """缓存各服务器的工具清单，并维护 工具名 -> 服务器 的调度索引"""
+
+    def __init__(self):
+        self._manifests = {}  # server_id -> 工具列表（mcp Tool 对象）
+        self._index = {}  # tool_name -> server_id
+        self._stale = set()  # 工具清单已失效、需要重新拉取的服务器
+        self._openai_tools = None  # OpenAI 格式工具列表的缓存
+        self._server_order = []  # 工具名冲突时的服务器优先级（通常为配置文件中的顺序）
+        self._ordered_servers = []  # 按优先级排序后的服务器列表
+        self.collisions = {}  # tool_name -> 提供同名工具的所有服务器
+        self.stats = {
+            "hits": 0,  # 通过索引直接命中服务器的次数
+            "misses": 0,  # 索引中找不到工具的次数
+            "refreshes": 0,  # 重新拉取工具清单的次数
+            "invalidations": 0,  # 工具清单被标记失效的次数
+        }
+
+    def register(self, server_id, tools):
+        """登记（或替换）某个服务器的工具清单"""
+        self._manifests[server_id] = list(tools)
+        self._stale.discard(server_id)
+        self._rebuild_index()
+
+    def set_server_order(self, server_ids):
+        """设置工具名冲突时的服务器优先级，未列出的服务器排在最后"""
+        self._server_order = list(server_ids)
+        self._rebuild_index()
+
+    def remove(self, server_id):
+        """移除某个服务器的工具清单（例如服务器断开时）"""
+        self._manifests.pop(server_id, None)
+        self._stale.discard(server_id)
+        self._rebuild_index()
+
+    def invalidate(self, server_id):
+        """标记某个服务器的工具清单失效，下次使用前重新拉取"""
+        if server_id in self._manifests and server_id not in self._stale:
+            self._stale.add(server_id)
+            self.stats["invalidations"] += 1
+            logger.info(f"服务器 {server_id} 的工具清单已失效，将在下次使用时刷新")
+
+    def stale_servers(self):
+        """返回需要刷新工具清单的服务器列表"""
+        return [server_id for server_id in self._manifests if server_id in self._stale]
+
+    def record_refresh(self, server_id, tools):
+        """登记一次工具清单刷新的结果"""
+        self.stats["refreshes"] += 1
+        self.register(server_id, tools)
+
+    def resolve(self, tool_name):
+        """根据工具名查找提供该工具的服务器，找不到时返回 None"""
+        server_id = self._index.get(tool_name)
+        if server_id is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        return server_id
+
+    def server_of(self, tool_name):
+        """同 resolve，但不计入命中统计（用于同一次调用中再次查找服务器）"""
+        return self._index.get(tool_name)
+
+    def get_tools(self, server_id):
+        """获取某个服务器缓存的工具清单"""
+        return self._manifests.get(server_id, [])
+
+    def openai_tools(self):
+        """以 OpenAI function calling 的格式返回所有工具（同名工具只保留调度索引中的那个）"""
+        if self._openai_tools is None:
+            self._openai_tools = [{
+                "type": "function",
+                "function": {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.inputSchema
+                }
+            } for server_id in self._ordered_servers
+                for tool in self._manifests[server_id] if self._index.get(tool.name) == server_id]
+        return self._openai_tools
+
+    def get_stats(self):
+        """返回命中、刷新等统计信息"""
+        return {
+            **self.stats,
+            "servers": len(self._manifests),
+            "tools": len(self._index),
+            "collisions": {name: list(servers) for name, servers in self.collisions.items()},
+        }
+
+    def _rebuild_index(self):
+        """按服务器优先级（其次是登记顺序）重建调度索引"""
+        index = {}
+        providers = {}
+        rank = {server_id: i for i, server_id in enumerate(self._server_order)}
+        ordered = sorted(self._manifests, key=lambda server_id: rank.get(server_id, len(rank)))
+        for server_id in ordered:
+            tools = self._manifests[server_id]
+            for tool in tools:
+                providers.setdefault(tool.name, []).append(server_id)
+                index.setdefault(tool.name, server_id)
+
+        collisions = {name: servers for name, servers in providers.items() if len(servers) > 1}
+        for name, servers in collisions.items():
+            if self.collisions.get(name) != servers:
+                logger.warning(f"工具名冲突: {name} 同时由 {servers} 提供，将使用 {servers[0]}")
+
+        self._index = index
+        self._ordered_servers = ordered
+        self.collisions = collisions
+        self._openai_tools = None
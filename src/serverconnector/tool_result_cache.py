@@ -0,0 +1,128 @@
+# tool_result_cache.py
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+
+from mcp import types
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_arguments(tool_args):
+    """把工具参数规范化为稳定的 JSON 字符串（键排序、无多余空白）"""
+    return json.dumps(tool_args or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class SqliteResultStore:
+    """工具结果缓存的 SQLite 持久化存储，多个服务器的缓存可共用同一个文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_results ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        # 启动时顺带清理已过期的记录
+        self._conn.execute("DELETE FROM tool_results WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+
+    def get(self, key):
+        """返回 (过期时间, 结果 JSON)，不存在时返回 None"""
+        return self._conn.execute(
+            "SELECT expires_at, value FROM tool_results WHERE key = ?", (key,)
+        ).fetchone()
+
+    def put(self, key, expires_at, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tool_results (key, expires_at, value) VALUES (?, ?, ?)",
+            (key, expires_at, value)
+        )
+        self._conn.commit()
+
+    def delete(self, key):
+        self._conn.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class ToolResultCache:
+    """单个服务器的工具结果缓存：按工具配置 TTL，超过容量时按 LRU 淘汰
+
+    只缓存 ttls 中列出的工具，且不缓存 isError 的结果。
+    """
+
+    def __init__(self, server_id, ttls, max_size=256, store=None):
+        self.server_id = server_id
+        self.ttls = ttls  # tool_name -> TTL（秒）
+        self.max_size = max_size
+        self.store = store
+        self._entries = OrderedDict()  # key -> (过期时间, CallToolResult)
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0}
+
+    def is_cacheable(self, tool_name):
+        return tool_name in self.ttls
+
+    def make_key(self, tool_name, tool_args):
+        """缓存键：服务器 + 工具名 + 规范化参数"""
+        raw = f"{self.server_id}\0{tool_name}\0{canonical_arguments(tool_args)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, tool_name, tool_args):
+        """查找缓存结果，未命中或已过期时返回 None"""
+        key = self.make_key(tool_name, tool_args)
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            row = self.store.get(key)
+            if row is not None:
+                entry = (row[0], types.CallToolResult.model_validate_json(row[1]))
+
+        if entry is not None and entry[0] <= now:
+            self._remove(key)
+            self.stats["expirations"] += 1
+            entry = None
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        # 从持久化存储读到的结果同样占用容量，超出时淘汰最久未使用的条目
+        self._insert(key, entry)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, tool_name, tool_args, result):
+        """缓存一次成功的调用结果"""
+        if result is None or result.isError:
+            return
+
+        key = self.make_key(tool_name, tool_args)
+        expires_at = time.time() + float(self.ttls[tool_name])
+        self._insert(key, (expires_at, result))
+        if self.store is not None:
+            self.store.put(key, expires_at, result.model_dump_json())
+        self.stats["stores"] += 1
+
+    def _insert(self, key, entry):
+        """把条目放到最近使用的位置，超过容量时按 LRU 淘汰"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+
+    def get_stats(self):
+        return {**self.stats, "size": len(self._entries)}
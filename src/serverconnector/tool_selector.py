@@ -0,0 +1,106 @@
+# tool_selector.py
+import re
+import math
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[A-Za-z]+|\d+|[一-鿿]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+# 不参与检索的常见虚词
+_STOPWORDS = {
+    "a", "an", "the", "of", "to", "for", "in", "on", "at", "by", "with", "from", "and", "or", "is", "are",
+    "be", "it", "this", "that", "me", "my", "i", "you", "please", "what", "how",
+    "的", "了", "是", "我", "你", "帮", "吗", "呢", "吧", "请", "一", "下", "个", "么",
+}
+
+
+def tokenize(text):
+    """切分为检索用的词：英文按下划线、驼峰和非字母数字切分并转小写，中文按单字和相邻两字切分"""
+    tokens = []
+    for word in _WORD_RE.findall(_CAMEL_RE.sub(" ", text or "")):
+        if word[0] >= "一":
+            tokens.extend(char for char in word if char not in _STOPWORDS)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        elif word.lower() not in _STOPWORDS:
+            tokens.append(word.lower())
+    return tokens
+
+
+def tool_document(tool):
+    """把 OpenAI 格式的工具转成检索文本：名称（重复一次以提高权重）、描述和参数的名称与描述"""
+    function = tool["function"]
+    parts = [function["name"], function["name"], function.get("description") or ""]
+
+    def walk(schema):
+        if not isinstance(schema, dict):
+            return
+        for name, prop in (schema.get("properties") or {}).items():
+            parts.append(name)
+            if isinstance(prop, dict):
+                parts.append(prop.get("description") or "")
+                walk(prop)
+        walk(schema.get("items"))
+
+    walk(function.get("parameters"))
+    return " ".join(parts)
+
+
+class BM25Index:
+    """内存中的 BM25 词法索引"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(tokenize(doc)) for doc in documents]
+        self._lengths = [sum(freqs.values()) for freqs in self._term_freqs]
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        doc_freqs = Counter(term for freqs in self._term_freqs for term in freqs)
+        count = len(documents)
+        self._idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def scores(self, query):
+        """返回查询对每个文档的 BM25 分数"""
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        result = []
+        for freqs, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length) if self._avg_length else self.k1
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+
+class ToolSelector:
+    """按与查询的相关度选出最相关的 top_k 个工具，减小每次请求中工具定义占用的提示词
+
+    索引在工具列表变化时（工具注册表重建了 OpenAI 格式的列表）自动重建。
+    """
+
+    def __init__(self, top_k, always_include=()):
+        self.top_k = top_k
+        self.always_include = set(always_include)
+        self._tools = None  # 建立索引时的工具列表
+        self._index = None
+
+    def select(self, query, tools):
+        """返回选中的工具，保持工具在原列表中的顺序；没有任何工具与查询相关时返回全部工具"""
+        if self.top_k <= 0 or len(tools) <= self.top_k:
+            return tools
+        if tools is not self._tools:
+            self._index = BM25Index([tool_document(tool) for tool in tools])
+            self._tools = tools
+            logger.info(f"已为 {len(tools)} 个工具重建检索索引")
+
+        scores = self._index.scores(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        if not ranked:
+            return tools
+
+        chosen = set(ranked[:self.top_k])
+        chosen.update(i for i, tool in enumerate(tools) if tool["function"]["name"] in self.always_include)
+        return [tool for i, tool in enumerate(tools) if i in chosen]
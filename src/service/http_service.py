@@ -0,0 +1,197 @@
+# http_service.py
+"""
+HTTP 服务模式：所有请求共享同一组常驻的 MCP 会话和同一个（带连接池的）模型客户端，
+每个请求使用独立的对话历史，或通过 conversation_id 继续服务端保存的多轮对话。
+
+接口:
+    POST /v1/query  {"query": "...", "conversation_id": "可选", "stream": true, "cache": "use"}
+        stream 为 true（默认）时以 SSE 推送 round / reasoning / content / tool_call / tool_result / error 事件，
+        最后推送 done 事件（含回答和耗时）；为 false 时等查询完成后返回 JSON；
+        cache 为回答缓存模式：use（默认）、refresh（忽略已缓存的回答并重新生成）或 off
+    GET  /health    服务器连接状态和工具统计
+    GET  /metrics   Prometheus 指标（需要 METRICS_ENABLED=true）
+"""
+import json
+import time
+import asyncio
+import logging
+import contextlib
+from collections import OrderedDict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from sse_starlette.sse import EventSourceResponse
+
+from metrics.metrics import metrics
+from modelclient.answer_cache import CACHE_MODES
+from modelclient.conversation import Conversation
+from modelclient.query_trace import QueryTrace
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStore:
+    """按 conversation_id 保存多轮对话，超出容量时淘汰最久未使用的对话"""
+
+    def __init__(self, max_size, token_budget):
+        self.max_size = max_size
+        self.token_budget = token_budget
+        self._entries = OrderedDict()  # conversation_id -> (Conversation, 锁)
+
+    def get(self, conversation_id):
+        """返回 (对话, 锁)；同一对话的请求通过锁串行处理，避免交错写入历史"""
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            entry = (Conversation(token_budget=self.token_budget), asyncio.Lock())
+            self._entries[conversation_id] = entry
+            while len(self._entries) > self.max_size:
+                # 正在处理请求（锁被占用）的对话不淘汰，全部都在处理中时暂时超出容量
+                idle = next((key for key, (_, lock) in self._entries.items()
+                             if key != conversation_id and not lock.locked()), None)
+                if idle is None:
+                    break
+                del self._entries[idle]
+        else:
+            self._entries.move_to_end(conversation_id)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class QueryService:
+    """把 MCPApp 的查询处理暴露为 HTTP 接口"""
+
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.conversations = ConversationStore(config.service_max_conversations, config.conversation_token_budget)
+        # 同时处理的查询数上限，超出的请求排队等待
+        self._query_limit = asyncio.Semaphore(config.service_max_concurrency)
+        self.active_queries = 0
+
+    def build_app(self):
+        return Starlette(routes=[
+            Route("/v1/query", self.handle_query, methods=["POST"]),
+            Route("/health", self.handle_health, methods=["GET"]),
+            Route("/metrics", self.handle_metrics, methods=["GET"]),
+        ])
+
+    async def handle_query(self, request):
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "请求体必须是 JSON"}, status_code=400)
+        query = body.get("query") if isinstance(body, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            return JSONResponse({"error": "缺少 query"}, status_code=400)
+
+        cache = body.get("cache", "use")
+        if cache not in CACHE_MODES:
+            return JSONResponse({"error": f"cache 必须是 {' / '.join(CACHE_MODES)} 之一"}, status_code=400)
+
+        conversation_id = body.get("conversation_id")
+        if conversation_id is not None:
+            conversation_id = str(conversation_id)
+
+        if body.get("stream", True):
+            return EventSourceResponse(self._stream_query(query, conversation_id, cache), ping=15)
+        result = await self.run_query(query, conversation_id, cache=cache)
+        return JSONResponse(result, status_code=200 if result["status"] == "ok" else 500)
+
+    async def handle_health(self, request):
+        connector = self.app.server_connector
+        answer_cache = self.app.model_client.answer_cache
+        return JSONResponse({
+            "servers": self.app.connect_timings,
+            "replicas": connector.get_replica_stats(),
+            "circuit_breakers": connector.get_breaker_stats(),
+            "tools": connector.get_tool_stats(),
+            "active_queries": self.active_queries,
+            "conversations": len(self.conversations),
+            "answer_cache": answer_cache.get_stats() if answer_cache is not None else None,
+        })
+
+    async def handle_metrics(self, request):
+        if not metrics.enabled:
+            return PlainTextResponse("指标未启用，请设置 METRICS_ENABLED=true\n", status_code=404)
+        return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+    async def run_query(self, query, conversation_id=None, on_event=None, cache="use"):
+        """处理一次查询并返回结果字典"""
+        trace = QueryTrace()
+        start = time.perf_counter()
+        if conversation_id is None:
+            conversation = Conversation(token_budget=self.app.config.conversation_token_budget)
+            lock = contextlib.nullcontext()
+        else:
+            conversation, lock = self.conversations.get(conversation_id)
+
+        # 先在对话锁上排队，再占用并发名额：等待同一对话前一个请求的请求不占用名额
+        async with lock, self._query_limit:
+            self.active_queries += 1
+            metrics.set_gauge("service_active_queries", self.active_queries)
+            try:
+                answer = await self.app.model_client.process_query(
+                    query, self.app.server_connector, conversation,
+                    trace=trace, on_event=on_event, cache=cache
+                )
+            finally:
+                self.active_queries -= 1
+                metrics.set_gauge("service_active_queries", self.active_queries)
+
+        status = "error" if trace.error else "ok"
+        metrics.inc("service_queries_total", status=status)
+        return {
+            "status": status,
+            "error": trace.error,
+            "answer": answer,
+            "conversation_id": conversation_id,
+            "seconds": round(time.perf_counter() - start, 4),
+            **trace.to_dict(),
+        }
+
+    async def _stream_query(self, query, conversation_id, cache="use"):
+        """以 SSE 事件流的形式处理查询；客户端断开连接时取消查询"""
+        queue = asyncio.Queue()
+
+        async def run():
+            try:
+                result = await self.run_query(query, conversation_id, on_event=queue.put_nowait, cache=cache)
+            except Exception as e:
+                logger.error(f"处理查询时出错: {e}", exc_info=True)
+                result = {"status": "error", "error": str(e) or type(e).__name__}
+            queue.put_nowait({"type": "done", **result})
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await queue.get()
+                yield {"event": event["type"], "data": json.dumps(event, ensure_ascii=False)}
+                if event["type"] == "done":
+                    return
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+
+class _Server(uvicorn.Server):
+    """收到退出信号后正常返回，而不是像 uvicorn 默认那样在关闭后重新抛出信号，
+    这样 main 的 finally 能关闭 MCP 会话和服务器进程"""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        with super().capture_signals():
+            yield
+            self._captured_signals.clear()
+
+
+async def serve(app, host, port):
+    """在当前事件循环中运行 HTTP 服务，直到收到退出信号"""
+    service = QueryService(app)
+    server = _Server(uvicorn.Config(service.build_app(), host=host, port=port, log_level="info"))
+    print(f"🌐 HTTP 服务已启动: http://{host}:{port}/v1/query")
+    await server.serve()
@@ -0,0 +1,18 @@
+import pytest
+
+from config.config import Config
+
+
+@pytest.fixture
+def make_config(monkeypatch, tmp_path):
+    """按给定的环境变量创建 Config；缓存等文件写到临时目录"""
+    monkeypatch.chdir(tmp_path)
+
+    def make(**env):
+        monkeypatch.setenv("DASHSCOPE_API_KEY", "test")
+        monkeypatch.setenv("MANIFEST_CACHE_PATH", str(tmp_path / "manifest.json"))
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        return Config()
+
+    return make
@@ -0,0 +1,70 @@
+import pytest
+
+from modelclient import answer_cache
+from modelclient.answer_cache import AnswerCache, normalize_query, tools_fingerprint
+
+TOOLS = [{"type": "function", "function": {"name": "query_weather", "parameters": {"type": "object"}}}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_normalize_query():
+    assert normalize_query("  北京  天气怎么样？？ ") == "北京 天气怎么样"
+    assert normalize_query("Ｗｅａｔｈｅｒ in BEIJING!") == "weather in beijing"
+
+
+def test_key_depends_on_query_model_and_tools():
+    key = AnswerCache.make_key("北京天气？", "qwen", TOOLS)
+    assert key == AnswerCache.make_key("北京天气", "qwen", TOOLS)
+    assert key != AnswerCache.make_key("北京天气", "other", TOOLS)
+    assert key != AnswerCache.make_key("北京天气", "qwen", [])
+    assert tools_fingerprint(None) == tools_fingerprint([])
+
+
+def test_answers_expire_and_survive_restart(tmp_path, clock):
+    path = str(tmp_path / "answers.db")
+    cache = AnswerCache(path, ttl=60)
+    cache.put("k", "北京天气", "晴")
+    cache.close()
+
+    cache = AnswerCache(path, ttl=60)
+    assert cache.get("k") == "晴"
+    clock[0] += 61
+    assert cache.get("k") is None
+    assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 1
+    cache.close()
+
+
+def test_least_recently_used_answer_is_evicted(tmp_path, clock):
+    cache = AnswerCache(str(tmp_path / "answers.db"), ttl=60, max_size=2)
+    cache.put("a", "a", "A")
+    clock[0] += 1
+    cache.put("b", "b", "B")
+    clock[0] += 1
+    assert cache.get("a") == "A"
+    clock[0] += 1
+    cache.put("c", "c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["size"] == 2
+    cache.close()
+
+
+def test_expired_answers_are_evicted_first(tmp_path, clock):
+    cache = AnswerCache(str(tmp_path / "answers.db"), ttl=10, max_size=2)
+    cache.put("old", "old", "旧")
+    clock[0] += 5
+    cache.put("a", "a", "A")
+    clock[0] += 6
+    cache.put("b", "b", "B")
+
+    assert cache.get("a") == "A" and cache.get("b") == "B"
+    assert cache.get_stats()["evictions"] == 0
+    cache.close()
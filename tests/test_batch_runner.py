@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from batch.batch_runner import load_completed, load_queries
+
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def test_load_queries_defaults(tmp_path):
+    path = write_lines(tmp_path / "queries.jsonl", [
+        json.dumps("北京天气"),
+        "",
+        json.dumps({"id": "q2", "query": "上海天气", "cache": "refresh"}),
+    ])
+    assert load_queries(path) == [
+        {"id": "1", "query": "北京天气", "cache": "use"},
+        {"id": "q2", "query": "上海天气", "cache": "refresh"},
+    ]
+
+
+def test_load_queries_rejects_unknown_cache_mode(tmp_path):
+    path = write_lines(tmp_path / "queries.jsonl", [
+        json.dumps({"query": "北京天气"}),
+        json.dumps({"query": "上海天气", "cache": "refersh"}),
+    ])
+    with pytest.raises(ValueError, match="第 2 行"):
+        load_queries(path)
+
+
+@pytest.mark.parametrize("line", [json.dumps({"id": "q2", "cache": "off"}), "[1, 2]", '{"query": '])
+def test_load_queries_reports_line_of_malformed_entry(tmp_path, line):
+    path = write_lines(tmp_path / "queries.jsonl", [json.dumps("北京天气"), line])
+    with pytest.raises(ValueError, match="第 2 行"):
+        load_queries(path)
+
+
+def test_load_completed_truncates_partial_last_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"id": "1", "status": "ok"}) + "\n"
+                    + json.dumps({"id": "2", "status": "error"}) + "\n" + '{"id": "3", "sta', encoding="utf-8")
+    assert load_completed(str(path)) == {"1"}
+    assert path.read_text(encoding="utf-8").endswith("\n")
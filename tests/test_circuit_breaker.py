@@ -0,0 +1,90 @@
+import pytest
+
+from serverconnector import circuit_breaker
+from serverconnector.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("weather", failure_threshold=3, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock[0] += 4
+    assert breaker.retry_after() == pytest.approx(6)
+    assert breaker.get_stats() == {"state": "open", "failures": 3, "opened": 1, "rejected": 1}
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker("weather", failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker)
+    clock[0] += 10
+
+    trial = breaker.allow()
+    assert trial is CircuitBreaker.TRIAL
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success(trial)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker("weather", failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker)
+    clock[0] += 10
+
+    breaker.record_failure(breaker.allow())
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == pytest.approx(10)
+    assert breaker.get_stats()["opened"] == 2
+
+
+def test_released_trial_can_be_retried(clock):
+    breaker = CircuitBreaker("weather", failure_threshold=1, reset_timeout=10)
+    open_breaker(breaker)
+    clock[0] += 10
+
+    trial = breaker.allow()
+    # 试探调用被取消，既不算成功也不算失败
+    breaker.release(trial)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_calls_admitted_before_opening_do_not_end_the_trial(clock):
+    breaker = CircuitBreaker("weather", failure_threshold=2, reset_timeout=10)
+    slow = breaker.allow()
+    open_breaker(breaker)
+    clock[0] += 10
+    trial = breaker.allow()
+    assert trial is CircuitBreaker.TRIAL
+
+    # 熔断前放行的慢调用在 half_open 期间结束，不影响仍在进行的试探调用
+    breaker.record_success(slow)
+    breaker.release(slow)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure(slow)
+    assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.allow()
+
+    breaker.record_success(trial)
+    assert breaker.state == CircuitBreaker.CLOSED
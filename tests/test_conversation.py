@@ -0,0 +1,87 @@
+from modelclient.conversation import COMPACTED_PREFIX, Conversation, estimate_tokens
+
+
+def tool_round(conversation, call_id, output):
+    conversation.append({"role": "assistant", "content": "", "tool_calls": [
+        {"id": call_id, "type": "function", "function": {"name": "t", "arguments": "{}"}}]})
+    conversation.append({"role": "tool", "tool_call_id": call_id, "content": output})
+
+
+def test_estimate_tokens_counts_ascii_and_cjk():
+    assert estimate_tokens({"content": "abcd" * 10}) == 10 + 4
+    assert estimate_tokens({"content": "你好"}) == 2 + 4
+
+
+def test_under_budget_history_is_untouched():
+    conversation = Conversation(token_budget=1000)
+    conversation.begin_turn({"role": "user", "content": "hi"})
+    conversation.append({"role": "assistant", "content": "hello"})
+    conversation.begin_turn({"role": "user", "content": "again"})
+    messages = list(conversation.build_messages())
+    assert len(messages) == 3
+    assert conversation.stats == {"compacted_tool_outputs": 0, "dropped_messages": 0}
+
+
+def test_previous_turn_is_dropped_so_request_fits_budget():
+    conversation = Conversation(token_budget=100)
+    conversation.begin_turn({"role": "user", "content": "hi"})
+    conversation.append({"role": "assistant", "content": "x" * 2000})
+    conversation.begin_turn({"role": "user", "content": "again"})
+
+    messages = conversation.build_messages()
+    assert messages == [{"role": "user", "content": "again"}]
+    assert sum(estimate_tokens(m) for m in messages) <= conversation.token_budget
+    assert conversation.stats["dropped_messages"] == 2
+
+
+def test_old_tool_outputs_are_compacted_before_dropping_turns():
+    conversation = Conversation(token_budget=400)
+    conversation.begin_turn({"role": "user", "content": "q1"})
+    tool_round(conversation, "c1", "x" * 2000)
+    conversation.append({"role": "assistant", "content": "a1"})
+    conversation.begin_turn({"role": "user", "content": "q2"})
+
+    messages = conversation.build_messages()
+    assert messages[0] == {"role": "user", "content": "q1"}
+    assert messages[2]["content"].startswith(COMPACTED_PREFIX)
+    assert messages[2]["tool_call_id"] == "c1"
+    assert conversation.total_tokens() <= conversation.token_budget
+
+
+def test_earlier_rounds_of_current_turn_are_compacted_but_latest_round_is_kept():
+    conversation = Conversation(token_budget=300)
+    conversation.begin_turn({"role": "user", "content": "q"})
+    tool_round(conversation, "c1", "a" * 800)
+    tool_round(conversation, "c2", "b" * 400)
+
+    messages = conversation.build_messages()
+    assert messages[0]["role"] == "user"
+    assert messages[2]["content"].startswith(COMPACTED_PREFIX)
+    assert messages[4]["content"] == "b" * 400
+    assert conversation.total_tokens() <= conversation.token_budget
+    # 工具调用和工具结果仍然成对
+    assert [m["role"] for m in messages] == ["user", "assistant", "tool", "assistant", "tool"]
+
+
+def test_compaction_keeps_prefix_stable_until_next_overflow():
+    conversation = Conversation(token_budget=200)
+    for i in range(5):
+        conversation.begin_turn({"role": "user", "content": f"q{i}"})
+        conversation.append({"role": "assistant", "content": "x" * 200})
+    conversation.begin_turn({"role": "user", "content": "next"})
+    first = list(conversation.build_messages())
+    conversation.append({"role": "assistant", "content": "short"})
+    conversation.begin_turn({"role": "user", "content": "more"})
+    second = conversation.build_messages()
+    assert second[:len(first)] == first
+
+
+def test_abort_turn_discards_incomplete_messages():
+    conversation = Conversation()
+    conversation.begin_turn({"role": "user", "content": "q1"})
+    conversation.append({"role": "assistant", "content": "a1"})
+    conversation.begin_turn({"role": "user", "content": "q2"})
+    tool_round(conversation, "c1", "out")
+    conversation.abort_turn()
+    assert [m["content"] for m in conversation.messages] == ["q1", "a1"]
+    assert conversation.total_tokens() == sum(estimate_tokens(m) for m in conversation.messages)
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from service.http_service import ConversationStore, QueryService
+
+
+class FakeModelClient:
+    """按查询内容阻塞的假模型客户端，对应的事件设置后返回"""
+
+    def __init__(self):
+        self.events = {}
+        self.started = []
+
+    async def process_query(self, query, server_connector, conversation, trace=None, on_event=None, cache="use"):
+        self.started.append(query)
+        await self.events.setdefault(query, asyncio.Event()).wait()
+        return query
+
+
+def make_service(make_config, **env):
+    config = make_config(**env)
+    app = SimpleNamespace(config=config, model_client=FakeModelClient(), server_connector=None)
+    return QueryService(app)
+
+
+def test_queries_waiting_for_their_conversation_do_not_take_a_slot(make_config):
+    async def run():
+        service = make_service(make_config, SERVICE_MAX_CONCURRENCY=2)
+        client = service.app.model_client
+        first = asyncio.create_task(service.run_query("a1", "a"))
+        second = asyncio.create_task(service.run_query("a2", "a"))
+        await asyncio.sleep(0)
+        other = asyncio.create_task(service.run_query("b1", "b"))
+        await asyncio.sleep(0.01)
+        # a2 在对话 a 的锁上排队，b1 可以使用剩下的名额
+        assert client.started == ["a1", "b1"]
+
+        for query in ("a1", "a2", "b1"):
+            client.events.setdefault(query, asyncio.Event()).set()
+        results = await asyncio.gather(first, second, other)
+        assert [result["answer"] for result in results] == ["a1", "a2", "b1"]
+
+    asyncio.run(run())
+
+
+def test_store_does_not_evict_conversations_in_use():
+    async def run():
+        store = ConversationStore(max_size=2, token_budget=0)
+        busy, lock = store.get("busy")
+        store.get("idle")
+        async with lock:
+            store.get("new")
+            assert store.get("busy")[0] is busy
+            assert len(store) == 2
+            async with store.get("new")[1]:
+                # 其他对话都在处理中时暂时超出容量
+                store.get("newest")
+                assert len(store) == 3
+
+    asyncio.run(run())
@@ -0,0 +1,165 @@
+import json
+import time
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from modelclient import llm_scheduler
+from modelclient.llm_scheduler import LLMScheduler, TokenBucket
+
+REQUEST = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+
+
+def status_error(error_class, status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers, request=REQUEST)
+    return error_class("请求失败", response=response, body=None)
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """按顺序执行预设行为的假 AsyncOpenAI 客户端：异常实例则抛出，"hang" 则一直等待，否则返回这些 chunk 组成的流"""
+
+    def __init__(self, *behaviours):
+        self.chat = SimpleNamespace(completions=self)
+        self.behaviours = list(behaviours)
+        self.streams = []
+
+    async def create(self, model, **request):
+        behaviour = self.behaviours.pop(0)
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        if behaviour == "hang":
+            await asyncio.Event().wait()
+        stream = FakeStream(behaviour)
+        self.streams.append(stream)
+        return stream
+
+
+def make_scheduler(make_config, *clients, **env):
+    endpoints = [{"name": f"e{i}", "base_url": "http://llm.test/v1", "model": f"m{i}"} for i in range(len(clients))]
+    config = make_config(LLM_ENDPOINTS=json.dumps(endpoints), **env)
+    scheduler = LLMScheduler(config)
+    for endpoint, client in zip(scheduler.endpoints, clients):
+        endpoint._client = client
+    return scheduler
+
+
+async def read_all(stream):
+    async with stream:
+        return [chunk async for chunk in stream]
+
+
+def test_token_bucket_allows_burst_then_waits():
+    async def run():
+        assert await TokenBucket(0, 1).acquire() == 0.0
+        bucket = TokenBucket(rate=50, capacity=2)
+        assert await bucket.acquire() == 0.0
+        assert await bucket.acquire() == 0.0
+        start = time.monotonic()
+        waited = await bucket.acquire()
+        assert waited == pytest.approx(0.02, abs=0.01)
+        assert time.monotonic() - start >= 0.015
+
+    asyncio.run(run())
+
+
+def test_retry_reason_classifies_errors():
+    reason = LLMScheduler._retry_reason
+    assert reason(status_error(openai.RateLimitError, 429)) == "429"
+    assert reason(status_error(openai.InternalServerError, 503)) == "5xx"
+    assert reason(openai.APITimeoutError(request=REQUEST)) == "timeout"
+    assert reason(openai.APIConnectionError(request=REQUEST)) == "connection"
+    assert reason(status_error(openai.BadRequestError, 400)) is None
+    assert reason(ValueError("参数错误")) is None
+
+
+def test_retry_delay_uses_retry_after_then_full_jitter(make_config, monkeypatch):
+    scheduler = make_scheduler(make_config, FakeClient(), LLM_RETRY_BASE_DELAY=0.5, LLM_RETRY_MAX_DELAY=3)
+    assert scheduler._retry_delay(status_error(openai.RateLimitError, 429, {"retry-after": "2"}), 0) == 2
+    assert scheduler._retry_delay(status_error(openai.RateLimitError, 429, {"retry-after": "60"}), 0) == 3
+
+    bounds = []
+    monkeypatch.setattr(llm_scheduler.random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+    error = status_error(openai.InternalServerError, 503)
+    assert [scheduler._retry_delay(error, attempt) for attempt in range(4)] == [0.5, 1.0, 2.0, 3.0]
+    assert all(low == 0 for low, _ in bounds)
+
+
+def test_retryable_errors_fail_over_to_next_endpoint(make_config):
+    primary = FakeClient(status_error(openai.RateLimitError, 429, {"retry-after": "0"}))
+    backup = FakeClient(["a", "b"])
+    scheduler = make_scheduler(make_config, primary, backup, LLM_HEDGE_AFTER=0)
+
+    async def run():
+        stream = await scheduler.open_stream({"messages": []})
+        assert stream.endpoint.name == "e1"
+        assert await read_all(stream) == ["a", "b"]
+        assert backup.streams[0].closed
+
+    asyncio.run(run())
+
+
+def test_non_retryable_errors_are_raised(make_config):
+    primary = FakeClient(status_error(openai.BadRequestError, 400), ["unused"])
+    scheduler = make_scheduler(make_config, primary, FakeClient(["unused"]), LLM_HEDGE_AFTER=0)
+
+    async def run():
+        with pytest.raises(openai.BadRequestError):
+            await scheduler.open_stream({"messages": []})
+
+    asyncio.run(run())
+    assert primary.behaviours == [["unused"]]
+
+
+def test_retries_stop_after_max_retries(make_config):
+    errors = [status_error(openai.InternalServerError, 503, {"retry-after": "0"}) for _ in range(3)]
+    scheduler = make_scheduler(make_config, FakeClient(*errors), LLM_MAX_RETRIES=2, LLM_HEDGE_AFTER=0)
+
+    async def run():
+        with pytest.raises(openai.InternalServerError):
+            await scheduler.open_stream({"messages": []})
+
+    asyncio.run(run())
+
+
+def test_slow_first_token_is_hedged_to_backup(make_config):
+    primary = FakeClient("hang")
+    backup = FakeClient(["hedged"])
+    scheduler = make_scheduler(make_config, primary, backup, LLM_HEDGE_AFTER=0.05)
+
+    async def run():
+        stream = await scheduler.open_stream({"messages": []})
+        assert stream.endpoint.name == "e1"
+        assert await read_all(stream) == ["hedged"]
+
+    asyncio.run(run())
+
+
+def test_fast_primary_is_not_hedged(make_config):
+    backup = FakeClient(["unused"])
+    scheduler = make_scheduler(make_config, FakeClient(["primary"]), backup, LLM_HEDGE_AFTER=1)
+
+    async def run():
+        stream = await scheduler.open_stream({"messages": []})
+        assert await read_all(stream) == ["primary"]
+
+    asyncio.run(run())
+    assert backup.behaviours == [["unused"]]
@@ -0,0 +1,49 @@
+import json
+import asyncio
+
+from main import MCPApp
+
+
+def make_app(make_config, tmp_path, connect, **env):
+    make_config(STARTUP_DEADLINE=0.2, SERVER_CONNECT_RETRIES=1, CONFIG_RELOAD_INTERVAL=0,
+                HEALTH_CHECK_INTERVAL=0, **env)
+    config_path = tmp_path / "mcp_servers.json"
+    config_path.write_text(json.dumps({"mcpServers": {"a": {"command": "a"}, "b": {"command": "b"}}}))
+    app = MCPApp(str(config_path))
+    app.server_connector.connect_to_server = connect
+    return app
+
+
+def test_initialize_succeeds_while_servers_are_still_connecting(make_config, tmp_path):
+    async def slow_connect(server_id, server_config):
+        await asyncio.sleep(10)
+
+    async def run():
+        app = make_app(make_config, tmp_path, slow_connect)
+        try:
+            assert await app.initialize()
+            assert {timing["status"] for timing in app.connect_timings.values()} == {"pending"}
+        finally:
+            await app.cleanup()
+
+    asyncio.run(run())
+
+
+def test_initialize_fails_when_every_first_attempt_failed(make_config, tmp_path):
+    async def failing_connect(server_id, server_config):
+        raise RuntimeError("连接被拒绝")
+
+    async def run():
+        app = make_app(make_config, tmp_path, failing_connect)
+        try:
+            assert not await app.initialize()
+            assert {timing["status"] for timing in app.connect_timings.values()} == {"failed"}
+        finally:
+            await app.cleanup()
+
+    asyncio.run(run())
+
+
+def test_default_startup_deadline_fires_before_connect_timeout(make_config):
+    config = make_config()
+    assert config.startup_deadline < config.server_connect_timeout
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from config.mcp_config_loader import MCPConfigLoader, diff_servers
+
+
+def test_diff_servers_classifies_changes():
+    old = {
+        "same": {"command": "python", "args": ["a.py"]},
+        "removed": {"command": "python"},
+        "relaunch": {"command": "python", "args": ["old.py"]},
+        "tuned": {"command": "python", "toolTimeout": 10},
+    }
+    new = {
+        "same": {"command": "python", "args": ["a.py"]},
+        "relaunch": {"command": "python", "args": ["new.py"]},
+        "tuned": {"command": "python", "toolTimeout": 30},
+        "added": {"url": "http://localhost:8000/sse"},
+    }
+    assert diff_servers(old, new) == (["added"], ["removed"], ["relaunch"], ["tuned"])
+    assert diff_servers(new, new) == ([], [], [], [])
+
+
+def test_adding_a_launch_key_restarts_the_server():
+    old = {"remote": {"url": "http://localhost:8000/sse"}}
+    new = {"remote": {"url": "http://localhost:8000/sse", "headers": {"Authorization": "Bearer x"}}}
+    assert diff_servers(old, new) == ([], [], ["remote"], [])
+
+
+def write_config(path, servers, mtime=None):
+    path.write_text(json.dumps({"mcpServers": servers}), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_reload_only_reports_server_changes(tmp_path):
+    path = tmp_path / "mcp_servers.json"
+    write_config(path, {"a": {"command": "a"}, "b": {"command": "b", "disabled": True}}, mtime=1)
+    loader = MCPConfigLoader(str(path))
+    assert loader.get_enabled_servers() == {"a": {"command": "a"}}
+    assert not loader.reload()
+
+    # 文件被重写但内容不变
+    write_config(path, {"a": {"command": "a"}, "b": {"command": "b", "disabled": True}}, mtime=2)
+    assert not loader.reload()
+
+    write_config(path, {"a": {"command": "a"}, "b": {"command": "b"}}, mtime=3)
+    assert loader.reload()
+    assert set(loader.get_enabled_servers()) == {"a", "b"}
+
+
+def test_reload_keeps_current_config_when_file_is_invalid(tmp_path):
+    path = tmp_path / "mcp_servers.json"
+    write_config(path, {"a": {"command": "a"}}, mtime=1)
+    loader = MCPConfigLoader(str(path))
+
+    path.write_text('{"mcpServers": {', encoding="utf-8")
+    os.utime(path, ns=(2, 2))
+    with pytest.raises(json.JSONDecodeError):
+        loader.reload()
+    assert loader.get_enabled_servers() == {"a": {"command": "a"}}
@@ -0,0 +1,94 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from modelclient.model_client import ModelClient
+
+
+def chunk(content):
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason="stop")])
+
+
+class FakeStream:
+    def __init__(self, endpoint, chunks):
+        self.endpoint = endpoint
+        self.chunks = chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.chunks:
+            yield item
+
+
+class FakeConnector:
+    tool_selector = SimpleNamespace(top_k=0)
+
+    def __init__(self, tools=()):
+        self.tools = list(tools)
+
+    async def get_all_tools(self, query):
+        return self.tools
+
+
+def make_client(make_config, tmp_path, **env):
+    endpoints = [{"name": f"e{i}", "base_url": "http://llm.test/v1", "model": f"m{i}"} for i in range(2)]
+    config = make_config(LLM_ENDPOINTS=json.dumps(endpoints), ANSWER_CACHE_TTL=60,
+                         ANSWER_CACHE_PATH=tmp_path / "answers.db", **env)
+    return ModelClient(config)
+
+
+def answer_from(client, endpoint_index, text, requests=None):
+    """让模型请求由第 endpoint_index 个端点返回 text；requests 不为空时记录每次请求"""
+    async def open_stream(request):
+        if requests is not None:
+            requests.append(request)
+        return FakeStream(client.scheduler.endpoints[endpoint_index], [chunk(text)])
+
+    client.scheduler.open_stream = open_stream
+
+
+def test_answers_from_fallback_models_are_not_cached(make_config, tmp_path):
+    client = make_client(make_config, tmp_path)
+
+    async def run():
+        answer_from(client, 1, "备用模型的回答")
+        assert await client.process_query("北京天气", FakeConnector()) == "备用模型的回答"
+        assert client.answer_cache.get_stats()["stores"] == 0
+
+        client.conversation.clear()
+        answer_from(client, 0, "主模型的回答")
+        assert await client.process_query("北京天气", FakeConnector()) == "主模型的回答"
+        assert client.answer_cache.get_stats()["stores"] == 1
+
+    asyncio.run(run())
+    client.close()
+
+
+def test_single_round_limit_is_rejected(make_config):
+    with pytest.raises(ValueError, match="AGENT_MAX_ROUNDS"):
+        make_config(AGENT_MAX_ROUNDS=1)
+
+
+def test_first_round_offers_tools_at_minimum_round_limit(make_config, tmp_path):
+    client = make_client(make_config, tmp_path, AGENT_MAX_ROUNDS=2)
+    tool = {"type": "function", "function": {"name": "query_weather", "parameters": {"type": "object"}}}
+    requests = []
+
+    async def run():
+        answer_from(client, 0, "晴", requests)
+        assert await client.process_query("北京天气", FakeConnector([tool])) == "晴"
+
+    asyncio.run(run())
+    client.close()
+    assert requests[0]["tools"] == [tool]
@@ -0,0 +1,21 @@
+from serverconnector import remote_transport
+from serverconnector.remote_transport import transport_type
+
+
+def test_explicit_transport_wins():
+    assert transport_type({"url": "http://host/sse", "transport": "streamable-http"}) == "streamable-http"
+    assert transport_type({"url": "http://host/mcp", "transport": "sse"}) == "sse"
+
+
+def test_sse_url_uses_sse():
+    assert transport_type({"url": "http://host:8765/sse/"}) == "sse"
+
+
+def test_other_urls_fall_back_to_sse_without_streamable_http(monkeypatch):
+    monkeypatch.setattr(remote_transport, "has_streamable_http", lambda: False)
+    assert transport_type({"url": "http://host/mcp"}) == "sse"
+
+
+def test_other_urls_use_streamable_http_when_available(monkeypatch):
+    monkeypatch.setattr(remote_transport, "has_streamable_http", lambda: True)
+    assert transport_type({"url": "http://host/mcp"}) == "streamable-http"
@@ -0,0 +1,38 @@
+import io
+import json
+import asyncio
+
+import pytest
+
+from console.renderer import Renderer, create_renderer
+
+
+def test_incomplete_renderer_cannot_be_created():
+    class ContentOnly(Renderer):
+        def render_delta(self, event_type, text):
+            pass
+
+    with pytest.raises(TypeError):
+        ContentOnly()
+
+
+def test_json_renderer_merges_deltas_within_a_frame():
+    stream = io.StringIO()
+
+    async def run():
+        renderer = create_renderer("json", frame_interval=60, stream=stream)
+        for text in ("北", "京", "晴"):
+            renderer({"type": "content", "text": text})
+        renderer.finish("北京晴")
+
+    asyncio.run(run())
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    # 第一个增量立即写出，同一帧内之后的增量合并为一个事件
+    assert events == [{"type": "content", "text": "北"}, {"type": "content", "text": "京晴"},
+                      {"type": "done", "answer": "北京晴"}]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        create_renderer("html")
@@ -0,0 +1,43 @@
+from serverconnector.replica_pool import ReplicaPool
+
+
+def make_pool(size, alive=None):
+    pool = ReplicaPool("server", size)
+    for replica in pool.replicas:
+        if alive is None or replica.index in alive:
+            replica.session = object()
+    return pool
+
+
+def test_idle_replicas_are_used_in_turn():
+    pool = make_pool(3)
+    picked = []
+    for _ in range(6):
+        replica = pool.acquire()
+        picked.append(replica.index)
+        pool.release(replica)
+    assert picked == [0, 1, 2, 0, 1, 2]
+
+
+def test_least_outstanding_replica_is_chosen():
+    pool = make_pool(3)
+    busy = [pool.acquire() for _ in range(3)]
+    pool.release(busy[1])
+    assert pool.acquire().index == 1
+    pool.release(busy[2])
+    assert pool.acquire().index == 2
+    assert [replica["outstanding"] for replica in pool.get_stats()] == [1, 1, 1]
+
+
+def test_dead_replicas_are_skipped():
+    pool = make_pool(3, alive={1})
+    assert [pool.acquire().index for _ in range(3)] == [1, 1, 1]
+    assert pool.primary_session() is pool.replicas[1].session
+
+    pool.replicas[1].session = None
+    assert pool.acquire() is None
+    assert pool.primary_session() is None
+
+
+def test_size_is_at_least_one():
+    assert len(ReplicaPool("server", 0).replicas) == 1
@@ -0,0 +1,99 @@
+import asyncio
+from contextlib import AsyncExitStack
+
+from mcp import types
+from mcp.shared.exceptions import McpError
+
+from serverconnector.replica_pool import ReplicaPool
+from serverconnector.server_connector import ServerConnector
+
+
+class FakeSession:
+    """按工具名返回结果的假会话，release 事件设置前一直阻塞"""
+
+    def __init__(self, release=None):
+        self.release = release
+        self.calls = 0
+
+    async def call_tool(self, tool_name, tool_args):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        return types.CallToolResult(content=[types.TextContent(type="text", text=tool_name)])
+
+
+def add_server(connector, server_id, session, **server_config):
+    pool = ReplicaPool(server_id)
+    pool.replicas[0].session = session
+    pool.replicas[0].closed = asyncio.get_running_loop().create_future()
+    connector.pools[server_id] = pool
+    connector.server_configs[server_id] = server_config
+    connector.tool_registry.register(server_id, [types.Tool(name=f"{server_id}_tool", inputSchema={})])
+
+
+def test_slow_server_queue_does_not_block_other_servers(make_config):
+    config = make_config(TOOL_MAX_CONCURRENCY=2, TOOL_CALL_TIMEOUT=5)
+
+    async def run():
+        connector = ServerConnector(config, AsyncExitStack())
+        release = asyncio.Event()
+        add_server(connector, "slow", FakeSession(release), maxConcurrency=1)
+        add_server(connector, "fast", FakeSession())
+
+        # 1 个调用占着 slow 的名额，另外 2 个排队等待 slow
+        slow_calls = [asyncio.create_task(connector.call_tool("slow_tool", {})) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        result = await asyncio.wait_for(connector.call_tool("fast_tool", {}), timeout=1)
+        assert result.content[0].text == "fast_tool"
+        assert not any(task.done() for task in slow_calls)
+
+        release.set()
+        results = await asyncio.gather(*slow_calls)
+        assert [r.content[0].text for r in results] == ["slow_tool"] * 3
+
+    asyncio.run(run())
+
+
+def test_output_limit_lookup_is_not_counted_as_a_call(make_config):
+    config = make_config(TOOL_OUTPUT_MAX_CHARS=100)
+
+    async def run():
+        connector = ServerConnector(config, AsyncExitStack())
+        add_server(connector, "weather", FakeSession(), outputLimit={"weather_tool": 20})
+        await connector.call_tool("weather_tool", {})
+        assert connector.get_output_limit("weather_tool") == 20
+        assert connector.get_output_limit("other_tool") == 100
+        stats = connector.get_tool_stats()
+        assert (stats["hits"], stats["misses"]) == (1, 0)
+
+    asyncio.run(run())
+
+
+class FailingSession:
+    def __init__(self, error):
+        self.error = error
+
+    async def call_tool(self, tool_name, tool_args):
+        raise self.error
+
+
+def test_only_connection_errors_trip_the_circuit_breaker(make_config):
+    config = make_config(CIRCUIT_FAILURE_THRESHOLD=2)
+
+    async def run():
+        connector = ServerConnector(config, AsyncExitStack())
+        invalid = McpError(types.ErrorData(code=types.INVALID_PARAMS, message="参数错误"))
+        add_server(connector, "strict", FailingSession(invalid))
+        add_server(connector, "broken", FailingSession(ConnectionResetError("连接被重置")))
+
+        for _ in range(3):
+            result = await connector.call_tool("strict_tool", {})
+            assert "参数错误" in result.content[0].text
+            result = await connector.call_tool("broken_tool", {})
+        assert "暂时不可用" in result.content[0].text
+        stats = connector.get_breaker_stats()
+        assert stats["strict"]["state"] == "closed" and stats["strict"]["failures"] == 0
+        assert stats["broken"]["state"] == "open"
+
+    asyncio.run(run())
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from modelclient.tool_call_assembler import ToolCallAssembler
+
+
+def delta(index, arguments=None, call_id=None, name=None):
+    """模拟流式 chunk 中的一个 tool_calls delta"""
+    return SimpleNamespace(index=index, id=call_id,
+                           function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_call_completes_as_soon_as_arguments_are_valid_json():
+    assembler = ToolCallAssembler()
+    assert assembler.feed([delta(0, '{"city": "Bei', "call_0", "query_weather")]) == []
+    completed = assembler.feed([delta(0, 'jing"}')])
+
+    assert [call.name for call in completed] == ["query_weather"]
+    call = completed[0]
+    assert call.parsed == {"city": "Beijing"}
+    assert call.to_message() == {"id": "call_0", "type": "function",
+                                 "function": {"name": "query_weather", "arguments": '{"city": "Beijing"}'}}
+
+
+def test_braces_and_escapes_inside_strings_are_ignored():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, '{"text": "a}b\\"', "call_0", "echo")])
+    assert assembler.feed([delta(0, '}"')]) == []
+    completed = assembler.feed([delta(0, ', "items": [{"n": 1}]}')])
+    assert completed[0].parsed == {"text": 'a}b"}', "items": [{"n": 1}]}
+
+
+def test_interleaved_calls_are_assembled_by_index():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(1, '{"b"', "call_1", "second"), delta(0, '{"a"', "call_0", "first")])
+    first = assembler.feed([delta(1, ': 2}')])
+    second = assembler.feed([delta(0, ': 1}')])
+
+    assert [call.index for call in first + second] == [1, 0]
+    assert [call.name for call in assembler.ordered()] == ["first", "second"]
+    assert assembler.finish() == []
+
+
+def test_finish_completes_empty_and_invalid_arguments():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, None, "call_0", "no_args"), delta(1, '{"city": ', "call_1", "broken")])
+    remaining = assembler.finish()
+
+    assert [call.name for call in remaining] == ["no_args", "broken"]
+    assert remaining[0].parsed == {} and remaining[0].error is None
+    assert remaining[1].parsed is None
+    assert "broken" in remaining[1].error
+
+
+def test_arguments_after_completion_are_ignored():
+    assembler = ToolCallAssembler()
+    call = assembler.feed([delta(0, "{}", "call_0", "tool")])[0]
+    assert assembler.feed([delta(0, " ")]) == []
+    assert call.to_message()["function"]["arguments"] == "{}"
+    assert not ToolCallAssembler()
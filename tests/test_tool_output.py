@@ -0,0 +1,63 @@
+import os
+import base64
+
+from mcp import types
+
+from modelclient.tool_output import ToolOutputPipeline, render_block
+
+
+def text(value):
+    return types.TextContent(type="text", text=value)
+
+
+def result(*blocks, is_error=False):
+    return types.CallToolResult(content=list(blocks), isError=is_error)
+
+
+def test_render_block_describes_binary_content():
+    image = types.ImageContent(type="image", data=base64.b64encode(b"x" * 10).decode(), mimeType="image/png")
+    assert render_block(image) == ("[图片 image/png，10 字节]", 10)
+    assert render_block(text("北京")) == ("北京", 6)
+
+    resource = types.EmbeddedResource(type="resource", resource=types.TextResourceContents(
+        uri="file:///a.txt", text="内容"))
+    assert render_block(resource)[0] == "[资源 file:///a.txt]\n内容"
+
+
+def test_small_outputs_join_all_blocks(tmp_path):
+    pipeline = ToolOutputPipeline(str(tmp_path))
+    output = pipeline.process("tool", result(text("a"), text("b"), is_error=True), limit=100)
+    assert output.text == "a\nb"
+    assert output.is_error and output.spill_path is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_large_outputs_spill_to_file_with_preview(tmp_path):
+    pipeline = ToolOutputPipeline(str(tmp_path))
+    blocks = [text("头" * 50), text("x" * 1000), text("尾" * 50)]
+    output = pipeline.process("tool", result(*blocks), limit=40)
+
+    with open(output.spill_path, encoding="utf-8") as f:
+        assert f.read() == "\n".join(block.text for block in blocks)
+    assert output.chars == 1102
+    assert output.text.startswith("头" * 30 + "\n\n…（输出共 1102 字符、3 行，超出上限 40 字符")
+    assert output.text.endswith("\n\n" + "尾" * 10)
+    assert output.spill_path in output.text
+
+    pipeline.close()
+    assert not os.path.exists(output.spill_path)
+
+
+def test_only_the_newest_spill_files_are_kept(tmp_path):
+    pipeline = ToolOutputPipeline(str(tmp_path), max_spills=2)
+    paths = [pipeline.process("tool", result(text("x" * 20)), limit=10).spill_path for _ in range(3)]
+    assert not os.path.exists(paths[0])
+    assert all(os.path.exists(path) for path in paths[1:])
+    assert pipeline.get_stats() == {"outputs": 3, "spilled": 3, "bytes": 60, "spill_files": 2}
+    pipeline.close()
+
+
+def test_zero_limit_never_spills(tmp_path):
+    pipeline = ToolOutputPipeline(str(tmp_path))
+    output = pipeline.process("tool", result(text("x" * 10000)), limit=0)
+    assert len(output.text) == 10000 and output.spill_path is None
@@ -0,0 +1,58 @@
+from mcp import types
+
+from serverconnector import tool_result_cache
+from serverconnector.tool_result_cache import SqliteResultStore, ToolResultCache, canonical_arguments
+
+
+def result(text, is_error=False):
+    return types.CallToolResult(content=[types.TextContent(type="text", text=text)], isError=is_error)
+
+
+def test_canonical_arguments_ignore_key_order():
+    assert canonical_arguments({"b": 1, "a": "北京"}) == canonical_arguments({"a": "北京", "b": 1})
+    assert canonical_arguments(None) == "{}"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tool_result_cache.time, "time", lambda: now[0])
+    cache = ToolResultCache("weather", {"query": 10})
+
+    cache.put("query", {"city": "Beijing"}, result("晴"))
+    assert cache.get("query", {"city": "Beijing"}).content[0].text == "晴"
+    now[0] += 11
+    assert cache.get("query", {"city": "Beijing"}) is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_error_results_are_not_cached():
+    cache = ToolResultCache("weather", {"query": 10})
+    cache.put("query", {}, result("失败", is_error=True))
+    assert cache.get("query", {}) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ToolResultCache("weather", {"query": 10}, max_size=2)
+    cache.put("query", {"city": "a"}, result("a"))
+    cache.put("query", {"city": "b"}, result("b"))
+    cache.get("query", {"city": "a"})
+    cache.put("query", {"city": "c"}, result("c"))
+
+    assert cache.get("query", {"city": "b"}) is None
+    assert cache.get("query", {"city": "a"}) is not None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_results_loaded_from_store_respect_max_size(tmp_path):
+    store = SqliteResultStore(str(tmp_path / "results.db"))
+    writer = ToolResultCache("weather", {"query": 10}, max_size=10, store=store)
+    for city in "abcd":
+        writer.put("query", {"city": city}, result(city))
+
+    # 新进程中的缓存从持久化存储读入结果，内存中的条目数不超过 max_size
+    reader = ToolResultCache("weather", {"query": 10}, max_size=2, store=store)
+    for city in "abc":
+        assert reader.get("query", {"city": city}).content[0].text == city
+    assert reader.get_stats()["size"] == 2
+    assert reader.get_stats()["evictions"] == 1
+    store.close()
@@ -0,0 +1,63 @@
+from serverconnector.tool_selector import BM25Index, ToolSelector, tokenize, tool_document
+
+
+def make_tool(name, description, **properties):
+    return {"type": "function", "function": {
+        "name": name, "description": description,
+        "parameters": {"type": "object", "properties": {
+            key: {"type": "string", "description": value} for key, value in properties.items()
+        }},
+    }}
+
+
+TOOLS = [
+    make_tool("query_weather", "查询城市的今日天气", city="城市名称"),
+    make_tool("read_file", "Read a file from disk", path="file path"),
+    make_tool("send_email", "Send an email message", to="recipient address"),
+    make_tool("search_web", "Search the web for pages", query="search keywords"),
+]
+
+
+def test_tokenize_splits_identifiers_and_chinese():
+    assert tokenize("getWeatherInfo query_weather") == ["get", "weather", "info", "query", "weather"]
+    assert tokenize("北京天气") == ["北", "京", "天", "气", "北京", "京天", "天气"]
+    # 虚词被去掉，中文相邻两字仍然保留
+    assert tokenize("the file 的") == ["file"]
+    assert tokenize(None) == []
+
+
+def test_tool_document_includes_parameters():
+    document = tool_document(TOOLS[0])
+    assert document.startswith("query_weather query_weather 查询城市的今日天气")
+    assert "city" in document and "城市名称" in document
+
+
+def test_bm25_prefers_rarer_and_more_frequent_terms():
+    index = BM25Index(["weather weather city", "weather file", "file path"])
+    scores = index.scores("weather city")
+    assert scores[0] > scores[1] > scores[2] == 0.0
+    assert index.scores("unknown") == [0.0, 0.0, 0.0]
+
+
+def test_selector_keeps_top_k_in_original_order():
+    selector = ToolSelector(top_k=2)
+    selected = selector.select("search the web and send an email", TOOLS)
+    assert [tool["function"]["name"] for tool in selected] == ["send_email", "search_web"]
+
+
+def test_selector_matches_chinese_queries():
+    selected = ToolSelector(top_k=1).select("北京今天天气怎么样", TOOLS)
+    assert [tool["function"]["name"] for tool in selected] == ["query_weather"]
+
+
+def test_selector_falls_back_to_all_tools():
+    selector = ToolSelector(top_k=2)
+    assert selector.select("完全无关", TOOLS) is TOOLS
+    assert ToolSelector(top_k=0).select("weather", TOOLS) is TOOLS
+    assert ToolSelector(top_k=10).select("weather", TOOLS) is TOOLS
+
+
+def test_always_included_tools_are_added():
+    selector = ToolSelector(top_k=1, always_include=["read_file"])
+    selected = selector.select("send an email", TOOLS)
+    assert [tool["function"]["name"] for tool in selected] == ["read_file", "send_email"]
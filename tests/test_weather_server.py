@@ -0,0 +1,82 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from mcpserver import weather_server
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """替换实际的 OpenWeather 请求，记录请求次数，release 事件设置前一直阻塞"""
+    monkeypatch.setattr(weather_server, "API_KEY", "test")
+    monkeypatch.setattr(weather_server, "_cache", OrderedDict())
+    monkeypatch.setattr(weather_server, "_inflight", {})
+    state = {"requests": 0, "release": None}
+
+    async def request_weather(city):
+        state["requests"] += 1
+        await state["release"].wait()
+        return {"name": city}
+
+    monkeypatch.setattr(weather_server, "_request_weather", request_weather)
+    return state
+
+
+def test_concurrent_queries_share_one_request(upstream):
+    async def run():
+        upstream["release"] = asyncio.Event()
+        tasks = [asyncio.create_task(weather_server.fetch_weather(city)) for city in ("Beijing", "beijing ")]
+        await asyncio.sleep(0)
+        upstream["release"].set()
+        results = await asyncio.gather(*tasks)
+        assert results[0] == results[1] == {"name": "Beijing"}
+        assert upstream["requests"] == 1
+
+    asyncio.run(run())
+
+
+def test_follower_takes_over_when_leader_is_cancelled(upstream):
+    async def run():
+        upstream["release"] = asyncio.Event()
+        leader = asyncio.create_task(weather_server.fetch_weather("Beijing"))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(weather_server.fetch_weather("Beijing")) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        upstream["release"].set()
+        assert await asyncio.gather(*followers) == [{"name": "Beijing"}] * 2
+        assert leader.cancelled()
+        # 其中一个等待者接替发起了请求，另一个继续合并到新的请求
+        assert upstream["requests"] == 2
+
+    asyncio.run(run())
+
+
+def test_cache_drops_expired_entries_and_stays_bounded(upstream, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(weather_server.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(weather_server, "WEATHER_CACHE_TTL", 10)
+    monkeypatch.setattr(weather_server, "WEATHER_CACHE_MAX_SIZE", 2)
+
+    async def run():
+        upstream["release"] = asyncio.Event()
+        upstream["release"].set()
+        for city in ("a", "b"):
+            await weather_server.fetch_weather(city)
+        await weather_server.fetch_weather("a")
+        await weather_server.fetch_weather("c")
+        # b 最久未使用，被淘汰
+        assert list(weather_server._cache) == [("a", "metric", "zh_cn"), ("c", "metric", "zh_cn")]
+        assert upstream["requests"] == 3
+
+        now[0] += 11
+        await weather_server.fetch_weather("a")
+        assert upstream["requests"] == 4
+        # 读取时删除过期条目，写入时先淘汰过期的 c
+        await weather_server.fetch_weather("d")
+        assert list(weather_server._cache) == [("a", "metric", "zh_cn"), ("d", "metric", "zh_cn")]
+
+    asyncio.run(run())